@@ -0,0 +1,106 @@
+"""ベンチマーク用のフィクスチャ
+
+S3の代わりにmotoのサーバーを、Webの代わりにRange requestに対応したローカルのHTTPサーバーを
+プロセス内で立てるので、ネットワークにもAWSのアカウントにも依存しない
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import boto3
+import pytest
+import toml
+from cloudio import cloudio_config
+from moto.server import ThreadedMotoServer
+from tests.http_server import serve
+
+BUCKET = "cloudio-bench"
+
+# 読み書きするオブジェクトのサイズ
+SIZES = [1024, 1024 * 1024, 32 * 1024 * 1024]
+
+_DATA: Dict[int, bytes] = {}
+
+
+def size_id(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size}{unit}"
+        size //= 1024
+    return f"{size}TiB"
+
+
+def data(size: int) -> bytes:
+    """sizeバイトのランダムなデータを返す (サイズごとに同じものを使い回す)"""
+    if size not in _DATA:
+        _DATA[size] = os.urandom(size)
+    return _DATA[size]
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    # Releases are compared by this, next to the commit pytest-benchmark records.
+    pyproject = toml.load(Path(__file__).parent.parent / "pyproject.toml")
+    machine_info["cloudio_version"] = pyproject["tool"]["poetry"]["version"]
+
+
+@pytest.fixture(scope="session")
+def s3_server():
+    """motoのS3サーバーを立て、cloudioがそれを使うように設定してバケットのURLを返す"""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint_url = f"http://{host}:{port}"
+
+    environ = os.environ.copy()
+    os.environ.update(AWS_ACCESS_KEY_ID="testing", AWS_SECRET_ACCESS_KEY="testing")
+    client = boto3.client("s3", endpoint_url=endpoint_url, region_name="us-east-1")
+    client.create_bucket(Bucket=BUCKET)
+    with cloudio_config(
+        s3_profile=None, s3_region="us-east-1", s3_endpoint_url=endpoint_url
+    ):
+        yield f"s3://{BUCKET}"
+    os.environ.clear()
+    os.environ.update(environ)
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def s3_client(s3_server):
+    """セットアップでオブジェクトを置くためのboto3のクライアント"""
+    from cloudio.s3 import get_s3_client
+
+    return get_s3_client()
+
+
+@pytest.fixture(scope="session")
+def http_server(tmp_path_factory):
+    """server.root以下のファイルを、S3と同じくMD5をETagにして配信するHTTPサーバー"""
+    with serve(tmp_path_factory.mktemp("www")) as server:
+        server.send_etag = True
+        yield server
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    with cloudio_config(cache_dir=cache_dir):
+        yield cache_dir
+
+
+def put_objects(s3_client, url: str, objects: Dict[str, bytes]) -> List[str]:
+    """url以下にobjects (相対パスから内容へのdict) を並列に置き、そのURLを返す"""
+    bucket, _, prefix = url[len("s3://") :].partition("/")
+    keys = [f"{prefix}/{name}" if prefix else name for name in objects]
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        list(
+            executor.map(
+                lambda key, body: s3_client.put_object(
+                    Bucket=bucket, Key=key, Body=body
+                ),
+                keys,
+                objects.values(),
+            )
+        )
+    return [f"s3://{bucket}/{key}" for key in keys]
@@ -0,0 +1,49 @@
+import pytest
+from cloudio import cached_path, cloudio_config
+from cloudio.cache import evict
+
+from benchmarks.conftest import SIZES, data, put_objects, size_id
+
+
+def _s3_url(s3_server, s3_client, size: int) -> str:
+    return put_objects(s3_client, s3_server, {f"cached_path/{size}.bin": data(size)})[0]
+
+
+def _http_url(http_server, size: int) -> str:
+    (http_server.root / f"{size}.bin").write_bytes(data(size))
+    return f"{http_server.url}/{size}.bin"
+
+
+def _cold(benchmark, url: str, cache_dir: str) -> None:
+    def setup() -> None:
+        evict(url, cache_dir)
+
+    benchmark.pedantic(cached_path, args=(url,), setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("size", SIZES, ids=size_id)
+def test_cached_path_s3_cold(benchmark, s3_server, s3_client, cache_dir, size):
+    benchmark.extra_info["bytes"] = size
+    _cold(benchmark, _s3_url(s3_server, s3_client, size), cache_dir)
+
+
+@pytest.mark.parametrize("size", SIZES, ids=size_id)
+def test_cached_path_http_cold(benchmark, http_server, cache_dir, size):
+    benchmark.extra_info["bytes"] = size
+    _cold(benchmark, _http_url(http_server, size), cache_dir)
+
+
+@pytest.mark.parametrize("revalidate", ["always", 3600])
+def test_cached_path_s3_warm(benchmark, s3_server, s3_client, cache_dir, revalidate):
+    url = _s3_url(s3_server, s3_client, 1024)
+    with cloudio_config(cache_revalidate=revalidate):
+        cached_path(url)
+        benchmark(cached_path, url)
+
+
+@pytest.mark.parametrize("revalidate", ["always", 3600])
+def test_cached_path_http_warm(benchmark, http_server, cache_dir, revalidate):
+    url = _http_url(http_server, 1024)
+    with cloudio_config(cache_revalidate=revalidate):
+        cached_path(url)
+        benchmark(cached_path, url)
@@ -0,0 +1,56 @@
+import pytest
+from cloudio.remove import remove
+from cloudio.upload import upload_folder
+
+from benchmarks.conftest import data, put_objects
+
+# upload_folderでアップロードする小さなファイルの数
+NUM_FILES = 1000
+# removeで削除するプレフィックス以下のオブジェクトの数 (DeleteObjectsの2バッチ分)
+NUM_OBJECTS = 2000
+
+
+@pytest.fixture(scope="module")
+def small_files(tmp_path_factory):
+    root = tmp_path_factory.mktemp("small_files")
+    for i in range(NUM_FILES):
+        path = root / f"{i % 10}" / f"{i:05d}.txt"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data(1024)[: 512 + i % 512])
+    return root
+
+
+@pytest.mark.parametrize("skip_unchanged", [False, True], ids=["new", "unchanged"])
+def test_upload_folder(benchmark, s3_server, small_files, skip_unchanged):
+    url = f"{s3_server}/upload_folder"
+    benchmark.extra_info["files"] = NUM_FILES
+    if skip_unchanged:
+        upload_folder(url, small_files)
+        setup = None
+    else:
+
+        def setup() -> None:
+            remove(url)
+
+    benchmark.pedantic(
+        upload_folder,
+        args=(url, small_files),
+        kwargs={"max_workers": 32, "skip_unchanged": skip_unchanged},
+        setup=setup,
+        rounds=3,
+    )
+
+
+def test_remove(benchmark, s3_server, s3_client):
+    url = f"{s3_server}/remove"
+    objects = {f"{i:05d}.txt": b"x" for i in range(NUM_OBJECTS)}
+    benchmark.extra_info["files"] = NUM_OBJECTS
+
+    def setup() -> None:
+        put_objects(s3_client, url, objects)
+
+    def run() -> None:
+        result = remove(url, max_workers=16)
+        assert len(result.deleted) == NUM_OBJECTS
+
+    benchmark.pedantic(run, setup=setup, rounds=3)
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+
+def _python(code: str) -> None:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+def test_startup(benchmark):
+    """インタプリタの起動だけの時間。import timeはこれとの差で見る"""
+    benchmark(_python, "pass")
+
+
+@pytest.mark.parametrize("module", ["cloudio", "cloudio.aio"])
+def test_import(benchmark, module):
+    benchmark(_python, f"import {module}")
+
+
+def test_import_local_copen(benchmark, tmp_path):
+    """ローカルのファイルだけを読み書きするスクリプト。S3, HTTPのSDKは読み込まれない"""
+    path = str(tmp_path / "hoge.txt")
+    code = f"""
+import cloudio
+with cloudio.copen({path!r}, "w") as f:
+    f.write("hoge")
+"""
+    benchmark(_python, code)
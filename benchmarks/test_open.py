@@ -0,0 +1,62 @@
+import pytest
+from cloudio import cached_path, cloudio_config, copen
+
+from benchmarks.conftest import SIZES, data, put_objects, size_id
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _read(url: str, stream: bool) -> None:
+    with copen(url, "rb", stream=stream) as f:
+        while f.read(CHUNK_SIZE):
+            pass
+
+
+def _write(url: str, body: bytes, stream: bool) -> None:
+    with copen(url, "wb", stream=stream) as f:
+        for start in range(0, len(body), CHUNK_SIZE):
+            f.write(body[start : start + CHUNK_SIZE])
+
+
+@pytest.mark.parametrize("size", SIZES, ids=size_id)
+def test_copen_read_s3_stream(benchmark, s3_server, s3_client, cache_dir, size):
+    url = put_objects(s3_client, s3_server, {f"open/{size}.bin": data(size)})[0]
+    benchmark.extra_info["bytes"] = size
+    benchmark(_read, url, True)
+
+
+@pytest.mark.parametrize("size", SIZES, ids=size_id)
+def test_copen_read_http_stream(benchmark, http_server, cache_dir, size):
+    (http_server.root / f"{size}.bin").write_bytes(data(size))
+    url = f"{http_server.url}/{size}.bin"
+    benchmark.extra_info["bytes"] = size
+    benchmark(_read, url, True)
+
+
+@pytest.mark.parametrize("size", SIZES, ids=size_id)
+def test_copen_read_cached(benchmark, s3_server, s3_client, cache_dir, size):
+    url = put_objects(s3_client, s3_server, {f"open/{size}.bin": data(size)})[0]
+    benchmark.extra_info["bytes"] = size
+    with cloudio_config(cache_revalidate="never"):
+        cached_path(url)
+        benchmark(_read, url, False)
+
+
+@pytest.mark.parametrize("revalidate", ["always", "never"])
+def test_copen_read_memory_cached(
+    benchmark, s3_server, s3_client, cache_dir, revalidate
+):
+    url = put_objects(s3_client, s3_server, {"open/memory.bin": data(1024)})[0]
+    with cloudio_config(
+        cache_revalidate=revalidate, memory_cache_max_bytes=1024 * 1024
+    ):
+        _read(url, False)
+        benchmark(_read, url, False)
+
+
+@pytest.mark.parametrize("stream", [False, True], ids=["upload_later", "stream"])
+@pytest.mark.parametrize("size", SIZES, ids=size_id)
+def test_copen_write_s3(benchmark, s3_server, size, stream):
+    url = f"{s3_server}/open/write-{size}.bin"
+    benchmark.extra_info["bytes"] = size
+    benchmark(_write, url, data(size), stream)
@@ -1,14 +1,23 @@
 from cloudio.cached_path import cached_path
 from cloudio.config import cloudio_config, get_all_config, get_config, set_config
-from cloudio.open import copen
+from cloudio.download import download_folder
+from cloudio.open import cmmap, copen
+from cloudio.prefetch import prefetch
+from cloudio.stats import add_stats_hook, reset_stats, stats
 from cloudio.upload import upload_later
 
 __all__ = [
     "cached_path",
+    "cmmap",
     "copen",
+    "download_folder",
     "get_config",
     "get_all_config",
     "set_config",
     "cloudio_config",
+    "prefetch",
+    "stats",
+    "add_stats_hook",
+    "reset_stats",
     "upload_later",
 ]
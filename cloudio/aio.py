@@ -0,0 +1,217 @@
+"""asyncioのイベントループをブロックせずにcloudioを使うための関数
+
+```python
+from cloudio.aio import acached_path, acopen, aprefetch, aupload
+
+async with acopen('s3://bucket/hoge.txt', 'r') as f:
+    text = await f.read()
+path = await acached_path('s3://bucket/hoge.txt')
+await aupload('s3://bucket/fuga.txt', 'fuga.txt')
+results = await aprefetch(['s3://bucket/1.txt', 's3://bucket/2.txt'])
+```
+
+ブロッキングするI/Oはプロセス内で共有する最大 aio_max_concurrency スレッドで実行する。
+キャッシュのディレクトリや設定は同期版の関数と共通
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from logging import getLogger
+from pathlib import Path
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+from cloudio.cached_path import cached_path
+from cloudio.config import add_config_callback, get_config
+from cloudio.open import copen
+from cloudio.prefetch import prefetch_one
+from cloudio.tqdm import Tqdm
+from cloudio.upload import upload
+from cloudio.utils import to_str
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _on_config_change(key: str, old_val: Any, new_val: Any) -> None:
+    global _EXECUTOR
+    if key == "aio_max_concurrency":
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is not None:
+                # Calls already submitted still run to completion.
+                _EXECUTOR.shutdown(wait=False)
+            _EXECUTOR = None
+
+
+def _reset_executor_after_fork() -> None:
+    """fork後の子プロセスには親プロセスのスレッドが存在しないので作り直す"""
+    global _EXECUTOR, _EXECUTOR_LOCK
+    _EXECUTOR = None
+    _EXECUTOR_LOCK = threading.Lock()
+
+
+add_config_callback(_on_config_change)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor_after_fork)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    executor = _EXECUTOR
+    if executor is None:
+        with _EXECUTOR_LOCK:
+            executor = _EXECUTOR
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=get_config("aio_max_concurrency"),
+                    thread_name_prefix="cloudio-aio",
+                )
+                _EXECUTOR = executor
+    return executor
+
+
+async def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """func(*args, **kwargs) を共有のスレッドプールで実行し、その結果を返す"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+
+
+class AsyncFile:
+    """copenで開いたファイルオブジェクトの読み書きを、共有のスレッドプールで行うラッパー"""
+
+    def __init__(self, file: IO) -> None:
+        self.file = file
+
+    @property
+    def name(self) -> str:
+        return self.file.name
+
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+
+    async def read(self, size: int = -1) -> Union[str, bytes]:
+        return await run(self.file.read, size)
+
+    async def readline(self, size: int = -1) -> Union[str, bytes]:
+        return await run(self.file.readline, size)
+
+    async def readlines(self) -> List[Union[str, bytes]]:
+        return await run(self.file.readlines)
+
+    async def write(self, data: Union[str, bytes]) -> int:
+        return await run(self.file.write, data)
+
+    async def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return await run(self.file.seek, offset, whence)
+
+    async def tell(self) -> int:
+        return await run(self.file.tell)
+
+    async def flush(self) -> None:
+        await run(self.file.flush)
+
+    def __aiter__(self) -> "AsyncFile":
+        return self
+
+    async def __anext__(self) -> Union[str, bytes]:
+        line = await self.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+
+@asynccontextmanager
+async def acopen(
+    file: Union[str, Path],
+    mode: str = "r",
+    encoding: str = "utf-8",
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    stream: bool = False,
+    **kwargs,
+) -> AsyncGenerator[AsyncFile, None]:
+    """copenの非同期版。引数はcopenと同じで、AsyncFileを返す
+
+    ダウンロードやアップロード、ファイルの読み書きはスレッドプールで行う。
+    with句の中で例外が起きた場合 (キャンセルを含む) の扱いもcopenと同じ
+    """
+    context = copen(file, mode, encoding, transfer_config, stream, **kwargs)
+    f = await run(context.__enter__)
+    try:
+        yield AsyncFile(f)
+    except BaseException as exc:
+        if not await run(context.__exit__, type(exc), exc, exc.__traceback__):
+            raise
+    else:
+        await run(context.__exit__, None, None, None)
+
+
+async def acached_path(
+    url_or_filename: Union[str, Path],
+    cache_dir: Optional[str] = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> str:
+    """cached_pathの非同期版"""
+    return await run(cached_path, url_or_filename, cache_dir, transfer_config)
+
+
+async def aupload(
+    url: str,
+    path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
+    """uploadの非同期版"""
+    await run(upload, url, path, transfer_config)
+
+
+async def aprefetch(
+    urls: Iterable[Union[str, Path]],
+    max_workers: int = 8,
+    cache_dir: Optional[str] = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> Dict[str, Union[str, Exception]]:
+    """prefetchの非同期版。返り値もprefetchと同じ
+
+    URLごとのダウンロードは、共有のスレッドプールで最大max_workers個ずつ行う
+    """
+    if cache_dir is None:
+        cache_dir = get_config("cache_dir")
+    keys = list(dict.fromkeys(to_str(url) for url in urls))
+    semaphore = asyncio.Semaphore(max_workers)
+    progress = Tqdm.tqdm(total=len(keys), unit="file")
+
+    async def fetch(url: str) -> Union[str, Exception]:
+        async with semaphore:
+            try:
+                return await run(prefetch_one, url, cache_dir, transfer_config)
+            except Exception as exc:
+                logger.warning(f"Failed to prefetch {url}: {exc!r}")
+                return exc
+            finally:
+                progress.update(1)
+
+    results = await asyncio.gather(*(fetch(url) for url in keys))
+    progress.close()
+    return dict(zip(keys, results))
@@ -0,0 +1,113 @@
+"""URLのスキームごとのストレージのバックエンド
+
+s3, http, https, memory と、ローカルのパス ("" と file) のバックエンドが組み込まれている。
+他のストレージ (gs, az など) はBackendを実装して登録すると、copen, cached_path, upload,
+remove などから使えるようになる
+
+```python
+from cloudio.backends import Backend, register_backend
+
+class GCSBackend(Backend):
+    ...
+
+register_backend("gs", GCSBackend())
+```
+
+パッケージとして配布する場合は、エントリーポイントで登録すると最初に使われたときに読み込まれる
+
+```toml
+[tool.poetry.plugins."cloudio.backends"]
+gs = "cloudio_gcs:GCSBackend"
+```
+"""
+
+import importlib
+import sys
+import threading
+from typing import Dict, Type, Union
+from urllib.parse import urlparse
+
+from cloudio.backends.base import Backend, Writer
+
+__all__ = ["Backend", "Writer", "get_backend", "is_remote", "register_backend"]
+
+ENTRY_POINT_GROUP = "cloudio.backends"
+
+# 組み込みのバックエンド。使われるまでimportしない
+_BUILTIN_BACKENDS = {
+    "s3": "cloudio.backends.s3:S3Backend",
+    "http": "cloudio.backends.http:HTTPBackend",
+    "https": "cloudio.backends.http:HTTPBackend",
+    "memory": "cloudio.backends.memory:MemoryBackend",
+    "": "cloudio.backends.local:LocalBackend",
+    "file": "cloudio.backends.local:LocalBackend",
+}
+
+_BACKENDS: Dict[str, Backend] = {}
+_LOCK = threading.Lock()
+
+
+def register_backend(scheme: str, backend: Union[Backend, Type[Backend]]) -> None:
+    """schemeのURLをbackendで読み書きするように登録する。既に登録されていれば置き換える"""
+    if isinstance(backend, type):
+        backend = backend()
+    if not isinstance(backend, Backend):
+        raise TypeError(f"{backend!r} is not a cloudio.backends.Backend.")
+    with _LOCK:
+        _BACKENDS[scheme] = backend
+
+
+def get_backend(url: str) -> Backend:
+    """urlのスキームのバックエンドを返す
+
+    登録されていなければ、組み込みのバックエンドとエントリーポイントから探す
+    """
+    scheme = urlparse(url).scheme
+    backend = _BACKENDS.get(scheme)
+    if backend is not None:
+        return backend
+
+    with _LOCK:
+        if scheme not in _BACKENDS:
+            target = _BUILTIN_BACKENDS.get(scheme) or _entry_points().get(scheme)
+            if target is None:
+                raise ValueError(f"No backend is registered for the scheme of {url}.")
+            loaded = _load(target)
+            _BACKENDS[scheme] = loaded() if isinstance(loaded, type) else loaded
+        return _BACKENDS[scheme]
+
+
+def is_remote(url: str) -> bool:
+    """urlが、キャッシュを介して読むストレージ (S3やHTTPなど) のURLかを返す"""
+    try:
+        return get_backend(url).remote
+    except ValueError:
+        return False
+
+
+def _load(target: str) -> Union[Backend, Type[Backend]]:
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _entry_points() -> Dict[str, str]:
+    """エントリーポイントで登録されているスキームから "module:attr" へのdictを返す"""
+    if sys.version_info >= (3, 10):
+        from importlib.metadata import entry_points
+
+        group = entry_points(group=ENTRY_POINT_GROUP)
+    else:
+        if sys.version_info >= (3, 8):
+            from importlib import metadata
+        else:
+            try:
+                import importlib_metadata as metadata
+            except ImportError:
+                return {}
+
+        all_entry_points = metadata.entry_points()
+        if hasattr(all_entry_points, "select"):
+            group = all_entry_points.select(group=ENTRY_POINT_GROUP)
+        else:
+            group = all_entry_points.get(ENTRY_POINT_GROUP, [])
+    return {entry_point.name: entry_point.value for entry_point in group}
@@ -0,0 +1,187 @@
+import io
+import shutil
+from abc import ABC, abstractmethod
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from cloudio.config import get_config
+from cloudio.hashing import ETagHasher
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+
+class Writer(io.RawIOBase):
+    """Backend.open_write が返すファイルオブジェクト
+
+    closeで書き込みを確定し、abort()で中止する
+    """
+
+    def writable(self) -> bool:
+        return True
+
+    @abstractmethod
+    def abort(self) -> None:
+        """書き込みを中止し、書き込んだデータを捨てる"""
+
+
+class Backend(ABC):
+    """スキームごとのストレージへのアクセスを実装するクラス
+
+    stat, read_range, download は全てのバックエンドが実装し、
+    それ以外は対応していなければNotImplementedErrorを送出する。
+    実装したクラスは cloudio.backends.register_backend か、
+    エントリーポイントのグループ "cloudio.backends" にスキーム名で登録する
+    """
+
+    # Trueならキャッシュにダウンロードして読む。Falseならローカルのパスとしてそのまま開く
+    remote: bool = True
+    # Trueなら / で終わるURLをディレクトリとして list できる
+    folders: bool = False
+
+    @abstractmethod
+    def stat(self, url: str) -> Dict[str, Any]:
+        """urlのメタデータを返す
+
+        etag, size (不明ならNone), accept_ranges (Range requestで並列にダウンロードできるか) と、
+        ダウンロードした内容を検証するための md5 (S3のETagの形式), part_size, sha256 (base64)
+        のdict。検証できないものはNoneにする。
+        キャッシュの確認のたびに呼ばれるので、追加のリクエストが必要な値は checksums で取得する
+        """
+
+    def checksums(self, url: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """ダウンロードする直前に呼ばれ、statが返したmetadataに検証のための値を補って返す
+
+        デフォルトではmetadataをそのまま返す
+        """
+        return metadata
+
+    @abstractmethod
+    def read_range(
+        self, url: str, start: int, end: int, etag: Optional[str] = None
+    ) -> bytes:
+        """urlのstartからend (endを含む) までのバイト列を返す
+
+        etagを指定した場合は、オブジェクトが変更されていればIOErrorを送出する
+        """
+
+    def open_read(self, url: str) -> io.RawIOBase:
+        """urlを先頭から読むためのバッファリングされていないファイルオブジェクトを返す
+
+        デフォルトでは、stream_block_sizeごとにread_rangeで先読みしながら読む
+        """
+        # Imported here because cloudio.stream dispatches through this package.
+        from cloudio.stream import RangeReader
+
+        metadata = self.stat(url)
+        etag = metadata["etag"]
+        return RangeReader(
+            lambda start, end: self.read_range(url, start, end, etag),
+            metadata["size"],
+            get_config("stream_block_size"),
+            name=url,
+        )
+
+    def download(
+        self,
+        url: str,
+        fileobj: IO,
+        metadata: Dict[str, Any],
+        hasher: ETagHasher,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        show_progress: bool = True,
+    ) -> None:
+        """statで取得したmetadataのurlをfileobjに書き込み、書き込んだ順にhasherに渡す"""
+        with self.open_read(url) as reader:
+            for chunk in iter(lambda: reader.read(1024 * 1024), b""):
+                fileobj.write(chunk)
+                hasher.update(chunk)
+
+    def open_write(self, url: str) -> Writer:
+        """urlに書き込むファイルオブジェクトを返す
+
+        closeで書き込みを確定し、abort()で中止する。確定するまでurlは変更されない
+        """
+        raise NotImplementedError(f"Writing to {url} is not supported.")
+
+    def upload(
+        self,
+        path: str,
+        url: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    ) -> None:
+        """ローカルのファイルpathをurlにアップロードする"""
+        with open(path, "rb") as f:
+            self._write_from(f, url)
+
+    def upload_folder(
+        self,
+        url: str,
+        path: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        max_workers: int = 8,
+        include: Optional[Sequence[str]] = None,
+        exclude: Optional[Sequence[str]] = None,
+        skip_unchanged: bool = True,
+        dry_run: bool = False,
+    ) -> List[str]:
+        """cloudio.upload.upload_folder を参照"""
+        raise NotImplementedError(f"Uploading a folder to {url} is not supported.")
+
+    def download_folder(
+        self,
+        url: str,
+        path: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        max_workers: int = 8,
+        skip_unchanged: bool = True,
+    ) -> List[str]:
+        """cloudio.download.download_folder を参照"""
+        raise NotImplementedError(f"Downloading a folder from {url} is not supported.")
+
+    def list(self, url: str) -> Iterator[Dict[str, Any]]:
+        """url以下 (url/で始まるURL) のオブジェクトを全て返す
+
+        各要素は url, etag, size のdict
+        """
+        raise NotImplementedError(f"Listing {url} is not supported.")
+
+    def delete(
+        self,
+        url: str,
+        recursive: bool = True,
+        max_workers: int = 8,
+        dry_run: bool = False,
+    ) -> Tuple[List[str], Dict[str, str]]:
+        """urlと、recursiveがTrueならurl/以下を削除し、削除したURLと、失敗したURLからエラーへのdictを返す
+
+        cloudio.remove.remove を参照
+        """
+        raise NotImplementedError(f"Removing {url} is not supported.")
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        """src_urlをdst_urlにコピーする
+
+        デフォルトでは、ローカルを介さずにopen_readからopen_writeにストリーミングで書き込む
+        """
+        with self.open_read(src_url) as reader:
+            self._write_from(reader, dst_url)
+
+    def _write_from(self, fileobj: Union[IO, io.RawIOBase], url: str) -> None:
+        writer = self.open_write(url)
+        try:
+            shutil.copyfileobj(fileobj, writer, 1024 * 1024)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
@@ -0,0 +1,374 @@
+import base64
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import IO, TYPE_CHECKING, Any, Dict, Optional, Union
+
+import requests
+from cloudio.backends.base import Backend
+from cloudio.config import add_config_callback, get_config
+from cloudio.hashing import ETagHasher, content_md5
+from cloudio.stats import incr
+from cloudio.stream import RangeReader, ResponseReader
+from cloudio.tqdm import Tqdm
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+
+def session_with_backoff(pool_maxsize: int = 10) -> requests.Session:
+    """
+    We ran into an issue where http requests to s3 were timing out,
+    possibly because we were making too many requests too quickly.
+    This helper function returns a requests session that has retry-with-backoff
+    built in.
+    see stackoverflow.com/questions/23267409/how-to-implement-retry-mechanism-into-pyth
+    on-requests-library
+
+    cloudio itself uses the shared session from `get_http_session` instead.
+    """
+    session = requests.Session()
+    retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retries, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+class _CountingRetry(Retry):
+    """
+    Retry counting every retry in the `retries` stat.
+    """
+
+    def increment(self, *args: Any, **kwargs: Any) -> Retry:
+        # Raises instead when the retries are exhausted.
+        retry = super().increment(*args, **kwargs)
+        incr("retries")
+        return retry
+
+
+def _count_http_request(response: requests.Response, *args: Any, **kwargs: Any):
+    incr("http.requests")
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter applying `timeout` to requests that don't specify their own.
+    """
+
+    def __init__(self, timeout: Optional[float], **kwargs: Any) -> None:
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+_HTTP_SESSION: Optional[requests.Session] = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+def _on_http_config_change(key: str, old_val: Any, new_val: Any) -> None:
+    global _HTTP_SESSION
+    if key in ("http_pool_size", "http_retries", "http_backoff_factor", "http_timeout"):
+        with _HTTP_SESSION_LOCK:
+            # Requests in flight keep using the old session until they finish.
+            _HTTP_SESSION = None
+
+
+def _reset_http_session_after_fork() -> None:
+    # Connections of the parent process must not be shared with the child.
+    global _HTTP_SESSION, _HTTP_SESSION_LOCK
+    _HTTP_SESSION = None
+    _HTTP_SESSION_LOCK = threading.Lock()
+
+
+add_config_callback(_on_http_config_change)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_http_session_after_fork)
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return the requests session shared by all threads of the process, so
+    that connections are kept alive and reused, e.g. by the HEAD and then the
+    GET of a download. Its pool keeps up to `http_pool_size` connections per
+    host, and it retries and times out according to `http_retries`,
+    `http_backoff_factor` and `http_timeout`. The session is replaced when
+    those configs change and after fork, so never close it.
+    """
+    global _HTTP_SESSION
+    session = _HTTP_SESSION
+    if session is None:
+        with _HTTP_SESSION_LOCK:
+            session = _HTTP_SESSION
+            if session is None:
+                retries = _CountingRetry(
+                    total=get_config("http_retries"),
+                    backoff_factor=get_config("http_backoff_factor"),
+                    status_forcelist=[502, 503, 504],
+                )
+                adapter = _TimeoutHTTPAdapter(
+                    get_config("http_timeout"),
+                    max_retries=retries,
+                    pool_maxsize=get_config("http_pool_size"),
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.hooks["response"].append(_count_http_request)
+                _HTTP_SESSION = session
+    return session
+
+
+# Read this many bytes per iteration when streaming a response body.
+HTTP_CHUNK_SIZE = 1024 * 1024
+
+
+def http_get(
+    url: str,
+    temp_file: IO,
+    size: Optional[int] = None,
+    accept_ranges: bool = False,
+    show_progress: bool = True,
+    hasher: Optional[ETagHasher] = None,
+) -> None:
+    """
+    Download `url` into `temp_file`. If the server accepts byte ranges and the
+    object is larger than the `http_download_part_size` config, the parts are
+    fetched concurrently, otherwise the body is streamed with a single GET.
+    The content is also fed in order to `hasher`, if given.
+    """
+    part_size = get_config("http_download_part_size")
+    concurrency = get_config("http_download_concurrency")
+    if (
+        accept_ranges
+        and size is not None
+        and size > part_size
+        and concurrency > 1
+        and hasattr(os, "pwrite")
+    ):
+        _http_get_ranges(
+            url, temp_file, size, part_size, concurrency, show_progress, hasher
+        )
+    else:
+        _http_get_stream(url, temp_file, show_progress, hasher)
+
+
+def _http_get_stream(
+    url: str,
+    temp_file: IO,
+    show_progress: bool = True,
+    hasher: Optional[ETagHasher] = None,
+) -> None:
+    with get_http_session().get(url, stream=True) as req:
+        content_length = req.headers.get("Content-Length")
+        total = int(content_length) if content_length is not None else None
+        progress = Tqdm.tqdm(
+            unit="B", unit_scale=True, total=total, disable=not show_progress
+        )
+        for chunk in req.iter_content(chunk_size=HTTP_CHUNK_SIZE):
+            if chunk:  # filter out keep-alive new chunks
+                progress.update(len(chunk))
+                temp_file.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+        progress.close()
+
+
+def _http_get_ranges(
+    url: str,
+    temp_file: IO,
+    size: int,
+    part_size: int,
+    concurrency: int,
+    show_progress: bool = True,
+    hasher: Optional[ETagHasher] = None,
+) -> None:
+    """
+    Fetch `url` as byte ranges of `part_size` on `concurrency` threads, writing
+    each part at its offset into `temp_file`, which is preallocated to `size`.
+    As soon as the parts up to some offset have arrived they are read back,
+    still in the page cache, and fed to `hasher` while the rest downloads.
+    """
+    temp_file.flush()
+    fd = temp_file.fileno()
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        # Not available on this platform or filesystem.
+        os.ftruncate(fd, size)
+
+    progress = Tqdm.tqdm(
+        unit="B", unit_scale=True, total=size, disable=not show_progress
+    )
+    progress_lock = threading.Lock()
+
+    def fetch_part(session: requests.Session, start: int) -> None:
+        end = min(start + part_size, size) - 1
+        headers = {
+            "Range": "bytes={}-{}".format(start, end),
+            "Accept-Encoding": "identity",
+        }
+        with session.get(url, headers=headers, stream=True) as response:
+            if response.status_code != 206:
+                raise IOError(
+                    "range request failed for url {} with status code {}".format(
+                        url, response.status_code
+                    )
+                )
+            offset = start
+            for chunk in response.iter_content(chunk_size=HTTP_CHUNK_SIZE):
+                view = memoryview(chunk)
+                while view:
+                    written = os.pwrite(fd, view, offset)
+                    view = view[written:]
+                    offset += written
+                with progress_lock:
+                    progress.update(len(chunk))
+        if offset != end + 1:
+            raise IOError(
+                "range {}-{} of {} was truncated at {}".format(start, end, url, offset)
+            )
+
+    session = get_http_session()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(fetch_part, session, start): start
+            for start in range(0, size, part_size)
+        }
+        fetched = set()
+        hashed = 0
+        try:
+            for future in as_completed(futures):
+                future.result()
+                fetched.add(futures[future])
+                while hasher is not None and hashed in fetched:
+                    end = min(hashed + part_size, size)
+                    while hashed < end:
+                        chunk = os.pread(fd, min(HTTP_CHUNK_SIZE, end - hashed), hashed)
+                        hasher.update(chunk)
+                        hashed += len(chunk)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    progress.close()
+
+    if os.fstat(fd).st_size != size:
+        raise IOError(
+            "downloaded {} bytes from {}, expected {}".format(
+                os.fstat(fd).st_size, url, size
+            )
+        )
+    temp_file.seek(size)
+
+
+class HTTPBackend(Backend):
+    """http(s):// のURLを読むバックエンド。読み込みのみに対応する
+
+    リクエストはプロセス内で共有するセッション (get_http_session) で行う
+    """
+
+    def stat(self, url: str) -> Dict[str, Any]:
+        response = get_http_session().head(url, allow_redirects=True)
+        if response.status_code != 200:
+            raise IOError(
+                "HEAD request failed for url {} with status code {}".format(
+                    url, response.status_code
+                )
+            )
+        headers = response.headers
+        content_length = headers.get("Content-Length")
+        etag = headers.get("ETag")
+        metadata = {
+            "etag": etag,
+            "size": int(content_length) if content_length is not None else None,
+            "accept_ranges": headers.get("Accept-Ranges") == "bytes"
+            and "Content-Encoding" not in headers,
+            "md5": None,
+            "part_size": None,
+            "sha256": None,
+        }
+        if "Content-Encoding" in headers:
+            # The body is decoded on the fly, so it won't match any of these,
+            # and Content-Length is the size before decoding.
+            metadata["size"] = None
+            return metadata
+        if "Content-MD5" in headers:
+            metadata["md5"] = base64.b64decode(headers["Content-MD5"]).hex()
+        elif "x-amz-request-id" in headers and "-" not in (etag or "-"):
+            # Served from S3 (e.g. a presigned URL), which makes the ETag an MD5.
+            metadata["md5"] = content_md5(
+                etag,
+                headers.get("x-amz-server-side-encryption", "").startswith("aws:kms")
+                or "x-amz-server-side-encryption-customer-algorithm" in headers,
+            )
+        if "-" not in headers.get("x-amz-checksum-sha256", "-"):
+            metadata["sha256"] = headers["x-amz-checksum-sha256"]
+        return metadata
+
+    def read_range(
+        self, url: str, start: int, end: int, etag: Optional[str] = None
+    ) -> bytes:
+        headers = {
+            "Range": "bytes={}-{}".format(start, end),
+            "Accept-Encoding": "identity",
+        }
+        if etag is not None:
+            headers["If-Match"] = etag
+        response = get_http_session().get(url, headers=headers)
+        if response.status_code != 206:
+            raise IOError(
+                "range request failed for url {} with status code {}".format(
+                    url, response.status_code
+                )
+            )
+        return response.content
+
+    def open_read(self, url: str) -> io.RawIOBase:
+        """Range requestに対応していないサーバーでは、先頭から順に読むだけのストリームを返す"""
+        metadata = self.stat(url)
+        if metadata["accept_ranges"] and metadata["size"] is not None:
+            etag = metadata["etag"]
+            return RangeReader(
+                lambda start, end: self.read_range(url, start, end, etag),
+                metadata["size"],
+                get_config("stream_block_size"),
+                name=url,
+            )
+
+        # Ranges are not supported, so stream the whole body once from the start.
+        response = get_http_session().get(url, stream=True)
+        if response.status_code != 200:
+            response.close()
+            raise IOError(
+                "GET request failed for url {} with status code {}".format(
+                    url, response.status_code
+                )
+            )
+        return ResponseReader(response, name=url)
+
+    def download(
+        self,
+        url: str,
+        fileobj: IO,
+        metadata: Dict[str, Any],
+        hasher: ETagHasher,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        show_progress: bool = True,
+    ) -> None:
+        http_get(
+            url,
+            fileobj,
+            size=metadata["size"],
+            accept_ranges=metadata["accept_ranges"],
+            show_progress=show_progress,
+            hasher=hasher,
+        )
@@ -0,0 +1,152 @@
+import io
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+from uuid import uuid4
+
+from cloudio.backends.base import Backend, Writer
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+
+def local_path(url: str) -> str:
+    """file:// のURLをローカルのパスに変換する。パスはそのまま返す"""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        # urllib.requestはhttp.client, sslを読み込んで重いので、必要なときだけ読み込む
+        from urllib.request import url2pathname
+
+        return url2pathname(parsed.path)
+    return url
+
+
+class _LocalWriter(io.FileIO, Writer):
+    """一時ファイルに書き込み、closeでpathを置き換えるファイルオブジェクト"""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._path = path
+        self._temp_path = "{}.{}.partial".format(path, uuid4().hex)
+        super().__init__(self._temp_path, "wb")
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        os.replace(self._temp_path, self._path)
+
+    def abort(self) -> None:
+        """書き込みを中止し、一時ファイルを削除する"""
+        if self.closed:
+            return
+        super().close()
+        os.remove(self._temp_path)
+
+
+class LocalBackend(Backend):
+    """ローカルのパスと file:// のURLのバックエンド
+
+    キャッシュは介さずに、ファイルをそのまま読み書きする
+    """
+
+    remote = False
+    folders = True
+
+    def stat(self, url: str) -> Dict[str, Any]:
+        stat = os.stat(local_path(url))
+        return {
+            "etag": '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size),
+            "size": stat.st_size,
+            "accept_ranges": False,
+            "md5": None,
+            "part_size": None,
+            "sha256": None,
+        }
+
+    def read_range(
+        self, url: str, start: int, end: int, etag: Optional[str] = None
+    ) -> bytes:
+        with open(local_path(url), "rb") as f:
+            if etag is not None and etag != self.stat(url)["etag"]:
+                raise IOError("{} was modified".format(url))
+            f.seek(start)
+            return f.read(end - start + 1)
+
+    def open_read(self, url: str) -> io.RawIOBase:
+        return io.FileIO(local_path(url), "r")
+
+    def open_write(self, url: str) -> Writer:
+        return _LocalWriter(local_path(url))
+
+    def upload(
+        self,
+        path: str,
+        url: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    ) -> None:
+        self.copy(path, url)
+
+    def list(self, url: str) -> Iterator[Dict[str, Any]]:
+        path = local_path(url)
+        prefix = url.rstrip("/") + "/"
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                file = os.path.join(root, name)
+                relative_path = os.path.relpath(file, path).replace(os.sep, "/")
+                yield {
+                    "url": prefix + relative_path,
+                    "etag": None,
+                    "size": os.path.getsize(file),
+                }
+
+    def delete(
+        self,
+        url: str,
+        recursive: bool = True,
+        max_workers: int = 8,
+        dry_run: bool = False,
+    ) -> Tuple[List[str], Dict[str, str]]:
+        path = local_path(url)
+        if not os.path.isdir(path) or os.path.islink(path):
+            if not os.path.lexists(path):
+                return [], {}
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except OSError as exc:
+                    return [], {path: str(exc)}
+            return [path], {}
+
+        if not recursive:
+            raise IsADirectoryError(f"{path} is a directory. Use recursive=True.")
+
+        deleted: List[str] = []
+        errors: Dict[str, str] = {}
+
+        def onerror(exc: OSError) -> None:
+            errors[exc.filename] = str(exc)
+
+        for root, dirs, files in os.walk(path, topdown=False, onerror=onerror):
+            for name in files + [
+                d for d in dirs if os.path.islink(os.path.join(root, d))
+            ]:
+                file = os.path.join(root, name)
+                try:
+                    if not dry_run:
+                        os.remove(file)
+                    deleted.append(file)
+                except OSError as exc:
+                    errors[file] = str(exc)
+            if not dry_run and not any(
+                p.startswith(os.path.join(root, "")) for p in errors
+            ):
+                try:
+                    os.rmdir(root)
+                except OSError as exc:
+                    errors[root] = str(exc)
+        return deleted, errors
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        with open(local_path(src_url), "rb") as src:
+            self._write_from(src, dst_url)
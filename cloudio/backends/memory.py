@@ -0,0 +1,166 @@
+import hashlib
+import io
+import threading
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from cloudio.backends.base import Backend, Writer
+from cloudio.hashing import ETagHasher
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+
+class _MemoryReader(io.RawIOBase):
+    """MemoryBackendのオブジェクトの内容を読む、シーク可能なファイルオブジェクト"""
+
+    def __init__(self, data: bytes, url: str) -> None:
+        super().__init__()
+        self.name = url
+        self._data = io.BytesIO(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        return self._data.readinto(b)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._data.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._data.tell()
+
+
+class _MemoryWriter(Writer):
+    """書き込まれたデータを溜めておき、closeでMemoryBackendに保存するファイルオブジェクト"""
+
+    def __init__(self, backend: "MemoryBackend", url: str) -> None:
+        super().__init__()
+        self.name = url
+        self._backend = backend
+        self._buffer = bytearray()
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buffer += b
+        return len(b)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self._backend.put(self.name, bytes(self._buffer))
+        self._buffer = bytearray()
+        super().close()
+
+    def abort(self) -> None:
+        """書き込んだデータを捨てる"""
+        self._buffer = bytearray()
+        super().close()
+
+
+class MemoryBackend(Backend):
+    """memory://bucket/key のオブジェクトをプロセスのメモリ上に保持するバックエンド
+
+    ネットワークなしでキャッシュやストリーミングを動かすためのもので、
+    ベンチマークやテストでS3の代わりに使える。ETagはS3と同じく内容のMD5になる
+    """
+
+    folders = True
+
+    def __init__(self) -> None:
+        self._objects: Dict[str, Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, url: str, data: bytes) -> None:
+        """urlにdataを保存する"""
+        etag = '"{}"'.format(hashlib.md5(data).hexdigest())
+        with self._lock:
+            self._objects[url] = (bytes(data), etag)
+
+    def clear(self) -> None:
+        """全てのオブジェクトを削除する"""
+        with self._lock:
+            self._objects.clear()
+
+    def _get(self, url: str) -> Tuple[bytes, str]:
+        try:
+            return self._objects[url]
+        except KeyError:
+            raise FileNotFoundError("file {} not found".format(url))
+
+    def stat(self, url: str) -> Dict[str, Any]:
+        data, etag = self._get(url)
+        return {
+            "etag": etag,
+            "size": len(data),
+            "accept_ranges": False,
+            "md5": etag.strip('"'),
+            "part_size": None,
+            "sha256": None,
+        }
+
+    def read_range(
+        self, url: str, start: int, end: int, etag: Optional[str] = None
+    ) -> bytes:
+        data, current_etag = self._get(url)
+        if etag is not None and etag != current_etag:
+            raise IOError("{} was modified".format(url))
+        return data[start : end + 1]
+
+    def open_read(self, url: str) -> io.RawIOBase:
+        data, _ = self._get(url)
+        return _MemoryReader(data, url)
+
+    def download(
+        self,
+        url: str,
+        fileobj: IO,
+        metadata: Dict[str, Any],
+        hasher: ETagHasher,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        show_progress: bool = True,
+    ) -> None:
+        data, etag = self._get(url)
+        if etag != metadata["etag"]:
+            raise IOError("{} was modified".format(url))
+        fileobj.write(data)
+        hasher.update(data)
+
+    def open_write(self, url: str) -> Writer:
+        return _MemoryWriter(self, url)
+
+    def list(self, url: str) -> Iterator[Dict[str, Any]]:
+        prefix = url.rstrip("/") + "/"
+        with self._lock:
+            objects = sorted(self._objects.items())
+        for key, (data, etag) in objects:
+            if key.startswith(prefix):
+                yield {"url": key, "etag": etag, "size": len(data)}
+
+    def delete(
+        self,
+        url: str,
+        recursive: bool = True,
+        max_workers: int = 8,
+        dry_run: bool = False,
+    ) -> Tuple[List[str], Dict[str, str]]:
+        prefix = url.rstrip("/") + "/"
+        with self._lock:
+            deleted = [
+                key
+                for key in sorted(self._objects)
+                if key == url or (recursive and key.startswith(prefix))
+            ]
+            if not dry_run:
+                for key in deleted:
+                    del self._objects[key]
+        return deleted, {}
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        data, etag = self._get(src_url)
+        with self._lock:
+            self._objects[dst_url] = (data, etag)
@@ -0,0 +1,170 @@
+import io
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from cloudio.backends.base import Backend, Writer
+from cloudio.config import get_config
+from cloudio.hashing import ETagHasher, HashingWriter, content_md5
+from cloudio.s3 import (
+    s3_copy,
+    s3_download_fileobj,
+    s3_download_folder,
+    s3_get_range,
+    s3_head,
+    s3_list_objects,
+    s3_remove,
+    s3_upload_file,
+    s3_upload_folder,
+    split_s3_path,
+)
+from cloudio.stream import RangeReader, S3MultipartWriter
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+
+class S3Backend(Backend):
+    """s3://bucket/key のオブジェクトをboto3で読み書きするバックエンド"""
+
+    folders = True
+
+    def stat(self, url: str) -> Dict[str, Any]:
+        head = s3_head(url)
+        return {
+            "etag": head["ETag"],
+            "size": head["ContentLength"],
+            "accept_ranges": False,
+            "md5": content_md5(
+                head["ETag"],
+                head.get("ServerSideEncryption", "").startswith("aws:kms")
+                or "SSECustomerAlgorithm" in head,
+            ),
+            "part_size": None,
+            "sha256": None,
+        }
+
+    def checksums(self, url: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        # Extra HEADs, so only made once a download is actually needed.
+        metadata = dict(metadata)
+        head = s3_head(url, checksum=True)
+        if head["ETag"] != metadata["etag"]:
+            raise IOError("{} was modified while being cached".format(url))
+        sha256 = head.get("ChecksumSHA256")
+        # "<checksum>-N" of a multipart upload is a checksum of the checksums.
+        if sha256 is not None and "-" not in sha256:
+            metadata["sha256"] = sha256
+        md5 = metadata.get("md5")
+        if md5 is not None and "-" in md5:
+            metadata["part_size"] = s3_head(url, part_number=1)["ContentLength"]
+        return metadata
+
+    def read_range(
+        self, url: str, start: int, end: int, etag: Optional[str] = None
+    ) -> bytes:
+        return s3_get_range(url, start, end, etag)
+
+    def open_read(self, url: str) -> io.RawIOBase:
+        # A plain HEAD is enough here, stat() also asks for the checksums.
+        head = s3_head(url)
+        etag = head["ETag"]
+        return RangeReader(
+            lambda start, end: s3_get_range(url, start, end, etag),
+            head["ContentLength"],
+            get_config("stream_block_size"),
+            name=url,
+        )
+
+    def download(
+        self,
+        url: str,
+        fileobj: IO,
+        metadata: Dict[str, Any],
+        hasher: ETagHasher,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        show_progress: bool = True,
+    ) -> None:
+        s3_download_fileobj(url, HashingWriter(fileobj, hasher), transfer_config)
+
+    def open_write(self, url: str) -> Writer:
+        return S3MultipartWriter(
+            url, get_config("s3_upload_part_size"), get_config("s3_max_concurrency")
+        )
+
+    def upload(
+        self,
+        path: str,
+        url: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    ) -> None:
+        s3_upload_file(url=url, filename=path, transfer_config=transfer_config)
+
+    def upload_folder(
+        self,
+        url: str,
+        path: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        max_workers: int = 8,
+        include: Optional[Sequence[str]] = None,
+        exclude: Optional[Sequence[str]] = None,
+        skip_unchanged: bool = True,
+        dry_run: bool = False,
+    ) -> List[str]:
+        return s3_upload_folder(
+            url=url,
+            path=path,
+            transfer_config=transfer_config,
+            max_workers=max_workers,
+            include=include,
+            exclude=exclude,
+            skip_unchanged=skip_unchanged,
+            dry_run=dry_run,
+        )
+
+    def download_folder(
+        self,
+        url: str,
+        path: str,
+        transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+        max_workers: int = 8,
+        skip_unchanged: bool = True,
+    ) -> List[str]:
+        return s3_download_folder(
+            url=url,
+            path=path,
+            transfer_config=transfer_config,
+            max_workers=max_workers,
+            skip_unchanged=skip_unchanged,
+        )
+
+    def list(self, url: str) -> Iterator[Dict[str, Any]]:
+        bucket_name, _ = split_s3_path(url)
+        for obj in s3_list_objects(url):
+            yield {
+                "url": "s3://{}/{}".format(bucket_name, obj["Key"]),
+                "etag": obj["ETag"],
+                "size": obj["Size"],
+            }
+
+    def delete(
+        self,
+        url: str,
+        recursive: bool = True,
+        max_workers: int = 8,
+        dry_run: bool = False,
+    ) -> Tuple[List[str], Dict[str, str]]:
+        return s3_remove(
+            url, recursive=recursive, max_workers=max_workers, dry_run=dry_run
+        )
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        s3_copy(src_url, dst_url)
@@ -0,0 +1,540 @@
+"""キャッシュディレクトリの管理
+
+```shell
+$ python -m cloudio.cache list
+$ python -m cloudio.cache size
+$ python -m cloudio.cache evict s3://bucket/hoge.txt
+$ python -m cloudio.cache prune --max-bytes 100000000000 --max-age 604800
+$ python -m cloudio.cache verify
+```
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set
+
+from cloudio.cached_path import (
+    evict_from_memory,
+    filename_to_url,
+    get_blob_path,
+    url_to_filename,
+)
+from cloudio.config import get_config
+from cloudio.lock import file_lock
+from cloudio.hashing import ETagHasher
+from cloudio.stats import incr
+
+logger = logging.getLogger(__name__)
+
+# 自動のpruneで、他のプロセスによる増減を反映するためにキャッシュディレクトリを走査し直す間隔 (秒)
+RESCAN_INTERVAL = 5 * 60
+
+_USAGE: Dict[str, List[float]] = {}
+_USAGE_LOCK = threading.Lock()
+
+
+class CacheEntry(NamedTuple):
+    filename: str
+    path: str
+    url: str
+    etag: Optional[str]
+    size: int
+    accessed_at: float
+    # cache_decompressで decompressed/ に展開したファイルのバイト数
+    decompressed_size: int = 0
+
+
+def _cache_dir(cache_dir: Optional[str]) -> str:
+    return get_config("cache_dir") if cache_dir is None else str(cache_dir)
+
+
+def list_entries(cache_dir: Optional[str] = None) -> List[CacheEntry]:
+    """キャッシュされている全エントリを、最後にアクセスされた順に返す"""
+    cache_dir = _cache_dir(cache_dir)
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for dir_entry in os.scandir(cache_dir):
+        if not dir_entry.name.endswith(".json") or not dir_entry.is_file():
+            continue
+        filename = dir_entry.name[: -len(".json")]
+        try:
+            url, etag = filename_to_url(filename, cache_dir)
+            path = os.path.join(cache_dir, filename)
+            nbytes = os.path.getsize(path)
+            accessed_at = dir_entry.stat().st_mtime
+        except (FileNotFoundError, ValueError, KeyError):
+            # Being written or removed right now, or not a cache entry.
+            continue
+        try:
+            decompressed_size = os.path.getsize(
+                os.path.join(cache_dir, "decompressed", filename)
+            )
+        except FileNotFoundError:
+            decompressed_size = 0
+        entries.append(
+            CacheEntry(
+                filename, path, url, etag, nbytes, accessed_at, decompressed_size
+            )
+        )
+    return sorted(entries, key=lambda entry: entry.accessed_at)
+
+
+def _file_id(path: str) -> Any:
+    """同じ内容をハードリンクで共有しているエントリで同じになる値を返す"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return path
+    return (stat.st_dev, stat.st_ino)
+
+
+def _total_size(entries: Sequence[CacheEntry]) -> int:
+    return sum({_file_id(entry.path): entry.size for entry in entries}.values()) + sum(
+        entry.decompressed_size for entry in entries
+    )
+
+
+def _mirrors(cache_dir: str) -> Dict[str, Dict[str, Any]]:
+    """folders/ にミラーしたディレクトリのパスと、そのURLとリンクしているエントリのファイル名を返す"""
+    folders_dir = os.path.join(cache_dir, "folders")
+    if not os.path.isdir(folders_dir):
+        return {}
+    mirrors = {}
+    for dir_entry in os.scandir(folders_dir):
+        if not dir_entry.name.endswith(".json"):
+            continue
+        try:
+            with open(dir_entry.path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            continue
+        mirrors[dir_entry.path[: -len(".json")]] = manifest
+    return mirrors
+
+
+def _copied_size(folder_path: str, file_ids: Set[Any]) -> int:
+    """folder_pathのファイルのうち、file_idsのエントリとハードリンクで共有していないもののバイト数を返す"""
+    total = 0
+    for root, _, names in os.walk(folder_path):
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if (stat.st_dev, stat.st_ino) not in file_ids:
+                total += stat.st_size
+    return total
+
+
+def size(cache_dir: Optional[str] = None) -> int:
+    """キャッシュされているファイルの合計バイト数を返す
+
+    共有されているファイルは1回だけ数え、decompressed/ に展開したファイルと、
+    folders/ にミラーしたディレクトリのうちエントリと共有していないファイルも含める
+    """
+    cache_dir = _cache_dir(cache_dir)
+    entries = list_entries(cache_dir)
+    file_ids = {_file_id(entry.path) for entry in entries}
+    return _total_size(entries) + sum(
+        _copied_size(folder_path, file_ids) for folder_path in _mirrors(cache_dir)
+    )
+
+
+def _remove_index(cache_dir: str, url: str, filename: str) -> None:
+    """urlのインデックスがfilenameを指していれば削除する"""
+    index_path = os.path.join(cache_dir, "index", url_to_filename(url) + ".json")
+    try:
+        with open(index_path) as index_file:
+            index_entry = json.load(index_file)
+        if index_entry["filename"] == filename:
+            os.remove(index_path)
+    except (OSError, ValueError, KeyError):
+        pass
+
+
+def _remove_mirror(
+    cache_dir: str, folder_path: str, url: Optional[str], timeout: Optional[float]
+) -> bool:
+    """folders/ のミラーを削除する。timeout秒以内にロックが取れなければFalseを返す"""
+    name = os.path.basename(folder_path)
+    lock_path = os.path.join(cache_dir, "locks", name + ".lock")
+    try:
+        with file_lock(lock_path, timeout=timeout):
+            shutil.rmtree(folder_path, ignore_errors=True)
+            for path in (folder_path + ".json", lock_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    except TimeoutError:
+        return False
+    if url is not None:
+        _remove_index(cache_dir, url, os.path.join("folders", name))
+    logger.info("removed mirror %s of %s", folder_path, url)
+    return True
+
+
+def _remove_orphan_mirrors(
+    cache_dir: str, filenames: Set[str], mirrors: Dict[str, Dict[str, Any]]
+) -> None:
+    """なくなったエントリをリンクしているミラーと、記録のないミラーを削除する
+
+    filenamesは存在が分かっているエントリのファイル名。mirrors (_mirrorsの返り値) からも削除する
+    """
+    for folder_path, manifest in list(mirrors.items()):
+        if not all(
+            filename in filenames or os.path.exists(os.path.join(cache_dir, filename))
+            for filename in manifest.get("filenames", [])
+        ):
+            _remove_mirror(cache_dir, folder_path, manifest.get("url"), timeout=0)
+            del mirrors[folder_path]
+    folders_dir = os.path.join(cache_dir, "folders")
+    if os.path.isdir(folders_dir):
+        for dir_entry in os.scandir(folders_dir):
+            # Mirrored by an older version, or interrupted before recording it.
+            if dir_entry.is_dir() and not os.path.exists(dir_entry.path + ".json"):
+                _remove_mirror(cache_dir, dir_entry.path, None, timeout=0)
+
+
+def _remove_entry(
+    entry: CacheEntry,
+    cache_dir: str,
+    mirrors: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> bool:
+    """entryを削除する。ダウンロード中などでロックが取れなければ何もせずFalseを返す
+
+    entryをリンクしているミラーも削除し、mirrors (_mirrorsの返り値) からも削除する。
+    mirrorsを省略するとcache_dirを走査する
+    """
+    lock_path = os.path.join(cache_dir, "locks", entry.filename + ".lock")
+    decompressed_lock_path = os.path.join(
+        cache_dir, "locks", entry.filename + ".decompressed.lock"
+    )
+    try:
+        with file_lock(lock_path, timeout=0), file_lock(
+            decompressed_lock_path, timeout=0
+        ):
+            try:
+                with open(entry.path + ".json") as meta_file:
+                    blob = json.load(meta_file).get("blob")
+            except (OSError, ValueError):
+                blob = None
+            decompressed = os.path.join(cache_dir, "decompressed", entry.filename)
+            # Waiters on the locks notice that the files are gone and lock new ones.
+            for path in (
+                entry.path,
+                entry.path + ".json",
+                decompressed,
+                lock_path,
+                decompressed_lock_path,
+            ):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    except TimeoutError:
+        return False
+    incr("cache.eviction")
+    evict_from_memory(cache_dir, entry.url, entry.etag)
+
+    # Mirrored folders would keep the content on disk and be incomplete without it.
+    if mirrors is None:
+        mirrors = _mirrors(cache_dir)
+    for folder_path, manifest in list(mirrors.items()):
+        if entry.filename in manifest.get("filenames", []) and _remove_mirror(
+            cache_dir,
+            folder_path,
+            manifest.get("url"),
+            timeout=get_config("cache_lock_timeout"),
+        ):
+            del mirrors[folder_path]
+
+    # The blob the entry may have shared, which is only removed once orphaned.
+    blob_path = get_blob_path(cache_dir, blob)
+    if blob_path is not None:
+        _remove_if_orphan(blob_path)
+
+    _remove_index(cache_dir, entry.url, entry.filename)
+    logger.info("evicted %s (%s) from cache", entry.url, entry.path)
+    return True
+
+
+def evict(url: str, cache_dir: Optional[str] = None) -> List[CacheEntry]:
+    """urlのキャッシュをETagによらず全て削除し、削除したエントリを返す"""
+    cache_dir = _cache_dir(cache_dir)
+    url_hash = url_to_filename(url)
+    mirrors = _mirrors(cache_dir)
+    evicted = [
+        entry
+        for entry in list_entries(cache_dir)
+        if entry.url == url
+        and (entry.filename == url_hash or entry.filename.startswith(url_hash + "."))
+        and _remove_entry(entry, cache_dir, mirrors)
+    ]
+    try:
+        os.remove(os.path.join(cache_dir, "index", url_hash + ".json"))
+    except FileNotFoundError:
+        pass
+    return evicted
+
+
+def prune(
+    cache_dir: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    max_age: Optional[float] = None,
+    keep: Sequence[str] = (),
+) -> List[CacheEntry]:
+    """キャッシュを削減し、削除したエントリを返す
+
+    1. 同じURLのより新しいETagのエントリに置き換えられた古いエントリ
+    2. 最後のアクセスからmax_age秒以上経ったエントリ
+    3. 合計がmax_bytes以下になるまで、最後のアクセスが古い順 (LRU) にエントリ
+    を削除する。max_bytes, max_ageを省略すると設定の cache_max_bytes, cache_max_age を使う。
+    keepに含まれるパスのエントリは削除しない
+    """
+    cache_dir = _cache_dir(cache_dir)
+    if max_bytes is None:
+        max_bytes = get_config("cache_max_bytes")
+    if max_age is None:
+        max_age = get_config("cache_max_age")
+
+    now = time.time()
+    entries = list_entries(cache_dir)
+    mirrors = _mirrors(cache_dir)
+    evicted = []
+    remaining = []
+    for entry in entries:
+        if entry.path in keep:
+            remaining.append(entry)
+            continue
+        if (max_age is not None and now - entry.accessed_at > max_age) or _superseded(
+            entry, cache_dir
+        ):
+            if _remove_entry(entry, cache_dir, mirrors):
+                evicted.append(entry)
+                continue
+        remaining.append(entry)
+
+    _remove_orphan_mirrors(cache_dir, {entry.filename for entry in remaining}, mirrors)
+
+    # Entries sharing a blob only free the space when the last of them goes.
+    file_ids = {entry.path: _file_id(entry.path) for entry in remaining}
+    links = Counter(file_ids.values())
+    copied = {
+        folder_path: _copied_size(folder_path, set(links)) for folder_path in mirrors
+    }
+    total = _total_size(remaining) + sum(copied.values())
+    if max_bytes is not None:
+        for entry in remaining:
+            if total <= max_bytes:
+                break
+            if entry.path not in keep and _remove_entry(entry, cache_dir, mirrors):
+                evicted.append(entry)
+                total -= entry.decompressed_size
+                links[file_ids[entry.path]] -= 1
+                if links[file_ids[entry.path]] == 0:
+                    total -= entry.size
+                # _remove_entry also removed the folders mirroring the entry.
+                for folder_path in [path for path in copied if path not in mirrors]:
+                    total -= copied.pop(folder_path)
+
+    blobs_dir = os.path.join(cache_dir, "blobs")
+    if os.path.isdir(blobs_dir):
+        for dir_entry in os.scandir(blobs_dir):
+            if dir_entry.name.endswith(".tmp"):
+                # Metadata being written by _store_blob.
+                continue
+            if dir_entry.name.endswith(".json"):
+                if not os.path.exists(dir_entry.path[: -len(".json")]):
+                    _remove_file(dir_entry.path)
+            else:
+                _remove_if_orphan(dir_entry.path)
+
+    _remove_orphan_locks(cache_dir)
+
+    with _USAGE_LOCK:
+        _USAGE[cache_dir] = [total, now]
+    return evicted
+
+
+def _remove_orphan_locks(cache_dir: str) -> None:
+    """守っているファイルやディレクトリがなく、誰も持っていないロックファイルを削除する"""
+    locks_dir = os.path.join(cache_dir, "locks")
+    if not os.path.isdir(locks_dir):
+        return
+    for dir_entry in os.scandir(locks_dir):
+        if not dir_entry.name.endswith(".lock"):
+            continue
+        name = dir_entry.name[: -len(".lock")]
+        guarded = [
+            os.path.join(cache_dir, name),
+            os.path.join(cache_dir, "folders", name),
+        ]
+        if name.endswith(".decompressed"):
+            guarded.append(
+                os.path.join(cache_dir, "decompressed", name[: -len(".decompressed")])
+            )
+        try:
+            with file_lock(dir_entry.path, timeout=0):
+                if not any(os.path.exists(path) for path in guarded):
+                    os.remove(dir_entry.path)
+        except (TimeoutError, FileNotFoundError):
+            # Held by a download, or removed by another process.
+            pass
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_if_orphan(blob_path: str) -> None:
+    """どのエントリからもハードリンクされなくなったblobを、そのメタデータとともに削除する"""
+    try:
+        if os.stat(blob_path).st_nlink == 1:
+            os.remove(blob_path)
+            _remove_file(blob_path + ".json")
+    except FileNotFoundError:
+        pass
+
+
+def _superseded(entry: CacheEntry, cache_dir: str) -> bool:
+    index_path = os.path.join(cache_dir, "index", url_to_filename(entry.url) + ".json")
+    try:
+        with open(index_path) as index_file:
+            return json.load(index_file)["filename"] != entry.filename
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def _is_intact(entry: CacheEntry) -> bool:
+    """entryのファイルが、ダウンロード時に検証したサイズとチェックサムに一致するかを返す"""
+    try:
+        with open(entry.path + ".json") as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return True
+    if "size" in meta and entry.size != meta["size"]:
+        return False
+    if "md5" not in meta and "sha256" not in meta:
+        return True
+
+    hasher = ETagHasher(part_size=meta.get("part_size"), sha256="sha256" in meta)
+    with open(entry.path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    if "md5" in meta and hasher.etag() != meta["md5"]:
+        return False
+    if "sha256" in meta and hasher.sha256() != meta["sha256"]:
+        return False
+    return True
+
+
+def verify(
+    cache_dir: Optional[str] = None, max_workers: int = 8, evict: bool = True
+) -> List[CacheEntry]:
+    """キャッシュされているファイルをmax_workers並列で検証し、壊れているエントリを返す
+
+    ダウンロード時に記録したサイズとMD5, SHA-256を計算し直して比較する
+    (ハードリンクで共有されているファイルは1回だけ計算する)。
+    evictがTrueの場合は、壊れているエントリを削除する
+    """
+    cache_dir = _cache_dir(cache_dir)
+    entries: Dict[Any, List[CacheEntry]] = {}
+    for entry in list_entries(cache_dir):
+        entries.setdefault(_file_id(entry.path), []).append(entry)
+
+    def check(file_id: Any) -> List[CacheEntry]:
+        try:
+            return [entry for entry in entries[file_id] if not _is_intact(entry)]
+        except FileNotFoundError:
+            # Evicted while verifying.
+            return []
+
+    corrupted = []
+    mirrors = _mirrors(cache_dir)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for bad_entries in executor.map(check, entries):
+            for entry in bad_entries:
+                logger.warning("%s (%s) is corrupted", entry.url, entry.path)
+                if evict:
+                    _remove_entry(entry, cache_dir, mirrors)
+                corrupted.append(entry)
+    return corrupted
+
+
+def record_download(cache_dir: str, cache_path: str) -> None:
+    """cache_pathにダウンロードされたことを記録し、必要であればpruneする
+
+    ディレクトリの走査は、合計が cache_max_bytes を超えたときか、
+    前回の走査から RESCAN_INTERVAL 秒経ったときにだけ行う
+    """
+    max_bytes = get_config("cache_max_bytes")
+    max_age = get_config("cache_max_age")
+    if max_bytes is None and max_age is None:
+        return
+
+    with _USAGE_LOCK:
+        usage = _USAGE.get(cache_dir)
+        if usage is not None and time.time() - usage[1] < RESCAN_INTERVAL:
+            usage[0] += os.path.getsize(cache_path)
+            if max_bytes is None or usage[0] <= max_bytes:
+                return
+    prune(cache_dir, keep=(cache_path,))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="cloudio-cache", description="cloudioのキャッシュを管理する"
+    )
+    parser.add_argument("--cache-dir", default=None)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="キャッシュされているエントリを表示する")
+    subparsers.add_parser("size", help="キャッシュの合計バイト数を表示する")
+    evict_parser = subparsers.add_parser("evict", help="URLのキャッシュを削除する")
+    evict_parser.add_argument("urls", nargs="+")
+    prune_parser = subparsers.add_parser("prune", help="古いエントリを削除する")
+    prune_parser.add_argument("--max-bytes", type=int, default=None)
+    prune_parser.add_argument("--max-age", type=float, default=None)
+    verify_parser = subparsers.add_parser(
+        "verify", help="壊れているエントリを検出して削除する"
+    )
+    verify_parser.add_argument("--max-workers", type=int, default=8)
+    verify_parser.add_argument(
+        "--no-evict", action="store_true", help="削除せず表示だけする"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for entry in list_entries(args.cache_dir):
+            accessed_at = time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(entry.accessed_at)
+            )
+            print(f"{accessed_at}\t{entry.size}\t{entry.url}\t{entry.path}")
+    elif args.command == "size":
+        print(size(args.cache_dir))
+    elif args.command == "evict":
+        for url in args.urls:
+            for entry in evict(url, args.cache_dir):
+                print(f"evicted {entry.url}\t{entry.path}")
+    elif args.command == "prune":
+        for entry in prune(args.cache_dir, args.max_bytes, args.max_age):
+            print(f"evicted {entry.url}\t{entry.path}")
+    elif args.command == "verify":
+        for entry in verify(args.cache_dir, args.max_workers, not args.no_evict):
+            print(f"corrupted {entry.url}\t{entry.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,19 +9,30 @@ import json
 import logging
 import os
 import shutil
+import stat
+import sys
 import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha256
 from pathlib import Path
-from typing import IO, Tuple, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type, Union
 from urllib.parse import urlparse
-
-import requests
-from cloudio.config import get_config
-from cloudio.s3 import s3_download_fileobj, s3_etag
+from uuid import uuid4
+
+from cloudio.backends import get_backend, is_remote
+from cloudio.backends.local import local_path
+from cloudio.config import add_config_callback, get_config
+from cloudio.lock import file_lock
+from cloudio.hashing import ETagHasher
+from cloudio.stats import incr, timer
 from cloudio.tqdm import Tqdm
-from cloudio.utils import to_str
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from cloudio.utils import relative_parts, to_str
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
 
 logger = logging.getLogger(__name__)
 
@@ -68,12 +79,22 @@ def filename_to_url(filename: str, cache_dir: str = None) -> Tuple[str, str]:
     return url, etag
 
 
-def cached_path(url_or_filename: Union[str, Path], cache_dir: str = None) -> str:
+def cached_path(
+    url_or_filename: Union[str, Path],
+    cache_dir: str = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> str:
     """
     Given something that might be a URL (or might be a local path),
     determine which. If it's a URL, download the file and cache it, and
     return the path to the cached file. If it's already a local path,
     make sure the file exists and then return the path.
+    Which URLs are downloaded is up to the backend registered for their
+    scheme, see `cloudio.backends`. A URL ending with `/` is treated as a
+    directory if the backend can list it (e.g. S3), see `get_folder_from_cache`.
+
+    `transfer_config` overrides the S3 transfer settings for this call only,
+    see `cloudio.s3.get_transfer_config`.
     """
     url_or_filename = to_str(url_or_filename)
     if cache_dir is None:
@@ -82,13 +103,16 @@ def cached_path(url_or_filename: Union[str, Path], cache_dir: str = None) -> str
     url_or_filename = os.path.expanduser(url_or_filename)
     parsed = urlparse(url_or_filename)
 
-    if parsed.scheme in ("http", "https", "s3"):
+    if is_remote(url_or_filename):
+        if url_or_filename.endswith("/") and get_backend(url_or_filename).folders:
+            # Directory, so get everything under it from the cache
+            return get_folder_from_cache(url_or_filename, cache_dir, transfer_config)
         # URL, so get it from the cache (downloading if necessary)
-        return get_from_cache(url_or_filename, cache_dir)
-    elif os.path.exists(url_or_filename):
+        return get_from_cache(url_or_filename, cache_dir, transfer_config)
+    elif os.path.exists(local_path(url_or_filename)):
         # File, and it exists.
-        return url_or_filename
-    elif parsed.scheme == "":
+        return local_path(url_or_filename)
+    elif parsed.scheme in ("", "file"):
         # File, but it doesn't exist.
         raise FileNotFoundError("file {} not found".format(url_or_filename))
     else:
@@ -107,97 +131,643 @@ def is_url_or_existing_file(url_or_filename: Union[str, Path, None]) -> bool:
         return False
     url_or_filename = to_str(url_or_filename)
     url_or_filename = os.path.expanduser(url_or_filename)
-    parsed = urlparse(url_or_filename)
-    return parsed.scheme in ("http", "https", "s3") or os.path.exists(url_or_filename)
+    return is_remote(url_or_filename) or os.path.exists(local_path(url_or_filename))
+
+
+def _index_path(url: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, "index", url_to_filename(url) + ".json")
+
+
+def _read_index(url: str, cache_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the index entry (`url`, `etag`, `filename`, `validated_at`) for `url`,
+    or `None` if `url` has never been cached in `cache_dir`.
+    """
+    try:
+        with open(_index_path(url, cache_dir)) as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_index(url: str, cache_dir: str, etag: Optional[str], filename: str) -> None:
+    index_path = _index_path(url, cache_dir)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    entry = {
+        "url": url,
+        "etag": etag,
+        "filename": filename,
+        "validated_at": time.time(),
+    }
+    _write_json_atomic(index_path, entry)
+
+
+_NEW_FILE_MODE: Optional[int] = None
+_NEW_FILE_MODE_LOCK = threading.Lock()
+
+
+def _new_file_mode() -> int:
+    """
+    Return the mode open() would give a new file. tempfile creates its files
+    readable by the owner only, which would hide a shared cache from other users.
+    """
+    global _NEW_FILE_MODE
+    with _NEW_FILE_MODE_LOCK:
+        if _NEW_FILE_MODE is None:
+            # The umask can only be read by setting it.
+            umask = os.umask(0)
+            os.umask(umask)
+            _NEW_FILE_MODE = 0o666 & ~umask
+        return _NEW_FILE_MODE
+
+
+def _write_json_atomic(path: str, obj: Any) -> None:
+    dirname, basename = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=dirname, prefix=basename, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(obj, temp_file)
+        os.chmod(temp_path, _new_file_mode())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _network_errors() -> Tuple[Type[BaseException], ...]:
+    """
+    Return the errors meaning the server could not be reached at all. Only
+    the clients that are already imported can have raised one, so the others
+    are left out rather than imported just for this.
+    """
+    errors: List[Type[BaseException]] = []
+    if "requests" in sys.modules:
+        import requests
+
+        errors += [requests.ConnectionError, requests.Timeout]
+    if "botocore" in sys.modules:
+        import botocore.exceptions
+
+        errors.append(botocore.exceptions.ConnectionError)
+    return tuple(errors)
+
+
+def _stale_cache_path(url: str, cache_dir: str, entry: Optional[Dict[str, Any]]) -> str:
+    """
+    Called while handling one of `_network_errors()`. Return the cached path of
+    `url` without revalidating it if the `cache_revalidate` config allows
+    that, otherwise re-raise the error.
+    """
+    if entry is None or get_config("cache_revalidate") == "always":
+        raise
+    cache_path = os.path.join(cache_dir, entry["filename"])
+    if not os.path.exists(cache_path):
+        raise
+    logger.warning("could not revalidate %s, using cached %s", url, cache_path)
+    return cache_path
 
 
-def session_with_backoff() -> requests.Session:
+def _touch(cache_path: str) -> None:
     """
-    We ran into an issue where http requests to s3 were timing out,
-    possibly because we were making too many requests too quickly.
-    This helper function returns a requests session that has retry-with-backoff
-    built in.
-    see stackoverflow.com/questions/23267409/how-to-implement-retry-mechanism-into-pyth
-    on-requests-library
+    Record an access to the entry at `cache_path` in the mtime of its
+    metadata file, which is what LRU eviction goes by.
     """
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
-    session.mount("http://", HTTPAdapter(max_retries=retries))
-    session.mount("https://", HTTPAdapter(max_retries=retries))
+    try:
+        os.utime(cache_path + ".json")
+    except OSError:
+        pass
 
-    return session
 
+def _is_fresh(entry: Dict[str, Any]) -> bool:
+    """
+    Decide from the `cache_revalidate` config whether the cached `entry`
+    can be used without asking the server for the current ETag.
+    """
+    policy = get_config("cache_revalidate")
+    if policy == "always":
+        return False
+    if policy in ("never", "offline"):
+        return True
+    if isinstance(policy, (int, float)) and not isinstance(policy, bool):
+        return time.time() - entry["validated_at"] < policy
+    raise ValueError(
+        "cache_revalidate must be 'always', 'never', 'offline' or seconds, "
+        "got {!r}".format(policy)
+    )
 
-def http_get(url: str, temp_file: IO) -> None:
-    with session_with_backoff() as session:
-        req = session.get(url, stream=True)
-        content_length = req.headers.get("Content-Length")
-        total = int(content_length) if content_length is not None else None
-        progress = Tqdm.tqdm(unit="B", total=total)
-        for chunk in req.iter_content(chunk_size=1024):
-            if chunk:  # filter out keep-alive new chunks
-                progress.update(len(chunk))
-                temp_file.write(chunk)
-        progress.close()
+
+def _get_metadata(url: str) -> Dict[str, Any]:
+    """
+    Return the ETag and size of `url`, whether the server accepts byte range
+    requests, and the checksums the downloaded content can be verified with:
+    `md5` in the form of an S3 ETag, computed over parts of `part_size` if it
+    is a multipart one, and `sha256` in base64. See `Backend.stat`.
+    """
+    return get_backend(url).stat(url)
 
 
-# TODO(joelgrus): do we want to do checksums or anything like that?
-def get_from_cache(url: str, cache_dir: str = None) -> str:
+def _verify(url: str, metadata: Dict[str, Any], hasher: ETagHasher) -> Dict[str, Any]:
+    """
+    Check the content fed to `hasher` against `metadata` and raise IOError if
+    it is truncated or corrupted. Return the size and verified checksums, to
+    be stored with the cache entry.
+    """
+    verified: Dict[str, Any] = {"size": hasher.size}
+    if metadata.get("size") is not None and hasher.size != metadata["size"]:
+        raise IOError(
+            "downloaded {} bytes from {}, expected {}".format(
+                hasher.size, url, metadata["size"]
+            )
+        )
+    if metadata.get("md5") is not None:
+        if hasher.etag() != metadata["md5"]:
+            raise IOError(
+                "MD5 of {} is {}, expected {}".format(
+                    url, hasher.etag(), metadata["md5"]
+                )
+            )
+        verified["md5"] = metadata["md5"]
+        if metadata.get("part_size") is not None:
+            verified["part_size"] = metadata["part_size"]
+    if metadata.get("sha256") is not None:
+        if hasher.sha256() != metadata["sha256"]:
+            raise IOError(
+                "SHA-256 of {} is {}, expected {}".format(
+                    url, hasher.sha256(), metadata["sha256"]
+                )
+            )
+        verified["sha256"] = metadata["sha256"]
+    return verified
+
+
+def _download_to_cache(
+    url: str,
+    cache_path: str,
+    metadata: Dict[str, Any],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    show_progress: bool = True,
+) -> Dict[str, Any]:
+    # Download to a partial file in the cache dir, then rename it into place
+    # once finished and verified. Otherwise you get corrupt cache entries if
+    # the download gets interrupted. Being on the same filesystem, the rename
+    # is atomic and the data never has to be copied.
+    backend = get_backend(url)
+    if "md5" not in metadata:
+        # Only the ETag is known, from a listing.
+        etag = metadata["etag"]
+        metadata = backend.stat(url)
+        if metadata["etag"] != etag:
+            raise IOError("{} was modified while being cached".format(url))
+    metadata = backend.checksums(url, metadata)
+    hasher = ETagHasher(
+        part_size=metadata.get("part_size"), sha256=bool(metadata.get("sha256"))
+    )
+    cache_dir, filename = os.path.split(cache_path)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_dir, prefix=filename + ".", suffix=".partial", delete=False
+    ) as temp_file:
+        try:
+            logger.info("%s not found in cache, downloading to %s", url, temp_file.name)
+
+            # GET file object
+            with timer("download"):
+                backend.download(
+                    url, temp_file, metadata, hasher, transfer_config, show_progress
+                )
+                temp_file.flush()
+            incr("download.bytes", hasher.size)
+        except BaseException:
+            temp_file.close()
+            os.remove(temp_file.name)
+            raise
+
+    with timer("commit"):
+        try:
+            verified = _verify(url, metadata, hasher)
+        except BaseException:
+            os.remove(temp_file.name)
+            raise
+
+        logger.info("creating metadata file for %s", cache_path)
+        meta = {"url": url, "etag": metadata["etag"], **verified}
+        if verified.get("md5") is not None:
+            # The blob the content is shared through, see `get_blob_path`.
+            meta["blob"] = verified["md5"]
+        _write_json_atomic(cache_path + ".json", meta)
+
+        logger.info("moving %s to cache at %s", temp_file.name, cache_path)
+        os.chmod(temp_file.name, _new_file_mode())
+        os.replace(temp_file.name, cache_path)
+    return verified
+
+
+def get_blob_path(cache_dir: str, md5: Optional[str]) -> Optional[str]:
+    """
+    Return the path under `cache_dir/blobs` where content with `md5` (as
+    reported by `Backend.stat`) is shared between all the URLs serving it, or
+    `None` without one. An ETag that merely looks like an MD5 is not enough,
+    since it may only identify a version of one URL.
+    """
+    if md5 is None:
+        return None
+    return os.path.join(cache_dir, "blobs", md5)
+
+
+def _link_from_blob(url: str, etag: str, blob_path: str, cache_path: str) -> bool:
+    """
+    Create the entry for `url` at `cache_path` as a hardlink to `blob_path`,
+    with the size and checksums verified when the blob was downloaded.
+    Return `False` if there is no such blob.
+    """
+    temp_path = "{}.{}.tmp".format(cache_path, uuid4().hex)
+    try:
+        os.link(blob_path, temp_path)
+    except OSError:
+        return False
+    try:
+        try:
+            with open(blob_path + ".json") as meta_file:
+                verified = json.load(meta_file)
+        except (OSError, ValueError):
+            verified = {}
+        meta = {
+            "url": url,
+            "etag": etag,
+            **verified,
+            "blob": os.path.basename(blob_path),
+        }
+        _write_json_atomic(cache_path + ".json", meta)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return True
+
+
+def _store_blob(cache_path: str, blob_path: str, verified: Dict[str, Any]) -> None:
+    """
+    Make the freshly downloaded `cache_path` available to other URLs as
+    `blob_path`, or share the existing blob if another URL stored it first.
+    `verified` is kept in `blob_path + ".json"` for the entries linked from it.
+    """
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    try:
+        os.link(cache_path, blob_path)
+    except FileExistsError:
+        # Downloaded through another URL at the same time, so keep one copy.
+        temp_path = "{}.{}.tmp".format(cache_path, uuid4().hex)
+        try:
+            os.link(blob_path, temp_path)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+    except OSError:
+        # Hardlinks are not supported here, so every URL keeps its own copy.
+        return
+    _write_json_atomic(blob_path + ".json", verified)
+
+
+def get_from_cache(
+    url: str,
+    cache_dir: str = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    show_progress: bool = True,
+    etag: Optional[str] = None,
+) -> str:
     """
     Given a URL, look for the corresponding dataset in the local cache.
     If it's not there, download it. Then return the path to the cached file.
+    Pass `show_progress=False` to hide the download progress bar, and the
+    `etag` of the object if it is already known (e.g. from a listing) to skip
+    asking the server for it.
+
+    Depending on the `cache_revalidate` config, a previously cached file
+    may be returned without checking its ETag on the server.
+
+    If the backend reports the MD5 of the content, as it does for S3, the file
+    is also hardlinked into `cache_dir/blobs`, so the same content reached through
+    another URL (another bucket, or a presigned HTTPS URL) is not downloaded
+    or stored again.
+
+    Downloads are verified against the size and any MD5 or SHA-256 the server
+    reports (see `_get_metadata`) while they are written, and an IOError is
+    raised instead of caching a truncated or corrupted file.
     """
     if cache_dir is None:
         cache_dir = get_config("cache_dir")
 
+    entry = _read_index(url, cache_dir)
+    if entry is not None and _is_fresh(entry):
+        cache_path = os.path.join(cache_dir, entry["filename"])
+        if os.path.exists(cache_path):
+            incr("cache.hit")
+            _touch(cache_path)
+            return cache_path
+
     os.makedirs(cache_dir, exist_ok=True)
 
     # Get eTag to add to filename, if it exists.
-    if url.startswith("s3://"):
-        etag = s3_etag(url)
+    if etag is not None:
+        metadata = {"etag": etag, "size": None, "accept_ranges": False}
     else:
-        with session_with_backoff() as session:
-            response = session.head(url, allow_redirects=True)
-        if response.status_code != 200:
-            raise IOError(
-                "HEAD request failed for url {} with status code {}".format(
-                    url, response.status_code
-                )
-            )
-        etag = response.headers.get("ETag")
+        try:
+            with timer("head"):
+                metadata = _get_metadata(url)
+        except _network_errors():
+            cache_path = _stale_cache_path(url, cache_dir, entry)
+            incr("cache.stale_hit")
+            _touch(cache_path)
+            return cache_path
 
+    etag = metadata["etag"]
     filename = url_to_filename(url, etag)
 
     # get cache path to put the file
     cache_path = os.path.join(cache_dir, filename)
 
+    downloaded = False
     if not os.path.exists(cache_path):
-        # Download to temporary file, then copy to cache dir once finished.
-        # Otherwise you get corrupt cache entries if the download gets interrupted.
-        with tempfile.NamedTemporaryFile() as temp_file:
-            logger.info("%s not found in cache, downloading to %s", url, temp_file.name)
+        # Only one thread or process downloads a given entry. The others wait
+        # for it here and then find the finished file.
+        lock_path = os.path.join(cache_dir, "locks", filename + ".lock")
+        with file_lock(lock_path, timeout=get_config("cache_lock_timeout")):
+            if not os.path.exists(cache_path):
+                blob_path = get_blob_path(cache_dir, metadata.get("md5"))
+                if blob_path is not None and _link_from_blob(
+                    url, etag, blob_path, cache_path
+                ):
+                    logger.info("reusing %s for %s", blob_path, url)
+                    incr("cache.blob_hit")
+                else:
+                    verified = _download_to_cache(
+                        url, cache_path, metadata, transfer_config, show_progress
+                    )
+                    downloaded = True
+                    blob_path = get_blob_path(cache_dir, verified.get("md5"))
+                    if blob_path is not None:
+                        _store_blob(cache_path, blob_path, verified)
+
+    if (
+        entry is None
+        or entry["filename"] != filename
+        or get_config("cache_revalidate") != "always"
+    ):
+        _write_index(url, cache_dir, etag, filename)
+
+    if downloaded:
+        incr("cache.miss")
+        # Imported here because cloudio.cache itself depends on this module.
+        from cloudio.cache import record_download
+
+        record_download(cache_dir, cache_path)
+    else:
+        incr("cache.hit")
+        _touch(cache_path)
 
-            # GET file object
-            if url.startswith("s3://"):
-                s3_download_fileobj(url, temp_file)
-            else:
-                http_get(url, temp_file)
+    return cache_path
 
-            # we are copying the file before closing it, so flush to avoid truncation
-            temp_file.flush()
-            # shutil.copyfileobj() starts at the current position, so go to the start
-            temp_file.seek(0)
 
-            logger.info("copying %s to cache at %s", temp_file.name, cache_path)
-            with open(cache_path, "wb") as cache_file:
-                shutil.copyfileobj(temp_file, cache_file)
+# Contents of small cached files by (cache_dir, url), least recently used first.
+_MEMORY_CACHE: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+_MEMORY_CACHE_BYTES = 0
+_MEMORY_CACHE_LOCK = threading.Lock()
 
-            logger.info("creating metadata file for %s", cache_path)
-            meta = {"url": url, "etag": etag}
-            meta_path = cache_path + ".json"
-            with open(meta_path, "w") as meta_file:
-                json.dump(meta, meta_file)
 
-            logger.info("removing temp file %s", temp_file.name)
+def _on_memory_cache_config_change(key: str, old_val: Any, new_val: Any) -> None:
+    if key in ("memory_cache_max_bytes", "memory_cache_max_object_size"):
+        clear_memory_cache()
 
-    return cache_path
+
+add_config_callback(_on_memory_cache_config_change)
+
+
+def clear_memory_cache() -> None:
+    """
+    Drop all the contents kept in memory by `get_from_memory_cache`.
+    """
+    global _MEMORY_CACHE_BYTES
+    with _MEMORY_CACHE_LOCK:
+        _MEMORY_CACHE.clear()
+        _MEMORY_CACHE_BYTES = 0
+
+
+def _memory_cache_hit(key: Tuple[str, str], entry: Dict[str, Any]) -> bytes:
+    with _MEMORY_CACHE_LOCK:
+        if key in _MEMORY_CACHE:
+            _MEMORY_CACHE.move_to_end(key)
+    incr("cache.memory_hit")
+    return entry["content"]
+
+
+def _memory_cache_put(key: Tuple[str, str], entry: Dict[str, Any]) -> None:
+    global _MEMORY_CACHE_BYTES
+    max_bytes = get_config("memory_cache_max_bytes")
+    with _MEMORY_CACHE_LOCK:
+        old = _MEMORY_CACHE.pop(key, None)
+        if old is not None:
+            _MEMORY_CACHE_BYTES -= len(old["content"])
+        _MEMORY_CACHE[key] = entry
+        _MEMORY_CACHE_BYTES += len(entry["content"])
+        while _MEMORY_CACHE_BYTES > max_bytes:
+            _, evicted = _MEMORY_CACHE.popitem(last=False)
+            _MEMORY_CACHE_BYTES -= len(evicted["content"])
+
+
+def evict_from_memory(cache_dir: str, url: str, etag: Optional[str]) -> None:
+    """
+    Drop the content of `url` with `etag` from memory, as its entry in
+    `cache_dir` is being removed.
+    """
+    global _MEMORY_CACHE_BYTES
+    with _MEMORY_CACHE_LOCK:
+        entry = _MEMORY_CACHE.get((cache_dir, url))
+        if entry is not None and entry["etag"] == etag:
+            del _MEMORY_CACHE[(cache_dir, url)]
+            _MEMORY_CACHE_BYTES -= len(entry["content"])
+
+
+def get_from_memory_cache(
+    url: str,
+    cache_dir: str = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> Union[bytes, str]:
+    """
+    Like `get_from_cache`, but also keep the content of small files in an
+    LRU in memory in front of the disk cache, and return it as bytes. Files
+    larger than the `memory_cache_max_object_size` config stay on disk only
+    and their cached path is returned instead, as for every file when the
+    `memory_cache_max_bytes` config is 0.
+
+    Contents in memory are validated like the files on disk, following the
+    `cache_revalidate` config, so a fresh one is returned without any system
+    call and otherwise after checking that its ETag did not change.
+    """
+    if cache_dir is None:
+        cache_dir = get_config("cache_dir")
+    max_bytes = get_config("memory_cache_max_bytes")
+    key = (cache_dir, url)
+
+    entry = _MEMORY_CACHE.get(key) if max_bytes else None
+    etag = None
+    if entry is not None:
+        if _is_fresh(entry):
+            return _memory_cache_hit(key, entry)
+        try:
+            with timer("head"):
+                etag = _get_metadata(url)["etag"]
+        except _network_errors():
+            if get_config("cache_revalidate") == "always":
+                raise
+            logger.warning("could not revalidate %s, using the copy in memory", url)
+            incr("cache.stale_hit")
+            return _memory_cache_hit(key, entry)
+        if etag == entry["etag"]:
+            entry["validated_at"] = time.time()
+            return _memory_cache_hit(key, entry)
+
+    cache_path = get_from_cache(url, cache_dir, transfer_config, etag=etag)
+    max_size = min(max_bytes, get_config("memory_cache_max_object_size"))
+    if not max_bytes or os.path.getsize(cache_path) > max_size:
+        return cache_path
+    # The index tells which ETag the file is and when it was last validated.
+    index = _read_index(url, cache_dir)
+    if index is None or index["filename"] != os.path.basename(cache_path):
+        return cache_path
+    with open(cache_path, "rb") as cache_file:
+        content = cache_file.read()
+    _memory_cache_put(
+        key,
+        {
+            "etag": index["etag"],
+            "validated_at": index["validated_at"],
+            "content": content,
+        },
+    )
+    return content
+
+
+def get_folder_from_cache(
+    url: str,
+    cache_dir: str = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    max_workers: int = 8,
+) -> str:
+    """
+    Given the URL of a "directory" (ending with `/`) on S3 or another backend
+    that can list it, download every object under it into the cache with `max_workers` threads, and return a local
+    directory that mirrors the prefix. The ETags come from a single listing,
+    so objects that are already cached are neither checked nor downloaded again.
+
+    The files in the directory are hardlinks to (or, where hardlinks are not
+    supported, copies of) the cached objects, and are made read-only so that
+    writing to them cannot corrupt the cache. They count toward the cache
+    size, and the directory is removed when one of the objects is evicted. Keys that would be mirrored
+    outside the directory (absolute paths or `..`) raise a ValueError, and a
+    prefix with no objects under it raises a FileNotFoundError.
+    """
+    if cache_dir is None:
+        cache_dir = get_config("cache_dir")
+
+    entry = _read_index(url, cache_dir)
+    if entry is not None and _is_fresh(entry):
+        folder_path = os.path.join(cache_dir, entry["filename"])
+        if os.path.isdir(folder_path):
+            return folder_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    try:
+        objects = [
+            obj for obj in get_backend(url).list(url) if not obj["url"].endswith("/")
+        ]
+    except _network_errors():
+        return _stale_cache_path(url, cache_dir, entry)
+    if not objects:
+        raise FileNotFoundError("file {} not found".format(url))
+
+    prefix = url.rstrip("/") + "/"
+    # Reject keys that would be mirrored outside the folder before downloading anything.
+    relative_paths = [
+        "/".join(relative_parts(obj["url"][len(prefix) :])) for obj in objects
+    ]
+
+    def fetch(obj: Dict[str, Any], relative_path: str) -> Tuple[str, str]:
+        cache_path = get_from_cache(
+            obj["url"],
+            cache_dir,
+            transfer_config,
+            show_progress=False,
+            etag=obj["etag"],
+        )
+        return relative_path, cache_path
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        files = list(
+            Tqdm.tqdm(
+                executor.map(fetch, objects, relative_paths),
+                total=len(objects),
+                unit="file",
+            )
+        )
+
+    filename = os.path.join("folders", url_to_filename(url))
+    folder_path = os.path.join(cache_dir, filename)
+    lock_path = os.path.join(cache_dir, "locks", url_to_filename(url) + ".lock")
+    with file_lock(lock_path, timeout=get_config("cache_lock_timeout")):
+        _mirror_folder(folder_path, files)
+        # Lets cloudio.cache count the mirror and remove it along with the
+        # entries it links.
+        _write_json_atomic(
+            folder_path + ".json",
+            {
+                "url": url,
+                "filenames": sorted(
+                    {os.path.basename(cache_path) for _, cache_path in files}
+                ),
+            },
+        )
+    _write_index(url, cache_dir, None, filename)
+
+    return folder_path
+
+
+def _mirror_folder(folder_path: str, files: List[Tuple[str, str]]) -> None:
+    """
+    Make `folder_path` contain exactly `files`, a list of
+    (relative path, cached file) pairs.
+    """
+    wanted = set()
+    for relative_path, cache_path in files:
+        target = os.path.join(folder_path, *relative_path.split("/"))
+        wanted.add(target)
+        if os.path.exists(target) and os.path.samefile(target, cache_path):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(target, uuid4().hex)
+        try:
+            os.link(cache_path, temp_path)
+        except OSError:
+            shutil.copyfile(cache_path, temp_path)
+        # A hardlink shares its mode with the cached object, which must not be
+        # modified either.
+        os.chmod(temp_path, stat.S_IMODE(os.stat(temp_path).st_mode) & ~0o222)
+        os.replace(temp_path, target)
+
+    for root, _, names in os.walk(folder_path):
+        for name in names:
+            path = os.path.join(root, name)
+            if path not in wanted:
+                os.remove(path)
+
+
+# The HTTP transport lives in cloudio.backends.http, so that requests is only
+# imported once a http(s) URL is used.
+_HTTP_NAMES = ("session_with_backoff", "http_get")
+
+
+def __getattr__(name: str) -> Any:
+    if name in _HTTP_NAMES:
+        from cloudio.backends import http
+
+        return getattr(http, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,177 @@
+"""copenで圧縮されたファイルを透過的に読み書きするためのコーデック
+
+gzip, bz2, xz (lzma) は標準ライブラリで、zstd, lz4 はそれぞれ extras の cloudio[zstd], cloudio[lz4] で
+zstandard, lz4 パッケージをインストールすると使える。読み込みも書き込みもストリーミングで行い、全体をメモリに載せることはない
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import re
+from typing import IO, Callable, Dict, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+from cloudio.config import get_config
+from cloudio.lock import file_lock
+
+
+def _open_gzip(fileobj: IO, mode: str, level: Optional[int]) -> IO:
+    if "w" in mode:
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=_level(level, 9))
+    return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+
+def _open_bz2(fileobj: IO, mode: str, level: Optional[int]) -> IO:
+    if "w" in mode:
+        return bz2.BZ2File(fileobj, mode="wb", compresslevel=_level(level, 9))
+    return bz2.BZ2File(fileobj, mode="rb")
+
+
+def _open_xz(fileobj: IO, mode: str, level: Optional[int]) -> IO:
+    if "w" in mode:
+        return lzma.LZMAFile(fileobj, mode="wb", preset=level)
+    return lzma.LZMAFile(fileobj, mode="rb")
+
+
+def _open_zstd(fileobj: IO, mode: str, level: Optional[int]) -> IO:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd requires zstandard. Run `pip install cloudio[zstd]`.")
+    if "w" in mode:
+        compressor = zstandard.ZstdCompressor(level=_level(level, 3))
+        return compressor.stream_writer(fileobj, closefd=False)
+    reader = zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    return io.BufferedReader(reader)
+
+
+def _open_lz4(fileobj: IO, mode: str, level: Optional[int]) -> IO:
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError("lz4 requires lz4. Run `pip install cloudio[lz4]`.")
+    if "w" in mode:
+        return lz4.frame.LZ4FrameFile(
+            fileobj, mode="wb", compression_level=_level(level, 0)
+        )
+    return lz4.frame.LZ4FrameFile(fileobj, mode="rb")
+
+
+def _level(level: Optional[int], default: int) -> int:
+    return default if level is None else level
+
+
+class Codec(NamedTuple):
+    extensions: Tuple[str, ...]
+    magic: "re.Pattern[bytes]"
+    open: Callable[[IO, str, Optional[int]], IO]
+
+
+CODECS: Dict[str, Codec] = {
+    "gzip": Codec((".gz", ".gzip"), re.compile(re.escape(b"\x1f\x8b")), _open_gzip),
+    "bz2": Codec((".bz2",), re.compile(b"BZh[1-9]1AY&SY"), _open_bz2),
+    "xz": Codec((".xz", ".lzma"), re.compile(re.escape(b"\xfd7zXZ\x00")), _open_xz),
+    "zstd": Codec(
+        (".zst", ".zstd"), re.compile(re.escape(b"\x28\xb5\x2f\xfd")), _open_zstd
+    ),
+    "lz4": Codec((".lz4",), re.compile(re.escape(b"\x04\x22\x4d\x18")), _open_lz4),
+}
+
+
+def infer_compression(path: str) -> Optional[str]:
+    """pathの拡張子からコーデック名を返す。圧縮ファイルの拡張子でなければNoneを返す"""
+    path = path.lower()
+    for name, codec in CODECS.items():
+        if path.endswith(codec.extensions):
+            return name
+    return None
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """ローカルのファイルの先頭のマジックナンバーからコーデック名を返す"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    return sniff_compression(head)
+
+
+def sniff_compression(head: bytes) -> Optional[str]:
+    """バイト列の先頭のマジックナンバーからコーデック名を返す"""
+    for name, codec in CODECS.items():
+        if codec.magic.match(head):
+            return name
+    return None
+
+
+def resolve_compression(
+    path: str, mode: str, compression: Optional[str]
+) -> Optional[str]:
+    """copenのcompression引数から、実際に使うコーデック名を返す
+
+    "infer"の場合は、テキストモードでだけ拡張子から推定する
+    (バイナリモードでは従来通り圧縮されたバイト列をそのまま読み書きする)
+    """
+    if compression is None:
+        return None
+    if compression == "infer":
+        return infer_compression(path) if "b" not in mode else None
+    if compression not in CODECS:
+        raise ValueError(
+            f"Unknown compression {compression}. Choose from {list(CODECS)}."
+        )
+    return compression
+
+
+# open_codecがテキストモードでio.TextIOWrapperに渡す引数
+_TEXT_KWARGS = ("encoding", "errors", "newline")
+
+
+def open_codec(
+    fileobj: IO,
+    compression: str,
+    mode: str,
+    compresslevel: Optional[int] = None,
+    **kwargs,
+) -> IO:
+    """バイナリのfileobjを、compressionで展開しながら読む・圧縮しながら書くファイルオブジェクトを返す
+
+    テキストモードの場合はkwargsのencoding, errors, newlineでデコードし、
+    bufferingなどopenに渡すそれ以外の引数は無視する。
+    返したファイルオブジェクトを閉じてもfileobjは閉じない
+    """
+    f = CODECS[compression].open(fileobj, mode, compresslevel)
+    if "b" in mode:
+        return f
+    text_kwargs = {key: kwargs[key] for key in _TEXT_KWARGS if key in kwargs}
+    return io.TextIOWrapper(f, **text_kwargs)
+
+
+def decompressed_path(path: str, compression: str) -> str:
+    """キャッシュのpathを展開したファイルのパスを返す。まだ展開していなければ展開する
+
+    展開したファイルはキャッシュディレクトリの decompressed/ 以下に置き、キャッシュの容量に含めて
+    キャッシュのエントリが削除されたときに一緒に削除される
+    """
+    cache_dir, filename = os.path.split(path)
+    target = os.path.join(cache_dir, "decompressed", filename)
+    if os.path.exists(target):
+        return target
+
+    lock_path = os.path.join(cache_dir, "locks", filename + ".decompressed.lock")
+    with file_lock(lock_path, timeout=get_config("cache_lock_timeout")):
+        if os.path.exists(target):
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = "{}.{}.partial".format(target, uuid4().hex)
+        try:
+            with open(path, "rb") as src, open(temp_path, "wb") as dst:
+                with open_codec(src, compression, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        dst.write(chunk)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return target
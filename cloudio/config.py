@@ -1,19 +1,64 @@
 import os
 from contextlib import contextmanager
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List
 
 __CONFIG = {
     "cache_dir": f"{os.environ.get('HOME')}/.cloudio/cache/",
+    # "always": 毎回ETagを確認する, 秒数: 最後の確認からその秒数の間は確認しない,
+    # "never" / "offline": キャッシュがあれば一切確認しない
+    "cache_revalidate": "always",
+    # キャッシュの合計バイト数と、最後のアクセスからの秒数の上限 (Noneなら無制限)
+    "cache_max_bytes": None,
+    "cache_max_age": None,
+    # 他のスレッド・プロセスが同じファイルをダウンロードし終わるのを待つ最大秒数 (Noneなら無期限)
+    "cache_lock_timeout": 60 * 60,
+    # Trueにすると、copenで圧縮されたファイルを読むときにキャッシュを一度だけ展開して、以降はそれを読む
+    "cache_decompress": False,
+    # copenで読む小さなファイルを、ディスクのキャッシュの前段としてプロセスのメモリにも保持する合計バイト数 (0なら無効) と、
+    # 1ファイルあたりのバイト数の上限。ETagの確認はディスクのキャッシュと同じく cache_revalidate に従う
+    "memory_cache_max_bytes": 0,
+    "memory_cache_max_object_size": 1024 * 1024,
+    # Range対応のHTTPサーバーから大きなファイルを並列にダウンロードするときの設定
+    "http_download_concurrency": 8,
+    "http_download_part_size": 16 * 1024 * 1024,
+    # プロセス内で共有するHTTPのセッションの、ホストごとのコネクション数 (http_download_concurrency以上にする)、
+    # 502/503/504や接続エラーのリトライ回数とその間隔の係数、タイムアウト秒数 (Noneなら無期限)
+    "http_pool_size": 32,
+    "http_retries": 5,
+    "http_backoff_factor": 1,
+    "http_timeout": 60,
     "s3_profile": None,
+    "s3_region": None,
+    # boto3のTransferConfigに渡す値 (デフォルトはboto3と同じ)
+    "s3_multipart_threshold": 8 * 1024 * 1024,
+    "s3_multipart_chunksize": 8 * 1024 * 1024,
+    "s3_max_concurrency": 10,
+    "s3_use_threads": True,
+    # copen(..., "w", stream=True) でマルチパートアップロードする1パートのバイト数 (5MiB以上)
+    "s3_upload_part_size": 8 * 1024 * 1024,
+    "s3_endpoint_url": None,
+    # copen(..., stream=True) で一度のRange requestで取得するバイト数
+    "stream_block_size": 8 * 1024 * 1024,
     "upload_tmp_dir": f"{os.environ.get('HOME')}/.cloudio/upload_tmp/",
+    # cloudio.aio でブロッキングするI/Oを同時に実行するスレッド数
+    "aio_max_concurrency": 64,
+    # Trueにすると、転送したバイト数やリクエスト数、キャッシュのヒット率などを cloudio.stats() に集計する
+    "stats_enabled": False,
 }
 
+__CALLBACKS: List[Callable[[str, Any, Any], None]] = []
+
 
 def set_config(**kwargs: Any) -> None:
-    for key, val in kwargs.items():
+    for key in kwargs.keys():
         if key not in __CONFIG.keys():
             raise KeyError(key)
+    for key, val in kwargs.items():
+        old_val = __CONFIG[key]
         __CONFIG[key] = val
+        if old_val != val:
+            for callback in __CALLBACKS:
+                callback(key, old_val, val)
 
 
 def get_config(key: str) -> Any:
@@ -24,9 +69,19 @@ def get_all_config() -> Dict[str, Any]:
     return __CONFIG.copy()
 
 
+def add_config_callback(callback: Callable[[str, Any, Any], None]) -> None:
+    """設定値が変更されたときに (key, old_val, new_val) で呼ばれるコールバックを登録する
+
+    キャッシュしているクライアントなどを設定変更に追従させるために使う
+    """
+    __CALLBACKS.append(callback)
+
+
 @contextmanager
 def cloudio_config(**kwargs: Any):
     current_config = get_all_config()
     set_config(**kwargs)
-    yield
-    set_config(**current_config)
+    try:
+        yield
+    finally:
+        set_config(**current_config)
@@ -0,0 +1,37 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Union
+
+from cloudio.backends import get_backend
+from cloudio.utils import to_str
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+
+def download_folder(
+    url: str,
+    path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    max_workers: int = 8,
+    skip_unchanged: bool = True,
+) -> List[str]:
+    """url以下の全オブジェクトをローカルのpath以下にダウンロードし、ダウンロードしたパスを返す
+
+    url/A, url/B/C のようにオブジェクトが存在するとき
+    path/A, path/B/Cのようにファイルがダウンロードされる。
+    ダウンロードはmax_workers並列で行い、skip_unchangedがTrueならpath以下に同じ内容のファイルが
+    既にあるものはスキップする (中断した場合は呼び直せば続きからダウンロードされる)。
+    キャッシュを介して読みたい場合は cached_path("s3://bucket/prefix/") を使う
+    """
+    url = to_str(url)
+    path = to_str(path)
+    if Path(path).exists() and not Path(path).is_dir():
+        raise ValueError(f"Given path {path} is not directory")
+
+    return get_backend(url).download_folder(
+        url=url,
+        path=path,
+        transfer_config=transfer_config,
+        max_workers=max_workers,
+        skip_unchanged=skip_unchanged,
+    )
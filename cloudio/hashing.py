@@ -0,0 +1,85 @@
+"""ダウンロードした内容を検証するための、S3のETagの形式のMD5などのチェックサム"""
+
+import base64
+import hashlib
+import re
+from typing import IO, List, Optional
+
+# ETags that are the MD5 of the content (or, with "-N", of the MD5s of its
+# N parts) as S3 returns them.
+_CONTENT_ETAG = re.compile(r'^"?([0-9a-fA-F]{32}(?:-[0-9]+)?)"?$')
+
+
+class ETagHasher:
+    """書き込まれた順にデータを受け取り、S3のETagの形式のMD5と、必要であればSHA-256を計算する
+
+    part_sizeを指定すると、マルチパートアップロードされたオブジェクトのETag
+    ("<各パートのMD5を連結したもののMD5>-<パート数>") を計算する
+    """
+
+    def __init__(self, part_size: Optional[int] = None, sha256: bool = False) -> None:
+        self.size = 0
+        self._part_size = part_size
+        # Only used with part_size.
+        self._part_remaining = part_size if part_size is not None else 0
+        self._part_digests: List[bytes] = []
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256() if sha256 else None
+
+    def update(self, data: bytes) -> None:
+        view = memoryview(data)
+        self.size += len(view)
+        if self._sha256 is not None:
+            self._sha256.update(view)
+        part_size = self._part_size
+        if part_size is None:
+            self._md5.update(view)
+            return
+        while view:
+            if self._part_remaining == 0:
+                self._part_digests.append(self._md5.digest())
+                self._md5 = hashlib.md5()
+                self._part_remaining = part_size
+            n = min(len(view), self._part_remaining)
+            self._md5.update(view[:n])
+            self._part_remaining -= n
+            view = view[n:]
+
+    def etag(self) -> str:
+        """引用符を除いたETagを返す"""
+        if self._part_size is None:
+            return self._md5.hexdigest()
+        digests = self._part_digests + [self._md5.digest()]
+        return "{}-{}".format(hashlib.md5(b"".join(digests)).hexdigest(), len(digests))
+
+    def sha256(self) -> Optional[str]:
+        """x-amz-checksum-sha256と同じ形式 (base64) のSHA-256を返す"""
+        if self._sha256 is None:
+            return None
+        return base64.b64encode(self._sha256.digest()).decode()
+
+
+def content_md5(etag: Optional[str], encrypted: bool) -> Optional[str]:
+    """etagが内容のMD5であれば引用符を除いて返し、そうでなければNoneを返す
+
+    KMSや顧客の鍵で暗号化されたオブジェクト (encryptedがTrue) のETagはMD5ではない
+    """
+    match = _CONTENT_ETAG.match(etag) if etag is not None else None
+    if match is None or encrypted:
+        return None
+    return match.group(1).lower()
+
+
+class HashingWriter:
+    """書き込まれたデータをfileobjに書き込み、hasherにも渡す書き込み専用のファイルオブジェクト
+
+    シークできないので、boto3は並列にダウンロードしたパートを順に書き込む
+    """
+
+    def __init__(self, fileobj: IO, hasher: ETagHasher) -> None:
+        self._fileobj = fileobj
+        self._hasher = hasher
+
+    def write(self, data: bytes) -> int:
+        self._hasher.update(data)
+        return self._fileobj.write(data)
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Generator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_THREAD_LOCKS: Dict[str, List] = {}
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+def _reset_after_fork() -> None:
+    global _THREAD_LOCKS_LOCK
+    _THREAD_LOCKS_LOCK = threading.Lock()
+    _THREAD_LOCKS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def file_lock(
+    lock_path: str, timeout: Optional[float] = None
+) -> Generator[None, None, None]:
+    """lock_pathのファイルを使って排他ロックを取る
+
+    同じプロセス内のスレッド同士はthreading.Lockで、プロセス同士はfcntl.flockで排他する。
+    timeout秒以内にロックが取れなければTimeoutErrorを送出する (Noneなら無期限に待つ)。
+    ロックを持っている間はlock_pathを削除してよく、待っていた側は新しいファイルでロックを取り直す。
+    fcntlが使えない環境ではプロセス間の排他は行わない
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    with _THREAD_LOCKS_LOCK:
+        thread_lock = _THREAD_LOCKS.setdefault(lock_path, [threading.Lock(), 0])
+        thread_lock[1] += 1
+    try:
+        if not thread_lock[0].acquire(timeout=-1 if timeout is None else timeout):
+            raise TimeoutError(f"Timed out waiting for lock {lock_path}")
+        try:
+            if fcntl is None:
+                yield
+                return
+
+            while True:
+                os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+                with open(lock_path, "a") as lock_file:
+                    _flock(lock_file.fileno(), lock_path, deadline)
+                    if not _is_current(lock_file.fileno(), lock_path):
+                        # The holder removed the file; lock the new one instead.
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                        continue
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    return
+        finally:
+            thread_lock[0].release()
+    finally:
+        with _THREAD_LOCKS_LOCK:
+            thread_lock[1] -= 1
+            if thread_lock[1] == 0:
+                del _THREAD_LOCKS[lock_path]
+
+
+def _is_current(fd: int, lock_path: str) -> bool:
+    try:
+        stat = os.stat(lock_path)
+    except FileNotFoundError:
+        return False
+    fd_stat = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (fd_stat.st_dev, fd_stat.st_ino)
+
+
+def _flock(fd: int, lock_path: str, deadline: Optional[float]) -> None:
+    if deadline is None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+
+    interval = 0.01
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out waiting for lock {lock_path}")
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, 1.0)
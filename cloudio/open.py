@@ -1,48 +1,195 @@
+import io
+import mmap
 from contextlib import contextmanager
 from logging import getLogger
 from pathlib import Path
-from typing import IO, Generator, Union
+from typing import IO, TYPE_CHECKING, Any, Dict, Generator, Optional, Union
 
-from cloudio.cached_path import cached_path
+from cloudio.backends import Writer, is_remote
+from cloudio.cached_path import cached_path, get_from_memory_cache
+from cloudio.compression import (
+    decompressed_path,
+    detect_compression,
+    open_codec,
+    resolve_compression,
+    sniff_compression,
+)
+from cloudio.config import get_config
+from cloudio.stream import open_stream, open_upload_stream, wrap_stream
 from cloudio.upload import upload_later
+from cloudio.utils import to_str
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
 
 logger = getLogger(__name__)
 
 
 @contextmanager
 def copen(
-    file: Union[str, Path], mode: str = "r", encoding: str = "utf-8", **kwargs
+    file: Union[str, Path],
+    mode: str = "r",
+    encoding: str = "utf-8",
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    stream: bool = False,
+    compression: Optional[str] = None,
+    compresslevel: Optional[int] = None,
+    **kwargs,
 ) -> Generator[IO, None, None]:
+    """openと同じ要領で、ローカル・Web・S3上のファイルを開く
+
+    stream=Trueで読み込む場合は、キャッシュにダウンロードせずにRange requestで直接読む。
+    一度先頭から読むだけの巨大なファイルでも、すぐに読み始められてディスクも使わない。
+    stream=TrueでS3に書き込む場合は、ローカルの一時ファイルを介さずに、
+    書き込みと並行してマルチパートアップロードする。with句の中で例外が起きた場合はアップロードを中止する。
+    mode="rb", buffering=0 の場合は、openと同じくバッファリングされないファイルオブジェクトを返す
+
+    compressionに "gzip", "bz2", "xz", "zstd", "lz4" を指定すると、
+    ストリーミングで展開しながら読み、圧縮しながら書く。compresslevelは圧縮レベル。
+    "infer" では、テキストモードの場合だけ拡張子 (.gz, .zst など) と、
+    読み込みではファイルの先頭のマジックナンバーから推定する。
+    デフォルトのNoneではopenと同じく圧縮されたバイト列をそのまま読み書きする。
+    設定の cache_decompress がTrueの場合は、キャッシュしたファイルを一度だけ展開してそれを読む
+    設定の memory_cache_max_bytes が0でなければ、小さなファイルはメモリ上のキャッシュから読む
+    """
+    path = to_str(file)
+    codec = resolve_compression(path, mode, compression)
+    text_kwargs: Dict[str, Any] = {} if "b" in mode else {"encoding": encoding}
     f = None
+    binary = None
     if "r" in mode:
         try:
             logger.debug(f"Open {file} with kwargs: {kwargs}")
-            cache_path = cached_path(file)
-            if "b" in mode:
-                f = open(cache_path, mode=mode, **kwargs)
+            is_url = is_remote(path)
+            # 読む元は、ストリーム (どちらもNone)、メモリ上のdata、ローカルのlocal_pathのいずれか
+            data: Optional[bytes] = None
+            local_path: Optional[str] = None
+            if (
+                is_url
+                and not stream
+                and get_config("memory_cache_max_bytes")
+                and kwargs.get("buffering") != 0
+            ):
+                # 小さなファイルはメモリ上のキャッシュからbytesで返ってくる
+                cached = get_from_memory_cache(path, transfer_config=transfer_config)
+                if isinstance(cached, bytes):
+                    data = cached
+                else:
+                    local_path = cached
+            elif not (stream and is_url):
+                local_path = cached_path(file, transfer_config=transfer_config)
+            if codec is None and compression == "infer" and "b" not in mode:
+                if data is not None:
+                    codec = sniff_compression(data[:16])
+                elif local_path is not None:
+                    codec = detect_compression(local_path)
+            if (
+                codec is not None
+                and local_path is not None
+                and is_url
+                and get_config("cache_decompress")
+            ):
+                local_path = decompressed_path(local_path, codec)
+                codec = None
+
+            if codec is None:
+                open_mode, open_kwargs = mode, {**text_kwargs, **kwargs}
             else:
-                f = open(cache_path, mode=mode, encoding=encoding, **kwargs)
+                open_mode, open_kwargs = "rb", {}
+            if data is not None:
+                opened = _open_bytes(data, mode=open_mode, **open_kwargs)
+            elif local_path is not None:
+                opened = open(local_path, mode=open_mode, **open_kwargs)
+            else:
+                opened = open_stream(path, mode=open_mode, **open_kwargs)
+            if codec is None:
+                f = opened
+            else:
+                binary = opened
+                f = open_codec(binary, codec, mode, **text_kwargs, **kwargs)
             yield f
         except Exception:
             raise
         finally:
             if f is not None:
                 f.close()
+            if binary is not None:
+                binary.close()
+            logger.debug(f"Close {file}")
+
+    elif "w" in mode and stream and is_remote(path):
+        logger.debug(f"Open {file} with kwargs: {kwargs}")
+        writer: Writer = open_upload_stream(path)
+        try:
+            if codec is None:
+                f = wrap_stream(writer, mode=mode, **text_kwargs, **kwargs)
+            else:
+                binary = wrap_stream(writer, mode="wb")
+                f = open_codec(
+                    binary, codec, mode, compresslevel, **text_kwargs, **kwargs
+                )
+            yield f
+            # Flushes the remaining data and completes the multipart upload.
+            f.close()
+            if binary is not None:
+                binary.close()
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
             logger.debug(f"Close {file}")
 
     elif "w" in mode:
-        with upload_later(file) as local_tmp_file:
+        with upload_later(file, transfer_config=transfer_config) as local_tmp_file:
             try:
-                if "b" in mode:
-                    f = open(local_tmp_file, mode=mode, **kwargs)
+                if codec is None:
+                    f = open(local_tmp_file, mode=mode, **text_kwargs, **kwargs)
                 else:
-                    f = open(local_tmp_file, mode=mode, encoding=encoding, **kwargs)
+                    binary = open(local_tmp_file, mode="wb")
+                    f = open_codec(
+                        binary, codec, mode, compresslevel, **text_kwargs, **kwargs
+                    )
                 yield f
             except Exception:
                 raise
             finally:
                 if f is not None:
                     f.close()
+                if binary is not None:
+                    binary.close()
                 logger.debug(f"Close {file}")
     else:
         raise ValueError(f"mode {mode} is invalid.")
+
+
+def _open_bytes(content: bytes, mode: str = "r", **kwargs) -> IO:
+    """メモリ上のcontentを、openと同じように読むファイルオブジェクトを返す"""
+    kwargs.pop("buffering", None)
+    if "b" in mode:
+        return io.BytesIO(content)
+    return io.TextIOWrapper(io.BytesIO(content), **kwargs)
+
+
+def cmmap(
+    file: Union[str, Path],
+    cache_dir: Optional[str] = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> mmap.mmap:
+    """ローカル・Web・S3上のファイルを読み込み専用でメモリマップしたmmapを返す
+
+    URLの場合はキャッシュにダウンロードしたファイルをマップする。
+    ページキャッシュを共有するので、同じファイルを複数のプロセス (DataLoaderのworkerなど) で
+    マップしてもメモリ上には1つしか載らない。キャッシュのファイルは書き換えられることはなく、
+    マップしている間に削除されても読み続けられる。空のファイルはマップできない (ValueError)
+
+    ```python
+    array = np.frombuffer(cmmap('s3://bucket/shard-00000.bin'), dtype=np.float32)
+    with cmmap('s3://bucket/model.safetensors') as m:
+        header_size = int.from_bytes(m[:8], 'little')
+    ```
+    """
+    if cache_dir is None:
+        cache_dir = get_config("cache_dir")
+    path = cached_path(file, cache_dir, transfer_config=transfer_config)
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
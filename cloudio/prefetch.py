@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import getLogger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Union
+
+from cloudio.backends import is_remote
+from cloudio.cached_path import cached_path, get_from_cache
+from cloudio.config import get_config
+from cloudio.tqdm import Tqdm
+from cloudio.utils import to_str
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+logger = getLogger(__name__)
+
+
+def prefetch_one(
+    url: str,
+    cache_dir: Optional[str] = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> str:
+    """urlを1つキャッシュにダウンロードし、そのパスを返す
+
+    prefetchの各URLで呼ばれ、プログレスバーは表示しない。ローカルのパスはそのまま返す
+    """
+    if cache_dir is None:
+        cache_dir = get_config("cache_dir")
+    if is_remote(url):
+        return get_from_cache(url, cache_dir, transfer_config, show_progress=False)
+    return cached_path(url, cache_dir)
+
+
+def prefetch(
+    urls: Iterable[Union[str, Path]],
+    max_workers: int = 8,
+    cache_dir: Optional[str] = None,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> Dict[str, Union[str, Exception]]:
+    """urlsをmax_workers並列でキャッシュにダウンロードする
+
+    ETagの確認とダウンロードをURLごとに並列に行い、進捗は1つのプログレスバーにまとめて表示する。
+    URLからキャッシュのパスへのdictを返す。失敗したURLの値は送出された例外になる
+    """
+    if cache_dir is None:
+        cache_dir = get_config("cache_dir")
+    keys = list(dict.fromkeys(to_str(url) for url in urls))
+
+    results: Dict[str, Union[str, Exception]] = {}
+    progress = Tqdm.tqdm(total=len(keys), unit="file")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(prefetch_one, url, cache_dir, transfer_config): url
+            for url in keys
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                results[url] = future.result()
+            except Exception as exc:
+                logger.warning(f"Failed to prefetch {url}: {exc!r}")
+                results[url] = exc
+            progress.update(1)
+    progress.close()
+
+    return {url: results[url] for url in keys}
@@ -1,16 +1,45 @@
-from urllib.parse import urlparse
+from logging import getLogger
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Union
 
-from cloudio.s3 import s3_remove
+from cloudio.backends import get_backend
+from cloudio.utils import to_str
 
+logger = getLogger(__name__)
 
-def remove(url: str) -> None:
-    """指定されたURLのオブジェクトを削除する。
 
-    ディレクトリを指定した場合はそのディレクトリ以下全てを削除する。
-    ローカルのファイルにも対応したり、recursive=Falseなどのオプションを実装した方が良いかも
+class RemoveResult(NamedTuple):
+    # 削除した (dry_runの場合は削除する) URLまたはパス
+    deleted: List[str]
+    # 削除に失敗したURLまたはパスから、エラーメッセージへのdict
+    errors: Dict[str, str]
+
+
+def remove(
+    url: Union[str, Path],
+    recursive: bool = True,
+    max_workers: int = 8,
+    dry_run: bool = False,
+    ignore_errors: bool = False,
+) -> RemoveResult:
+    """指定されたURLまたはローカルのパスを削除し、削除したものと失敗したものを返す。
+
+    recursiveがTrueの場合は、ディレクトリ (url/ 以下) も全て削除する。
+    パスの区切りは尊重するので、s3://bucket/run1 を削除しても s3://bucket/run10 は削除されない。
+    S3ではDeleteObjectsを1000キーずつmax_workers並列で送る。
+    削除に失敗したものがある場合は、残りを削除し終えてからIOErrorを送出する。
+    ignore_errorsがTrueの場合は例外を送出せず、失敗したものをRemoveResult.errorsに記録して返す。
+    dry_runがTrueの場合は、削除されるものを返すだけで実際には削除しない
     """
-    parsed = urlparse(url)
-    if parsed.scheme == "s3":
-        s3_remove(url=url)
-    else:
-        raise NotImplementedError("Removing except S3 is not implemented.")
+    url = to_str(url)
+    deleted, errors = get_backend(url).delete(
+        url, recursive=recursive, max_workers=max_workers, dry_run=dry_run
+    )
+
+    if errors:
+        message = f"Failed to remove {len(errors)} files in {url}"
+        if not ignore_errors:
+            first, error = next(iter(errors.items()))
+            raise IOError(f"{message} (e.g. {first}: {error})")
+        logger.warning(message)
+    return RemoveResult(deleted, errors)
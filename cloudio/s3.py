@@ -1,18 +1,38 @@
 import logging
+import math
 import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from configparser import ConfigParser
+from fnmatch import fnmatch
 from functools import wraps
 from pathlib import Path
-from typing import IO, Callable, Optional, Tuple, Union
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from urllib.parse import urlparse
 
-import boto
-import boto3
-import botocore
-from botocore.exceptions import ClientError, ProfileNotFound
+from cloudio.config import add_config_callback, get_config
+from cloudio.hashing import ETagHasher
+from cloudio.stats import incr
+from cloudio.tqdm import Tqdm
+from cloudio.utils import relative_parts
 
-from cloudio.config import get_config
-from tqdm import tqdm
+if TYPE_CHECKING:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +50,12 @@ def split_s3_path(url: str) -> Tuple[str, str]:
     return bucket_name, s3_path
 
 
+def _folder_prefix(s3_path: str) -> str:
+    """s3_path以下のキーに共通するプレフィックスを返す。バケットのルートでは空文字列となる"""
+    s3_path = s3_path.rstrip("/")
+    return s3_path + "/" if s3_path else ""
+
+
 def s3_request(func: Callable):
     """
     Wrapper function for s3 requests in order to create more helpful error
@@ -38,10 +64,13 @@ def s3_request(func: Callable):
 
     @wraps(func)
     def wrapper(url: str, *args, **kwargs):
+        # boto3は最初にS3を使うときに読み込む (import cloudioを軽くするため)
+        from botocore.exceptions import ClientError
+
         try:
             return func(url, *args, **kwargs)
         except ClientError as exc:
-            if int(exc.response["Error"]["Code"]) == 404:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
                 raise FileNotFoundError("file {} not found".format(url))
             else:
                 raise
@@ -49,15 +78,56 @@ def s3_request(func: Callable):
     return wrapper
 
 
-def get_s3_resource():
-    s3_profile = get_config("s3_profile")
-    if s3_profile is None:
-        if not has_default_credentials():
-            return boto3.resource(
-                "s3", config=botocore.client.Config(signature_version=botocore.UNSIGNED)
-            )
-        else:
-            return boto3.resource("s3")
+_POOL_LOCK = threading.Lock()
+_POOL_GENERATION = 0
+_SESSIONS: Dict[Tuple, "boto3.session.Session"] = {}
+_CLIENTS: Dict[Tuple, Any] = {}
+_SIGNED: Dict[Optional[str], bool] = {}
+_THREAD_LOCAL = threading.local()
+
+
+def _clear_s3_pool() -> None:
+    """キャッシュしているsession/client/resourceを全て破棄する"""
+    global _POOL_GENERATION
+    _POOL_GENERATION += 1
+    _SESSIONS.clear()
+    _CLIENTS.clear()
+    _SIGNED.clear()
+
+
+def _reset_s3_pool_after_fork() -> None:
+    """fork後の子プロセスでは親プロセスのコネクションやロックを引き継がないように作り直す"""
+    global _POOL_LOCK, _THREAD_LOCAL
+    _POOL_LOCK = threading.Lock()
+    _THREAD_LOCAL = threading.local()
+    _clear_s3_pool()
+
+
+def _on_config_change(key: str, old_val: Any, new_val: Any) -> None:
+    if key in ("s3_profile", "s3_region", "s3_endpoint_url"):
+        with _POOL_LOCK:
+            _clear_s3_pool()
+
+
+add_config_callback(_on_config_change)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_s3_pool_after_fork)
+
+
+def _count_s3_request(**kwargs: Any) -> None:
+    # Emitted for every attempt, including retries.
+    incr("s3.requests")
+
+
+def _count_s3_retries(parsed: Dict[str, Any], **kwargs: Any) -> None:
+    retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts")
+    if retries:
+        incr("retries", retries)
+
+
+def _new_session(s3_profile: Optional[str]) -> "boto3.session.Session":
+    import boto3
+    from botocore.exceptions import ProfileNotFound
 
     try:
         session = boto3.session.Session(profile_name=s3_profile)
@@ -68,13 +138,107 @@ def get_s3_resource():
             "https://qiita.com/itooww/items/bdc2dc15213da43a10a7"
         )
         raise ProfileNotFound(profile=s3_profile)
-    if session.get_credentials() is None:
+    # Clients and resources created from the session inherit these.
+    session.events.register("before-send.s3", _count_s3_request)
+    session.events.register("after-call.s3", _count_s3_retries)
+    return session
+
+
+def _has_credentials(s3_profile: Optional[str]) -> bool:
+    """s3_profileで使われる認証情報があるかどうかを返す
+
+    認証情報はbotocoreと同じ順序で検索する。ファイルの読み込みやEC2のメタデータへのアクセスを伴うので、
+    profileごとに一度だけ行い、見つけた認証情報はsessionごとキャッシュしてclientで使い回す。
+    キャッシュはclear_credentials_cache() か s3_profile などの設定の変更で破棄される
+    """
+    signed = _SIGNED.get(s3_profile)
+    if signed is None:
+        with _POOL_LOCK:
+            signed = _SIGNED.get(s3_profile)
+            if signed is None:
+                session = _new_session(s3_profile)
+                signed = session.get_credentials() is not None
+                _SESSIONS.setdefault((s3_profile, signed), session)
+                _SIGNED[s3_profile] = signed
+    return signed
+
+
+def clear_credentials_cache() -> None:
+    """キャッシュしている認証情報を (session/client/resourceとともに) 破棄する
+
+    認証情報のファイルや環境変数を変更した後に呼ぶと、次にS3を使うときに検索し直す
+    """
+    with _POOL_LOCK:
+        _clear_s3_pool()
+
+
+def _s3_pool_key() -> Tuple:
+    """(profile, 署名の有無, region, endpoint) の組を返す"""
+    s3_profile = get_config("s3_profile")
+    return (
+        s3_profile,
+        _has_credentials(s3_profile),
+        get_config("s3_region"),
+        get_config("s3_endpoint_url"),
+    )
+
+
+def _s3_kwargs(key: Tuple) -> Dict[str, Any]:
+    import botocore.client
+
+    _, signed, region, endpoint_url = key
+    kwargs: Dict[str, Any] = {}
+    if not signed:
         # Use unsigned requests.
-        s3_resource = session.resource(
-            "s3", config=botocore.client.Config(signature_version=botocore.UNSIGNED)
-        )
-    else:
-        s3_resource = session.resource("s3")
+        kwargs["config"] = botocore.client.Config(signature_version=botocore.UNSIGNED)
+    if region is not None:
+        kwargs["region_name"] = region
+    if endpoint_url is not None:
+        kwargs["endpoint_url"] = endpoint_url
+    return kwargs
+
+
+def _get_session(key: Tuple) -> "boto3.session.Session":
+    # Must be called with _POOL_LOCK held.
+    session = _SESSIONS.get(key[:2])
+    if session is None:
+        session = _new_session(key[0])
+        _SESSIONS[key[:2]] = session
+    return session
+
+
+def get_s3_client():
+    """現在の設定に対応するS3 clientを返す
+
+    clientはスレッドセーフなので、プロセス内で設定ごとに1つを共有する
+    """
+    key = _s3_pool_key()
+    client = _CLIENTS.get(key)
+    if client is None:
+        with _POOL_LOCK:
+            client = _CLIENTS.get(key)
+            if client is None:
+                client = _get_session(key).client("s3", **_s3_kwargs(key))
+                _CLIENTS[key] = client
+    return client
+
+
+def get_s3_resource():
+    """現在の設定に対応するS3 resourceを返す
+
+    resourceはスレッドセーフではないので、スレッドごとにキャッシュして使い回す
+    """
+    key = _s3_pool_key()
+    local = _THREAD_LOCAL
+    if getattr(local, "generation", None) != _POOL_GENERATION:
+        local.generation = _POOL_GENERATION
+        local.resources = {}
+    s3_resource = local.resources.get(key)
+    if s3_resource is None:
+        with _POOL_LOCK:
+            session = _get_session(key)
+            s3_resource = session.resource("s3", **_s3_kwargs(key))
+        local.resources[key] = s3_resource
     return s3_resource
 
 
@@ -88,50 +252,467 @@ def s3_etag(url: str) -> Optional[str]:
 
 
 @s3_request
-def s3_download_file(url: str, filename: Union[str, Path]) -> None:
-    s3_resource = get_s3_resource()
+def s3_head(
+    url: str, part_number: Optional[int] = None, checksum: bool = False
+) -> Dict[str, Any]:
+    """S3オブジェクトのメタデータ (head_objectのレスポンス) を返す
+
+    part_numberを指定すると、マルチパートアップロードされたそのパートのサイズ (ContentLength) を返す。
+    checksumがTrueの場合は、アップロード時に計算されたChecksumSHA256なども返す
+    (ChecksumModeに対応していない古いbotocoreでは返さない)
+    """
     bucket_name, s3_path = split_s3_path(url)
-    s3_resource.Bucket(bucket_name).download_fileobj(
-        Key=s3_path, Filename=str(filename)
+    client = get_s3_client()
+    kwargs: Dict[str, Any] = {}
+    if part_number is not None:
+        kwargs["PartNumber"] = part_number
+    if checksum and _supports_checksum_mode(client):
+        kwargs["ChecksumMode"] = "ENABLED"
+    return client.head_object(Bucket=bucket_name, Key=s3_path, **kwargs)
+
+
+def _supports_checksum_mode(client: Any) -> bool:
+    # Added in botocore 1.23, older versions reject it with ParamValidationError.
+    input_shape = client.meta.service_model.operation_model("HeadObject").input_shape
+    return "ChecksumMode" in input_shape.members
+
+
+@s3_request
+def s3_get_range(url: str, start: int, end: int, etag: Optional[str] = None) -> bytes:
+    """S3オブジェクトのstart から end バイト目まで (endを含む) を返す
+
+    etagを指定した場合、オブジェクトが更新されていればエラーになる
+    """
+    bucket_name, s3_path = split_s3_path(url)
+    kwargs = {"Range": f"bytes={start}-{end}"}
+    if etag is not None:
+        kwargs["IfMatch"] = etag
+    response = get_s3_client().get_object(Bucket=bucket_name, Key=s3_path, **kwargs)
+    return response["Body"].read()
+
+
+@s3_request
+def s3_put_object(url: str, data: bytes) -> None:
+    bucket_name, s3_path = split_s3_path(url)
+    get_s3_client().put_object(Bucket=bucket_name, Key=s3_path, Body=data)
+
+
+@s3_request
+def s3_create_multipart_upload(url: str) -> str:
+    """マルチパートアップロードを開始し、UploadIdを返す"""
+    bucket_name, s3_path = split_s3_path(url)
+    response = get_s3_client().create_multipart_upload(Bucket=bucket_name, Key=s3_path)
+    return response["UploadId"]
+
+
+@s3_request
+def s3_upload_part(url: str, upload_id: str, part_number: int, data: bytes) -> str:
+    """マルチパートアップロードのパートをアップロードし、そのETagを返す"""
+    bucket_name, s3_path = split_s3_path(url)
+    response = get_s3_client().upload_part(
+        Bucket=bucket_name,
+        Key=s3_path,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=data,
     )
+    return response["ETag"]
 
 
 @s3_request
-def s3_download_fileobj(url: str, fileobj: IO) -> None:
-    s3_resource = get_s3_resource()
+def s3_complete_multipart_upload(url: str, upload_id: str, etags: List[str]) -> None:
+    """etags[i] を i+1 番目のパートとしてマルチパートアップロードを完了する"""
     bucket_name, s3_path = split_s3_path(url)
-    s3_resource.Bucket(bucket_name).download_fileobj(Key=s3_path, Fileobj=fileobj)
+    get_s3_client().complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=s3_path,
+        UploadId=upload_id,
+        MultipartUpload={
+            "Parts": [
+                {"ETag": etag, "PartNumber": part_number}
+                for part_number, etag in enumerate(etags, start=1)
+            ]
+        },
+    )
 
 
 @s3_request
-def s3_upload_file(url: str, filename: Union[str, Path]) -> None:
+def s3_abort_multipart_upload(url: str, upload_id: str) -> None:
+    bucket_name, s3_path = split_s3_path(url)
+    get_s3_client().abort_multipart_upload(
+        Bucket=bucket_name, Key=s3_path, UploadId=upload_id
+    )
+
+
+TRANSFER_CONFIG_KEYS = {
+    "s3_multipart_threshold": "multipart_threshold",
+    "s3_multipart_chunksize": "multipart_chunksize",
+    "s3_max_concurrency": "max_concurrency",
+    "s3_use_threads": "use_threads",
+}
+
+
+def get_transfer_config(
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> "TransferConfig":
+    """boto3の転送に使うTransferConfigを返す
+
+    transfer_configにdictを渡すと、その値で設定 (s3_multipart_thresholdなど) を上書きする。
+    TransferConfigを渡した場合はそのまま使う
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    if isinstance(transfer_config, TransferConfig):
+        return transfer_config
+    overrides = transfer_config or {}
+    for key in overrides.keys():
+        if key not in TRANSFER_CONFIG_KEYS:
+            raise KeyError(key)
+    return TransferConfig(
+        **{
+            arg: overrides.get(key, get_config(key))
+            for key, arg in TRANSFER_CONFIG_KEYS.items()
+        }
+    )
+
+
+@s3_request
+def s3_download_file(
+    url: str,
+    filename: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
     s3_resource = get_s3_resource()
     bucket_name, s3_path = split_s3_path(url)
-    s3_resource.Bucket(bucket_name).upload_file(Filename=str(filename), Key=s3_path)
+    s3_resource.Bucket(bucket_name).download_file(
+        Key=s3_path,
+        Filename=str(filename),
+        Config=get_transfer_config(transfer_config),
+    )
 
 
 @s3_request
-def s3_upload_fileobj(url: str, fileobj: IO) -> None:
+def s3_download_fileobj(
+    url: str,
+    fileobj: IO,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
     s3_resource = get_s3_resource()
     bucket_name, s3_path = split_s3_path(url)
-    s3_resource.Bucket(bucket_name).upload_fileobj(Fileobj=fileobj, Key=s3_path)
+    s3_resource.Bucket(bucket_name).download_fileobj(
+        Key=s3_path, Fileobj=fileobj, Config=get_transfer_config(transfer_config)
+    )
 
 
 @s3_request
-def s3_upload_folder(url: str, path: Union[str, Path]) -> None:
+def s3_upload_file(
+    url: str,
+    filename: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
     s3_resource = get_s3_resource()
     bucket_name, s3_path = split_s3_path(url)
-    files = sorted([p for p in Path(path).rglob("*") if p.is_file()])
-    for file in tqdm(files):
-        tgt_url = os.path.join(s3_path, str(file.relative_to(path)))
-        s3_resource.Bucket(bucket_name).upload_file(Filename=str(file), Key=tgt_url)
+    s3_resource.Bucket(bucket_name).upload_file(
+        Filename=str(filename), Key=s3_path, Config=get_transfer_config(transfer_config)
+    )
 
 
 @s3_request
-def s3_remove(url: str) -> None:
+def s3_upload_fileobj(
+    url: str,
+    fileobj: IO,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
     s3_resource = get_s3_resource()
     bucket_name, s3_path = split_s3_path(url)
-    s3_resource.Bucket(bucket_name).objects.filter(Prefix=s3_path).delete()
+    s3_resource.Bucket(bucket_name).upload_fileobj(
+        Fileobj=fileobj, Key=s3_path, Config=get_transfer_config(transfer_config)
+    )
+
+
+@s3_request
+def s3_copy(
+    src_url: str,
+    dst_url: str,
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
+    """S3上でsrc_urlをdst_urlにコピーする。データはダウンロードもアップロードもしない
+
+    multipart_thresholdより大きいオブジェクトはUploadPartCopyで並列にコピーする
+    """
+    src_bucket, src_path = split_s3_path(src_url)
+    dst_bucket, dst_path = split_s3_path(dst_url)
+    get_s3_client().copy(
+        {"Bucket": src_bucket, "Key": src_path},
+        dst_bucket,
+        dst_path,
+        Config=get_transfer_config(transfer_config),
+    )
+
+
+def s3_list_objects(url: str) -> Iterator[Dict[str, Any]]:
+    """url以下 (url/で始まるキー) のオブジェクトを、ページングしながら全て返す
+
+    各要素はlist_objects_v2のContentsの要素 (Key, Size, ETag, LastModifiedなど)
+    """
+    bucket_name, s3_path = split_s3_path(url)
+    prefix = _folder_prefix(s3_path)
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+
+def etag_matches(
+    filename: Union[str, Path], etag: str, multipart_chunksize: int
+) -> Optional[bool]:
+    """ローカルのファイルの内容がS3のETagと一致するかを返す
+
+    マルチパートアップロードされたオブジェクトのETag ("<md5>-<パート数>") は、
+    パートのサイズがmultipart_chunksizeだったとして計算する。
+    比較できないETag (パート数が合わないなど) の場合はNoneを返す
+    """
+    etag = etag.strip('"')
+    size = os.path.getsize(filename)
+    if "-" in etag:
+        try:
+            num_parts = int(etag.split("-")[1])
+        except ValueError:
+            return None
+        if max(1, math.ceil(size / multipart_chunksize)) != num_parts:
+            return None
+        hasher = ETagHasher(part_size=multipart_chunksize)
+    else:
+        hasher = ETagHasher()
+
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.etag() == etag
+
+
+def _is_unchanged(file: Path, remote: Dict[str, Any], multipart_chunksize: int) -> bool:
+    stat = file.stat()
+    if stat.st_size != remote["Size"]:
+        return False
+    matches = etag_matches(file, remote["ETag"], multipart_chunksize)
+    if matches is not None:
+        return matches
+    # ETagで比較できない場合は、ローカルのファイルがアップロード後に更新されていないかで判断する
+    return stat.st_mtime <= remote["LastModified"].timestamp()
+
+
+@s3_request
+def s3_upload_folder(
+    url: str,
+    path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    max_workers: int = 8,
+    include: Optional[Sequence[str]] = None,
+    exclude: Optional[Sequence[str]] = None,
+    skip_unchanged: bool = True,
+    dry_run: bool = False,
+) -> List[str]:
+    """path以下のファイルをmax_workers並列でurl以下にアップロードし、アップロードしたURLを返す
+
+    includeとexcludeはpathからの相対パスに対するglob (fnmatch) のリストで、
+    includeのどれかに一致し、excludeのどれにも一致しないファイルだけをアップロードする。
+    skip_unchangedがTrueの場合は、url以下を一度だけリストして、
+    サイズとETag (MD5) が同じファイルはアップロードしない。
+    そのため中断された場合も、同じ引数で呼び直せば残りのファイルだけがアップロードされる。
+    dry_runがTrueの場合は、アップロードするURLを返すだけで実際にはアップロードしない
+    """
+    bucket_name, s3_path = split_s3_path(url)
+    prefix = _folder_prefix(s3_path)
+    config = get_transfer_config(transfer_config)
+    client = get_s3_client()
+
+    files = {}
+    for file in sorted(p for p in Path(path).rglob("*") if p.is_file()):
+        relative_path = file.relative_to(path).as_posix()
+        if include is not None and not any(
+            fnmatch(relative_path, pattern) for pattern in include
+        ):
+            continue
+        if exclude is not None and any(
+            fnmatch(relative_path, pattern) for pattern in exclude
+        ):
+            continue
+        files[prefix + relative_path] = file
+
+    remote_objects = {}
+    if skip_unchanged:
+        remote_objects = {obj["Key"]: obj for obj in s3_list_objects(url)}
+
+    def upload_if_changed(key: str) -> Optional[str]:
+        file = files[key]
+        remote = remote_objects.get(key)
+        if remote is not None and _is_unchanged(
+            file, remote, config.multipart_chunksize
+        ):
+            return None
+        if not dry_run:
+            client.upload_file(
+                Filename=str(file), Bucket=bucket_name, Key=key, Config=config
+            )
+            incr("upload.bytes", file.stat().st_size)
+        return f"s3://{bucket_name}/{key}"
+
+    uploaded = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for tgt_url in Tqdm.tqdm(
+            executor.map(upload_if_changed, files), total=len(files)
+        ):
+            if tgt_url is not None:
+                uploaded.append(tgt_url)
+    logger.info(
+        f"{'Would upload' if dry_run else 'Uploaded'} {len(uploaded)} files, "
+        f"skipped {len(files) - len(uploaded)} unchanged files"
+    )
+    return uploaded
+
+
+def s3_download_folder(
+    url: str,
+    path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    max_workers: int = 8,
+    skip_unchanged: bool = True,
+) -> List[str]:
+    """url以下のオブジェクトをmax_workers並列でpath以下にダウンロードし、ダウンロードしたパスを返す
+
+    url以下は一度だけリストする。skip_unchangedがTrueの場合は、
+    サイズとETag (MD5) が同じファイルが既にpath以下にあるオブジェクトはダウンロードしない。
+    絶対パスや ".." でpathの外を指すキーがある場合は、何もダウンロードせずにValueErrorとなる
+    """
+    bucket_name, s3_path = split_s3_path(url)
+    prefix = _folder_prefix(s3_path)
+    config = get_transfer_config(transfer_config)
+    client = get_s3_client()
+
+    objects = [obj for obj in s3_list_objects(url) if not obj["Key"].endswith("/")]
+    # Reject keys that would be written outside `path` before downloading anything.
+    files = {
+        obj["Key"]: Path(path, *relative_parts(obj["Key"][len(prefix) :]))
+        for obj in objects
+    }
+
+    def download_if_changed(obj: Dict[str, Any]) -> Optional[str]:
+        file = files[obj["Key"]]
+        if (
+            skip_unchanged
+            and file.is_file()
+            and file.stat().st_size == obj["Size"]
+            and etag_matches(str(file), obj["ETag"], config.multipart_chunksize)
+        ):
+            return None
+        file.parent.mkdir(parents=True, exist_ok=True)
+        client.download_file(
+            Bucket=bucket_name, Key=obj["Key"], Filename=str(file), Config=config
+        )
+        incr("download.bytes", obj["Size"])
+        return str(file)
+
+    downloaded = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for file in Tqdm.tqdm(
+            executor.map(download_if_changed, objects), total=len(objects)
+        ):
+            if file is not None:
+                downloaded.append(file)
+    logger.info(
+        f"Downloaded {len(downloaded)} files, "
+        f"skipped {len(objects) - len(downloaded)} unchanged files"
+    )
+    return downloaded
+
+
+# DeleteObjectsで1回のリクエストで削除できるキーの最大数
+DELETE_BATCH_SIZE = 1000
+
+
+def _keys_to_remove(url: str, recursive: bool) -> Iterator[str]:
+    bucket_name, s3_path = split_s3_path(url)
+    if not (recursive and s3_path.endswith("/")):
+        # The exact key sorts first among the keys starting with it.
+        response = get_s3_client().list_objects_v2(
+            Bucket=bucket_name, Prefix=s3_path, MaxKeys=1
+        )
+        contents = response.get("Contents", [])
+        if contents and contents[0]["Key"] == s3_path:
+            yield s3_path
+    if recursive:
+        for obj in s3_list_objects(url):
+            yield obj["Key"]
+
+
+def _delete_batch(
+    bucket_name: str, keys: List[str]
+) -> Tuple[List[str], Dict[str, str]]:
+    from botocore.exceptions import ClientError
+
+    try:
+        response = get_s3_client().delete_objects(
+            Bucket=bucket_name,
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True},
+        )
+    except ClientError as exc:
+        return [], {key: str(exc) for key in keys}
+    errors = {
+        error["Key"]: "{}: {}".format(error.get("Code"), error.get("Message"))
+        for error in response.get("Errors", [])
+    }
+    return [key for key in keys if key not in errors], errors
+
+
+def s3_remove(
+    url: str, recursive: bool = True, max_workers: int = 8, dry_run: bool = False
+) -> Tuple[List[str], Dict[str, str]]:
+    """urlのオブジェクトを削除し、削除したURLのリストと、削除に失敗したURLからエラーへのdictを返す
+
+    urlと完全に一致するキーと、recursiveがTrueの場合はurl/以下のキーを削除する
+    (s3://bucket/run1 に対して s3://bucket/run10 は削除しない)。
+    キーはページングしながらリストし、DELETE_BATCH_SIZE個ずつのDeleteObjectsを
+    max_workers並列で送る。dry_runがTrueの場合は、削除するURLを返すだけで実際には削除しない
+    """
+    bucket_name, _ = split_s3_path(url)
+
+    def batches() -> Iterator[List[str]]:
+        batch: List[str] = []
+        for key in _keys_to_remove(url, recursive):
+            batch.append(key)
+            if len(batch) == DELETE_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    deleted: List[str] = []
+    errors: Dict[str, str] = {}
+
+    def collect(future: "Future[Tuple[List[str], Dict[str, str]]]") -> None:
+        batch_deleted, batch_errors = future.result()
+        deleted.extend(batch_deleted)
+        errors.update(batch_errors)
+
+    if dry_run:
+        for batch in batches():
+            deleted.extend(batch)
+    else:
+        # Keep at most max_workers batches in flight, so that listing a huge
+        # prefix does not run ahead of the deletes.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures: Deque["Future[Tuple[List[str], Dict[str, str]]]"] = deque()
+            for batch in batches():
+                if len(futures) >= max_workers:
+                    collect(futures.popleft())
+                futures.append(executor.submit(_delete_batch, bucket_name, batch))
+            while futures:
+                collect(futures.popleft())
+
+    return (
+        [f"s3://{bucket_name}/{key}" for key in deleted],
+        {f"s3://{bucket_name}/{key}": error for key, error in errors.items()},
+    )
 
 
 def get_credential_source() -> Optional[str]:
@@ -157,6 +738,9 @@ def get_credential_source() -> Optional[str]:
 def has_default_credentials() -> bool:
     """環境変数やコンフィグファイルなど、プログラムへの入力以外の方法で設定された認証情報があるかどうかを返す
 
+    s3_profileを設定しない場合に使われる認証情報を、boto3 (botocore) と同じ順序で検索する。
+    結果はキャッシュされ、clear_credentials_cache() で破棄される
+
     !!! note
     https://boto3.amazonaws.com/v1/documentation/api/latest/guide/configuration.html#configuring-credentials
     ```
@@ -172,38 +756,4 @@ def has_default_credentials() -> bool:
     IAMロールを構成されたAmazon EC2インスタンス上ではそのインスタンスメタデータサービス
     ```
     """
-    # 1. 環境変数
-    if os.environ.get("AWS_ACCESS_KEY_ID") is not None:
-        return True
-
-    # 2. 共有された認証情報ファイル（~/.aws/credentials）
-    aws_credentials_file = os.environ.get(
-        "AWS_SHARED_CREDENTIALS_FILE", str(Path.home() / ".aws/credentials")
-    )
-    if Path(aws_credentials_file).exists():
-        aws_credentials = ConfigParser()
-        aws_credentials.read(aws_credentials_file)
-        try:
-            _ = aws_credentials["default"]["aws_access_key_id"]
-        except KeyError:
-            pass
-        else:
-            return True
-
-    # 3. AWS設定ファイル（~/.aws/config）
-    # 以下の理由により、これのチェックは行わない
-    # 通常は、AWS設定ファイル内で管理しているプロファイル情報はリージョン（region）とデフォルトの出力形式（output）で、認証情報は含まれていません
-
-    # TODO: ロールの引き受けの提供
-
-    # 4. Boto2設定ファイル（/etc/boto.cfg and ~/.boto）
-    aws_access_key_id = boto.config.get_value("Credentials", "aws_access_key_id")
-    if aws_access_key_id is not None:
-        return True
-
-    # 5. IAMロールを構成されたAmazon EC2インスタンス上ではそのインスタンスメタデータサービス
-    credential_source = get_credential_source()
-    if credential_source is not None:
-        return True
-
-    return False
+    return _has_credentials(None)
@@ -0,0 +1,181 @@
+"""転送とキャッシュの計測
+
+設定の stats_enabled をTrueにすると、以下をプロセス内で集計する
+
+- カウンタ: download.bytes, upload.bytes, stream.bytes (転送したバイト数),
+  http.requests, s3.requests (リトライを含むリクエスト数), retries,
+  cache.hit, cache.miss, cache.blob_hit, cache.stale_hit, cache.eviction,
+  cache.memory_hit
+- 時間 (秒): head (ETagの確認), download, commit (検証とキャッシュへの配置), upload
+
+集計した値は stats() で取得でき、add_stats_hook で登録したフックにはイベントごとに通知される。
+無効の場合 (デフォルト) のコストは、記録する箇所ごとにフラグを1回確認するだけ
+
+```python
+>>> cloudio.set_config(stats_enabled=True)
+>>> cloudio.stats()
+{'counters': {'cache.miss': 1, 'download.bytes': 1024, ...},
+ 'timings': {'download': {'count': 1, 'total': 0.12, 'max': 0.12}, ...},
+ 'throughput': {'download': 8533.3, 'upload': None}}
+>>> add_stats_hook(StatsdHook('localhost', 8125))  # StatsDに送る
+>>> print(to_prometheus())  # Prometheusのテキスト形式
+```
+"""
+
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, List, Optional
+
+from cloudio.config import add_config_callback, get_config
+
+# (kind, name, value) で呼ばれる。kindは "counter" か "timing" (valueは秒)
+StatsHook = Callable[[str, str, float], None]
+
+_ENABLED: bool = get_config("stats_enabled")
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, float] = {}
+_TIMINGS: Dict[str, List[float]] = {}
+_HOOKS: List[StatsHook] = []
+_NULL_TIMER = nullcontext()
+
+
+def _on_config_change(key: str, old_val: Any, new_val: Any) -> None:
+    global _ENABLED
+    if key == "stats_enabled":
+        _ENABLED = bool(new_val)
+
+
+add_config_callback(_on_config_change)
+
+
+def incr(name: str, value: float = 1) -> None:
+    """カウンタnameにvalueを加える"""
+    if not _ENABLED:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+    for hook in _HOOKS:
+        hook("counter", name, value)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """nameにかかった時間を記録する"""
+    if not _ENABLED:
+        return
+    with _LOCK:
+        timing = _TIMINGS.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+    for hook in _HOOKS:
+        hook("timing", name, seconds)
+
+
+class _Timer:
+    __slots__ = ("_name", "_start")
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Failed transfers would skew the throughput.
+        if exc_type is None:
+            record_timing(self._name, time.perf_counter() - self._start)
+
+
+def timer(name: str) -> ContextManager:
+    """with句の中にかかった時間をnameとして記録するコンテキストマネージャを返す"""
+    if not _ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def add_stats_hook(hook: StatsHook) -> None:
+    """イベントごとに (kind, name, value) で呼ばれるフックを登録する
+
+    フックは転送しているスレッドで同期的に呼ばれるので、重い処理はしないこと
+    """
+    _HOOKS.append(hook)
+
+
+def remove_stats_hook(hook: StatsHook) -> None:
+    _HOOKS.remove(hook)
+
+
+def stats() -> Dict[str, Any]:
+    """集計した値のスナップショットを返す
+
+    throughputは、download.bytes, upload.bytesをdownload, uploadにかかった時間の合計で割った
+    バイト/秒 (まだ記録がなければNone)
+    """
+    with _LOCK:
+        counters = dict(_COUNTERS)
+        timings = {
+            name: {"count": count, "total": total, "max": max_}
+            for name, (count, total, max_) in _TIMINGS.items()
+        }
+    throughput: Dict[str, Optional[float]] = {}
+    for phase in ("download", "upload"):
+        total = timings.get(phase, {}).get("total")
+        throughput[phase] = counters.get(phase + ".bytes", 0) / total if total else None
+    return {"counters": counters, "timings": timings, "throughput": throughput}
+
+
+def reset_stats() -> None:
+    """集計した値を全て0に戻す"""
+    with _LOCK:
+        _COUNTERS.clear()
+        _TIMINGS.clear()
+
+
+def _metric_name(prefix: str, name: str) -> str:
+    return "{}_{}".format(prefix, name.replace(".", "_"))
+
+
+def to_prometheus(prefix: str = "cloudio") -> str:
+    """stats()をPrometheusのテキスト形式で返す
+
+    カウンタは <prefix>_<name>_total、時間は <prefix>_<name>_seconds のsummary (_count, _sum) になる
+    """
+    snapshot = stats()
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(prefix, name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for name, timing in sorted(snapshot["timings"].items()):
+        metric = _metric_name(prefix, name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"{metric}_count {timing['count']}")
+        lines.append(f"{metric}_sum {timing['total']}")
+    return "\n".join(lines) + "\n"
+
+
+class StatsdHook:
+    """イベントをStatsDにUDPで送るフック
+
+    カウンタは <prefix>.<name>:<value>|c、時間は <prefix>.<name>:<ミリ秒>|ms として送る。
+    送信に失敗しても例外は送出しない
+    """
+
+    def __init__(
+        self, host: str = "localhost", port: int = 8125, prefix: str = "cloudio"
+    ) -> None:
+        self._address = (host, port)
+        self._prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, kind: str, name: str, value: float) -> None:
+        if kind == "timing":
+            line = "{}.{}:{:g}|ms".format(self._prefix, name, value * 1000)
+        else:
+            line = "{}.{}:{:g}|c".format(self._prefix, name, value)
+        try:
+            self._socket.sendto(line.encode(), self._address)
+        except OSError:
+            pass
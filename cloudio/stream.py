@@ -0,0 +1,297 @@
+"""キャッシュやローカルの一時ファイルを介さずに、オブジェクトを直接読み書きするためのファイルオブジェクト"""
+
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, TYPE_CHECKING, Callable, List, Optional, Tuple, cast
+
+from cloudio.backends import Writer, get_backend
+from cloudio.s3 import (
+    s3_abort_multipart_upload,
+    s3_complete_multipart_upload,
+    s3_create_multipart_upload,
+    s3_put_object,
+    s3_upload_part,
+)
+from cloudio.stats import incr
+
+if TYPE_CHECKING:
+    import requests
+
+# S3のマルチパートアップロードのパート数と、1パートのサイズの上限
+S3_MAX_PARTS = 10000
+S3_MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+
+
+class RangeReader(io.RawIOBase):
+    """fetch(start, end) で取得したバイト列を読む、シーク可能なファイルオブジェクト
+
+    オブジェクトはblock_sizeごとのブロックとして取得し、読んでいるブロックの次のブロックを
+    バックグラウンドで先読みする。メモリに保持するのは高々2ブロック分
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int, int], bytes],
+        size: int,
+        block_size: int,
+        name: str = "",
+        on_close: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__()
+        self.name = name
+        self._fetch = fetch
+        self._size = size
+        self._block_size = block_size
+        self._on_close = on_close
+        self._pos = 0
+        self._block: Tuple[int, bytes] = (-1, b"")
+        self._next_block: Optional[Tuple[int, Future]] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        if self._pos >= self._size:
+            return 0
+        index = self._pos // self._block_size
+        data = self._get_block(index)
+        start = self._pos - index * self._block_size
+        n = min(len(b), len(data) - start)
+        b[:n] = data[start : start + n]
+        self._pos += n
+        return n
+
+    def _fetch_block(self, index: int) -> bytes:
+        start = index * self._block_size
+        end = min(start + self._block_size, self._size) - 1
+        data = self._fetch(start, end)
+        incr("stream.bytes", len(data))
+        return data
+
+    def _get_block(self, index: int) -> bytes:
+        if self._block[0] == index:
+            return self._block[1]
+
+        if self._next_block is not None and self._next_block[0] == index:
+            data = self._next_block[1].result()
+        else:
+            if self._next_block is not None:
+                self._next_block[1].cancel()
+            data = self._fetch_block(index)
+        self._block = (index, data)
+
+        self._next_block = None
+        if (index + 1) * self._block_size < self._size:
+            future = self._executor.submit(self._fetch_block, index + 1)
+            self._next_block = (index + 1, future)
+        return data
+
+    def close(self) -> None:
+        if not self.closed:
+            self._executor.shutdown(wait=False)
+            self._block = (-1, b"")
+            self._next_block = None
+            if self._on_close is not None:
+                self._on_close()
+        super().close()
+
+
+class ResponseReader(io.RawIOBase):
+    """requestsのレスポンスの本文を先頭から順に読むファイルオブジェクト"""
+
+    def __init__(
+        self,
+        response: "requests.Response",
+        name: str = "",
+        on_close: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__()
+        self.name = name
+        self._response = response
+        self._response.raw.decode_content = True
+        self._on_close = on_close
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._response.raw.read(len(b))
+        n = len(data)
+        b[:n] = data
+        incr("stream.bytes", n)
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._response.close()
+            if self._on_close is not None:
+                self._on_close()
+        super().close()
+
+
+class S3MultipartWriter(Writer):
+    """書き込まれたデータをpart_sizeごとに、バックグラウンドでS3にマルチパートアップロードする
+
+    アップロード中のパートは最大max_concurrency個で、それを超えるとwriteがブロックする。
+    closeでアップロードを完了し、abortで中止する。
+    part_size未満のデータしか書き込まれなかった場合は、closeで1回のPUTでアップロードする。
+    パート数の上限 (S3_MAX_PARTS) に達しないよう、パートのサイズはS3_MAX_PARTS / 10パートごとに
+    2倍にする (S3_MAX_PART_SIZEまで)。8MiBから始めると約8TBまで書き込める
+    """
+
+    def __init__(self, url: str, part_size: int, max_concurrency: int) -> None:
+        super().__init__()
+        self.name = url
+        self._url = url
+        self._part_size = part_size
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._in_flight = threading.BoundedSemaphore(max_concurrency)
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buffer += b
+        while len(self._buffer) >= self._next_part_size():
+            part_size = self._next_part_size()
+            part = bytes(self._buffer[:part_size])
+            del self._buffer[:part_size]
+            self._submit_part(part)
+        return len(b)
+
+    def _next_part_size(self) -> int:
+        doublings = len(self._parts) // (S3_MAX_PARTS // 10)
+        return min(self._part_size << doublings, S3_MAX_PART_SIZE)
+
+    def _submit_part(self, data: bytes) -> None:
+        # Fail early instead of uploading the rest if a part has failed.
+        for part in self._parts:
+            if part.done():
+                exception = part.exception()
+                if exception is not None:
+                    raise exception
+        if self._upload_id is None:
+            self._upload_id = s3_create_multipart_upload(self._url)
+        part_number = len(self._parts) + 1
+        self._in_flight.acquire()
+        part = self._executor.submit(
+            s3_upload_part, self._url, self._upload_id, part_number, data
+        )
+        part.add_done_callback(lambda _: self._in_flight.release())
+        self._parts.append(part)
+        incr("upload.bytes", len(data))
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                s3_put_object(self._url, bytes(self._buffer))
+                incr("upload.bytes", len(self._buffer))
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                etags = [part.result() for part in self._parts]
+                s3_complete_multipart_upload(self._url, self._upload_id, etags)
+        except BaseException:
+            self.abort()
+            raise
+        self._buffer = bytearray()
+        self._executor.shutdown()
+        super().close()
+
+    def abort(self) -> None:
+        """アップロードを中止し、アップロード済みのパートを削除する"""
+        if self.closed:
+            return
+        for part in self._parts:
+            part.cancel()
+        self._executor.shutdown()
+        if self._upload_id is not None:
+            s3_abort_multipart_upload(self._url, self._upload_id)
+        self._buffer = bytearray()
+        super().close()
+
+
+def open_upload_stream(url: str) -> Writer:
+    """urlにローカルの一時ファイルを介さずにアップロードするファイルオブジェクトを返す
+
+    closeでアップロードを完了し、abort()で中止する (Backend.open_write を参照)
+    """
+    return get_backend(url).open_write(url)
+
+
+def open_raw_stream(url: str) -> io.RawIOBase:
+    """urlを読むためのバッファリングされていないファイルオブジェクトを返す
+
+    S3と、Range requestに対応したHTTPサーバーではシーク可能なRangeReaderを返す。
+    Rangeに対応していないHTTPサーバーでは、先頭から順に読むだけのストリームになる
+    """
+    return get_backend(url).open_read(url)
+
+
+def wrap_stream(
+    raw: io.RawIOBase,
+    mode: str = "r",
+    buffering: int = -1,
+    encoding: Optional[str] = None,
+    errors: Optional[str] = None,
+    newline: Optional[str] = None,
+) -> IO:
+    """openと同じ要領で、rawをmodeに応じてバッファリングやテキストのデコードを行うように包む"""
+    if set(mode) - set("rwbt"):
+        raise ValueError(f"mode {mode} is invalid for streaming.")
+    if buffering == 0:
+        if "b" not in mode:
+            raise ValueError("can't have unbuffered text I/O")
+        # Unbuffered, like what open(..., buffering=0) returns.
+        return cast(IO, raw)
+    if buffering < 0:
+        buffering = io.DEFAULT_BUFFER_SIZE
+    buffered: io.BufferedIOBase
+    if "w" in mode:
+        buffered = io.BufferedWriter(raw, buffer_size=buffering)
+    else:
+        buffered = io.BufferedReader(raw, buffer_size=buffering)
+    if "b" in mode:
+        return buffered
+    return io.TextIOWrapper(buffered, encoding=encoding, errors=errors, newline=newline)
+
+
+def open_stream(
+    url: str,
+    mode: str = "r",
+    buffering: int = -1,
+    encoding: Optional[str] = None,
+    errors: Optional[str] = None,
+    newline: Optional[str] = None,
+) -> IO:
+    """openと同じ要領で、urlをキャッシュにダウンロードせずに読むファイルオブジェクトを返す"""
+    if "r" not in mode:
+        raise ValueError(f"mode {mode} is invalid for streaming.")
+    raw = open_raw_stream(url)
+    return wrap_stream(raw, mode, buffering, encoding, errors, newline)
@@ -8,23 +8,33 @@
 global defaults for certain tqdm parameters.
 """
 
-try:
-    SHELL = str(type(get_ipython()))  # type:ignore # noqa: F821
-except:  # noqa: E261
-    SHELL = ""
+_tqdm = None
 
-if "zmqshell.ZMQInteractiveShell" in SHELL:
-    from tqdm import tqdm_notebook as _tqdm
-else:
-    from tqdm import tqdm as _tqdm
 
-# This is neccesary to stop tqdm from hanging
-# when exceptions are raised inside iterators.
-# It should have been fixed in 4.2.1, but it still
-# occurs.
-# TODO(Mark): Remove this once tqdm cleans up after itself properly.
-# https://github.com/tqdm/tqdm/issues/469
-_tqdm.monitor_interval = 0
+def _get_tqdm():
+    # Resolved on first use, so that importing cloudio neither imports tqdm
+    # nor probes IPython.
+    global _tqdm
+    if _tqdm is None:
+        try:
+            shell = str(type(get_ipython()))  # type: ignore # noqa: F821
+        except:  # noqa: E261
+            shell = ""
+
+        if "zmqshell.ZMQInteractiveShell" in shell:
+            from tqdm import tqdm_notebook as tqdm
+        else:
+            from tqdm import tqdm
+
+        # This is neccesary to stop tqdm from hanging
+        # when exceptions are raised inside iterators.
+        # It should have been fixed in 4.2.1, but it still
+        # occurs.
+        # TODO(Mark): Remove this once tqdm cleans up after itself properly.
+        # https://github.com/tqdm/tqdm/issues/469
+        tqdm.monitor_interval = 0
+        _tqdm = tqdm
+    return _tqdm
 
 
 class Tqdm:
@@ -53,4 +63,4 @@ class Tqdm:
     def tqdm(*args, **kwargs):
         new_kwargs = {"mininterval": Tqdm.default_mininterval, **kwargs}
 
-        return _tqdm(*args, **new_kwargs)
+        return _get_tqdm()(*args, **new_kwargs)
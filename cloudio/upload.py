@@ -2,42 +2,48 @@ import os
 from contextlib import contextmanager
 from logging import getLogger
 from pathlib import Path
-from typing import Generator, Union
-from urllib.parse import urlparse
+from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Sequence, Union
 from uuid import uuid4
 
 from cloudio import get_config
-from cloudio.s3 import s3_upload_file, s3_upload_folder
+from cloudio.backends import get_backend, is_remote
+from cloudio.stats import incr, timer
 from cloudio.utils import to_str
 
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
 logger = getLogger(__name__)
 
 
-def upload(url: str, path: Union[str, Path]) -> None:
+def upload(
+    url: str,
+    path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> None:
     url = to_str(url)
     path = to_str(path)
 
-    parsed = urlparse(url)
-    if parsed.scheme == "s3":
-        if Path(path).is_dir():
-            raise NotImplementedError
-        else:
-            s3_upload_file(url=url, filename=path)
-    else:
-        raise NotImplementedError("Uploading except S3 is not implemented.")
+    if Path(path).is_dir():
+        raise NotImplementedError
+    with timer("upload"):
+        get_backend(url).upload(path, url, transfer_config=transfer_config)
+    incr("upload.bytes", os.path.getsize(path))
 
 
 @contextmanager
-def upload_later(cloud_or_local_path: Union[str, Path]) -> Generator[str, None, None]:
+def upload_later(
+    cloud_or_local_path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+) -> Generator[str, None, None]:
     cloud_or_local_path = to_str(cloud_or_local_path)
-    parsed = urlparse(cloud_or_local_path)
 
     # If path is local path, then yield it
     if Path(cloud_or_local_path).parent.exists():
         yield cloud_or_local_path
 
     # Upload to some cloud storage
-    elif parsed.scheme in ("s3", "gs"):
+    elif is_remote(cloud_or_local_path):
 
         # Write to temp file
         temp_path = (
@@ -50,7 +56,7 @@ def upload_later(cloud_or_local_path: Union[str, Path]) -> Generator[str, None,
 
         # if succeeded to write tempfile, then upload temp file to cloud
         try:
-            upload(cloud_or_local_path, temp_path)
+            upload(cloud_or_local_path, temp_path, transfer_config=transfer_config)
         except Exception:
             logger.error(
                 f"Upload to {cloud_or_local_path} failed. You can accesss {temp_path}"
@@ -66,17 +72,36 @@ def upload_later(cloud_or_local_path: Union[str, Path]) -> Generator[str, None,
         raise ValueError(f"Given url_or_path {cloud_or_local_path} is invalid.")
 
 
-def upload_folder(url: str, path: Union[str, Path]) -> None:
-    """ローカルのpath以下の全オブジェクトをurl以下にアップロードする
+def upload_folder(
+    url: str,
+    path: Union[str, Path],
+    transfer_config: Union["TransferConfig", Dict[str, Any], None] = None,
+    max_workers: int = 8,
+    include: Optional[Sequence[str]] = None,
+    exclude: Optional[Sequence[str]] = None,
+    skip_unchanged: bool = True,
+    dry_run: bool = False,
+) -> List[str]:
+    """ローカルのpath以下の全オブジェクトをurl以下にアップロードし、アップロードしたURLを返す
 
     path/A, path/B/C のようにファイルが存在するとき
-    url/A, url/B/Cのようにファイルがアップロードされる
+    url/A, url/B/Cのようにファイルがアップロードされる。
+    アップロードはmax_workers並列で行い、skip_unchangedがTrueならurl以下に同じ内容のファイルが
+    既にあるものはスキップする (中断した場合は呼び直せば続きからアップロードされる)。
+    include, excludeはpathからの相対パスに対するglobのリストで、アップロードするファイルを絞り込む。
+    dry_runがTrueの場合はアップロードするURLを返すだけで、実際にはアップロードしない
     """
     if not Path(path).is_dir():
         raise ValueError(f"Given path {path} is not directory")
 
-    parsed = urlparse(url)
-    if parsed.scheme == "s3":
-        s3_upload_folder(url=url, path=path)
-    else:
-        raise NotImplementedError("Uploading except S3 is not implemented.")
+    with timer("upload"):
+        return get_backend(url).upload_folder(
+            url=url,
+            path=to_str(path),
+            transfer_config=transfer_config,
+            max_workers=max_workers,
+            include=include,
+            exclude=exclude,
+            skip_unchanged=skip_unchanged,
+            dry_run=dry_run,
+        )
@@ -1,6 +1,7 @@
+import posixpath
 import re
 from pathlib import Path
-from typing import Union
+from typing import List, Union
 
 
 def to_str(path_or_url: Union[str, Path]) -> str:
@@ -19,3 +20,19 @@ def to_str(path_or_url: Union[str, Path]) -> str:
         return path_or_url_str
     else:
         raise TypeError
+
+
+def relative_parts(relative_path: str) -> List[str]:
+    """スラッシュ区切りの相対パスを正規化し、要素のリストに分けて返す
+
+    オブジェクトのキーからローカルのパスを作るときに使い、
+    絶対パスや ".." でルートの外に出るパスの場合はValueErrorとなる
+    """
+    normalized = posixpath.normpath(relative_path)
+    if (
+        normalized.startswith("/")
+        or normalized in (".", "..")
+        or normalized.startswith("../")
+    ):
+        raise ValueError("unsafe relative path {}".format(relative_path))
+    return normalized.split("/")
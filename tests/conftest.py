@@ -1,3 +1,12 @@
+import pytest
 from cloudio import set_config
+from tests.http_server import serve
 
 set_config(s3_profile="elyza")
+
+
+@pytest.fixture
+def http_server(tmp_path_factory):
+    """server.root以下のファイルを配信するローカルのHTTPサーバー (tests.http_server.serve 参照)"""
+    with serve(tmp_path_factory.mktemp("www")) as server:
+        yield server
@@ -0,0 +1,88 @@
+"""テストとベンチマークで共有する、ローカルのHTTPサーバー"""
+
+import gzip
+import hashlib
+import io
+import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+
+class RangeHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """`Range: bytes=start-end` とkeep-aliveに対応したSimpleHTTPRequestHandler"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def send_head(self):
+        self.server.requests.append((self.command, self.path))
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return super().send_head()
+
+        with open(path, "rb") as f:
+            body = f.read()
+        size = len(body)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.server.gzip:
+            body = gzip.compress(body)
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.server.accept_ranges and not self.server.gzip:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or size - 1), size - 1)
+            body = body[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        if self.server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if self.server.send_etag:
+            self.send_header("ETag", etag)
+            self.send_header("x-amz-request-id", "0")
+        if self.server.gzip:
+            self.send_header("Content-Encoding", "gzip")
+        if self.server.corrupt and self.command == "GET":
+            body = bytes(b ^ 1 for b in body[:1]) + body[1:]
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve(root: Path) -> Iterator[ThreadingHTTPServer]:
+    """root以下のファイルを配信するHTTPサーバーを別スレッドで立てる
+
+    server.send_etagをTrueにすると、S3と同じくファイルのMD5をETagとして返す。
+    server.corruptをTrueにすると、GETで返す本文の先頭1バイトを壊す。
+    server.gzipをTrueにすると、本文を Content-Encoding: gzip で返す
+    """
+    handler = partial(RangeHTTPRequestHandler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.accept_ranges = True
+    server.send_etag = False
+    server.corrupt = False
+    server.gzip = False
+    server.requests = []
+    server.connections = 0
+    server.root = root
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
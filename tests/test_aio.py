@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from cloudio import cloudio_config
+from cloudio.aio import acached_path, acopen, aprefetch
+
+
+def test_acached_path_and_acopen(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_text("hoge\nfuga\n")
+    url = f"{http_server.url}/hoge.txt"
+
+    async def main():
+        path = await acached_path(url)
+        async with acopen(url) as f:
+            text = await f.read()
+        async with acopen(url, stream=True) as f:
+            lines = [line async for line in f]
+        return path, text, lines
+
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path, text, lines = asyncio.run(main())
+    assert open(path).read() == text == "hoge\nfuga\n"
+    assert lines == ["hoge\n", "fuga\n"]
+
+
+def test_acopen_write_local(tmpdir):
+    path = str(tmpdir / "hoge.txt")
+
+    async def main():
+        async with acopen(path, "w") as f:
+            await f.write("hoge")
+        with pytest.raises(ValueError):
+            async with acopen(str(tmpdir / "fuga.txt"), "w") as f:
+                raise ValueError
+
+    asyncio.run(main())
+    assert open(path).read() == "hoge"
+
+
+def test_aprefetch(http_server, tmpdir, caplog):
+    urls = []
+    for i in range(100):
+        (http_server.root / f"{i}.txt").write_text(str(i))
+        urls.append(f"{http_server.url}/{i}.txt")
+    urls.append(f"{http_server.url}/not_existing.txt")
+
+    with cloudio_config(cache_dir=str(tmpdir), aio_max_concurrency=16):
+        results = asyncio.run(aprefetch(urls, max_workers=32))
+
+    assert list(results.keys()) == urls
+    for i, url in enumerate(urls[:-1]):
+        assert open(results[url]).read() == str(i)
+    assert isinstance(results[urls[-1]], IOError)
+    assert f"Failed to prefetch {urls[-1]}" in caplog.text
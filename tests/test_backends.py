@@ -0,0 +1,188 @@
+import os
+
+import pytest
+from cloudio import cached_path, cloudio_config, copen
+from cloudio.backends import Backend, get_backend, is_remote, register_backend
+from cloudio.backends.memory import MemoryBackend
+from cloudio.remove import remove
+from cloudio.upload import upload
+
+
+@pytest.fixture
+def memory():
+    backend = get_backend("memory://")
+    yield backend
+    backend.clear()
+
+
+def test_get_backend():
+    assert is_remote("s3://bucket/hoge.txt")
+    assert is_remote("https://example.com/hoge.txt")
+    assert not is_remote("/tmp/hoge.txt")
+    assert not is_remote("file:///tmp/hoge.txt")
+    assert not is_remote("unknown://bucket/hoge.txt")
+    with pytest.raises(ValueError):
+        get_backend("unknown://bucket/hoge.txt")
+
+
+def test_register_backend(memory, tmpdir):
+    class AliasBackend(MemoryBackend):
+        pass
+
+    register_backend("alias", AliasBackend)
+    get_backend("alias://").put("alias://bucket/hoge.txt", b"hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        assert open(cached_path("alias://bucket/hoge.txt")).read() == "hoge"
+
+    with pytest.raises(TypeError):
+        register_backend("alias", object())
+
+
+def test_backend_entry_point(monkeypatch, tmpdir):
+    import cloudio.backends
+
+    monkeypatch.setattr(
+        cloudio.backends,
+        "_entry_points",
+        lambda: {"plugin": "cloudio.backends.memory:MemoryBackend"},
+    )
+    backend = get_backend("plugin://bucket/hoge.txt")
+    assert isinstance(backend, Backend)
+    assert get_backend("plugin://") is backend
+
+
+def test_memory_backend_cached_path(memory, tmpdir):
+    memory.put("memory://bucket/hoge.txt", b"hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = cached_path("memory://bucket/hoge.txt")
+        assert open(path).read() == "hoge"
+        memory.put("memory://bucket/hoge.txt", b"fuga")
+        assert open(cached_path("memory://bucket/hoge.txt")).read() == "fuga"
+
+
+def test_memory_backend_folder(memory, tmpdir):
+    memory.put("memory://bucket/dir/a.txt", b"a")
+    memory.put("memory://bucket/dir/sub/b.txt", b"b")
+    memory.put("memory://bucket/dir10/c.txt", b"c")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        folder = cached_path("memory://bucket/dir/")
+    assert open(f"{folder}/a.txt").read() == "a"
+    assert open(f"{folder}/sub/b.txt").read() == "b"
+    assert not os.stat(f"{folder}/a.txt").st_mode & 0o222
+
+    result = remove("memory://bucket/dir")
+    assert result.deleted == [
+        "memory://bucket/dir/a.txt",
+        "memory://bucket/dir/sub/b.txt",
+    ]
+    assert [obj["url"] for obj in memory.list("memory://bucket")] == [
+        "memory://bucket/dir10/c.txt"
+    ]
+
+
+def test_memory_backend_empty_folder(memory, tmpdir):
+    memory.put("memory://bucket/dir/a.txt", b"a")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with pytest.raises(FileNotFoundError):
+            cached_path("memory://bucket/nothing/")
+    assert not tmpdir.join("index").exists()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_memory_backend_copen(memory, tmpdir, stream):
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with copen("memory://bucket/hoge.txt", "w", stream=stream) as f:
+            f.write("hoge\nfuga\n")
+        with copen("memory://bucket/hoge.txt", stream=stream) as f:
+            assert f.readlines() == ["hoge\n", "fuga\n"]
+
+    with pytest.raises(RuntimeError):
+        with copen("memory://bucket/aborted.txt", "w", stream=True) as f:
+            f.write("hoge")
+            raise RuntimeError
+    with pytest.raises(FileNotFoundError):
+        memory.stat("memory://bucket/aborted.txt")
+
+
+def test_local_backend(tmp_path):
+    (tmp_path / "hoge.txt").write_text("hoge")
+    url = f"file://{tmp_path}/hoge.txt"
+    assert cached_path(url) == str(tmp_path / "hoge.txt")
+
+    backend = get_backend(url)
+    assert backend.read_range(url, 1, 2) == b"og"
+    backend.copy(url, f"file://{tmp_path}/sub/fuga.txt")
+    assert (tmp_path / "sub" / "fuga.txt").read_text() == "hoge"
+    assert [obj["url"] for obj in backend.list(str(tmp_path))] == [
+        f"{tmp_path}/hoge.txt",
+        f"{tmp_path}/sub/fuga.txt",
+    ]
+
+    upload(str(tmp_path / "uploaded.txt"), tmp_path / "hoge.txt")
+    assert (tmp_path / "uploaded.txt").read_text() == "hoge"
+
+
+def test_s3_stat_is_a_plain_head(monkeypatch):
+    from botocore.stub import Stubber
+    from cloudio.s3 import get_s3_client
+
+    monkeypatch.setenv("AWS_EC2_METADATA_DISABLED", "true")
+    etag = '"{}-2"'.format("0" * 32)
+    with cloudio_config(s3_profile=None, s3_region="us-east-1"):
+        with Stubber(get_s3_client()) as stubber:
+            # キャッシュの確認のたびに呼ばれるstatは、追加のパラメータなしの1回のHEADだけ
+            stubber.add_response(
+                "head_object",
+                {"ETag": etag, "ContentLength": 10},
+                {"Bucket": "bucket", "Key": "hoge.bin"},
+            )
+            metadata = get_backend("s3://").stat("s3://bucket/hoge.bin")
+            assert metadata["md5"] == "0" * 32 + "-2"
+            assert metadata["part_size"] is None
+            # part_sizeはダウンロードする直前にだけ取得する
+            stubber.add_response(
+                "head_object",
+                {"ETag": etag, "ContentLength": 10},
+                {"Bucket": "bucket", "Key": "hoge.bin", "ChecksumMode": "ENABLED"},
+            )
+            stubber.add_response(
+                "head_object",
+                {"ETag": etag, "ContentLength": 6},
+                {"Bucket": "bucket", "Key": "hoge.bin", "PartNumber": 1},
+            )
+            metadata = get_backend("s3://").checksums("s3://bucket/hoge.bin", metadata)
+            assert metadata["part_size"] == 6
+            stubber.assert_no_pending_responses()
+
+
+def test_s3_list_bucket_root(monkeypatch, tmp_path):
+    from botocore.stub import Stubber
+    from cloudio.s3 import get_s3_client
+
+    monkeypatch.setenv("AWS_EC2_METADATA_DISABLED", "true")
+    (tmp_path / "hoge.txt").write_text("hoge")
+    contents = {"Contents": [{"Key": "fuga.txt", "ETag": '"etag"', "Size": 4}]}
+    with cloudio_config(s3_profile=None, s3_region="us-east-1"):
+        with Stubber(get_s3_client()) as stubber:
+            # バケットのルートでは、キーのプレフィックスは "/" ではなく空文字列
+            for _ in range(2):
+                stubber.add_response(
+                    "list_objects_v2", contents, {"Bucket": "bucket", "Prefix": ""}
+                )
+            backend = get_backend("s3://")
+            assert [obj["url"] for obj in backend.list("s3://bucket/")] == [
+                "s3://bucket/fuga.txt"
+            ]
+            assert backend.upload_folder("s3://bucket/", tmp_path, dry_run=True) == [
+                "s3://bucket/hoge.txt"
+            ]
+            stubber.assert_no_pending_responses()
+
+
+def test_memory_backend_folder_rejects_escaping_keys(memory, tmpdir):
+    memory.put("memory://bucket/dir/a.txt", b"a")
+    memory.put("memory://bucket/dir/../../escaped.txt", b"escaped")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with pytest.raises(ValueError):
+            cached_path("memory://bucket/dir/")
+    assert not tmpdir.join("escaped.txt").exists()
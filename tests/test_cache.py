@@ -0,0 +1,186 @@
+import hashlib
+import os
+import time
+
+from cloudio import cache, cached_path, cloudio_config
+from cloudio.backends import get_backend, register_backend
+from cloudio.backends.memory import MemoryBackend
+
+
+def _fetch(http_server, name, data):
+    (http_server.root / name).write_bytes(data)
+    return cached_path(f"{http_server.url}/{name}")
+
+
+def test_cache_list_size_evict(http_server, tmpdir):
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = _fetch(http_server, "a.txt", b"a" * 10)
+        _fetch(http_server, "b.txt", b"b" * 20)
+        entries = cache.list_entries()
+        assert sorted(entry.url for entry in entries) == [
+            f"{http_server.url}/a.txt",
+            f"{http_server.url}/b.txt",
+        ]
+        assert cache.size() == 30
+
+        evicted = cache.evict(f"{http_server.url}/a.txt")
+        assert [entry.path for entry in evicted] == [path]
+        assert not os.path.exists(path)
+        assert cache.size() == 20
+    lock_path = tmpdir.join("locks", os.path.basename(path) + ".lock")
+    assert not lock_path.exists()
+
+
+def test_cache_prune_orphan_locks(http_server, tmpdir):
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = _fetch(http_server, "a.txt", b"a" * 10)
+        tmpdir.join("locks", "orphan.lock").write("")
+        tmpdir.join("locks", "orphan.decompressed.lock").write("")
+        cache.prune()
+    assert tmpdir.join("locks").listdir() == [
+        tmpdir.join("locks", os.path.basename(path) + ".lock")
+    ]
+
+
+def test_cache_prune_lru(http_server, tmpdir):
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path_a = _fetch(http_server, "a.txt", b"a" * 10)
+        path_b = _fetch(http_server, "b.txt", b"b" * 10)
+        old = time.time() - 100
+        os.utime(path_b + ".json", (old, old))
+        # b.txtの方が最後のアクセスが古い
+        evicted = cache.prune(max_bytes=10)
+    assert [entry.path for entry in evicted] == [path_b]
+    assert os.path.exists(path_a)
+
+
+def test_cache_prune_max_age(http_server, tmpdir):
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = _fetch(http_server, "a.txt", b"a" * 10)
+        old = time.time() - 100
+        os.utime(path + ".json", (old, old))
+        assert cache.prune(max_age=200) == []
+        assert [entry.path for entry in cache.prune(max_age=50)] == [path]
+
+
+def test_cache_max_bytes(http_server, tmpdir):
+    with cloudio_config(cache_dir=str(tmpdir), cache_max_bytes=25):
+        path_a = _fetch(http_server, "a.txt", b"a" * 10)
+        path_b = _fetch(http_server, "b.txt", b"b" * 10)
+        path_c = _fetch(http_server, "c.txt", b"c" * 10)
+    assert not os.path.exists(path_a)
+    assert os.path.exists(path_b)
+    assert os.path.exists(path_c)
+
+
+def test_cache_cli(http_server, tmpdir, capsys):
+    with cloudio_config(cache_dir=str(tmpdir)):
+        _fetch(http_server, "a.txt", b"a" * 10)
+    cache.main(["--cache-dir", str(tmpdir), "size"])
+    assert capsys.readouterr().out == "10\n"
+    cache.main(["--cache-dir", str(tmpdir), "evict", f"{http_server.url}/a.txt"])
+    assert "evicted" in capsys.readouterr().out
+
+
+def test_cache_shares_blobs(http_server, tmpdir):
+    http_server.send_etag = True
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path_a = _fetch(http_server, "a.txt", b"same" * 10)
+        path_b = _fetch(http_server, "b.txt", b"same" * 10)
+        assert path_a != path_b
+        assert os.path.samefile(path_a, path_b)
+        assert [request[0] for request in http_server.requests].count("GET") == 1
+        assert cache.size() == 40
+
+        cache.evict(f"{http_server.url}/a.txt")
+        assert open(path_b, "rb").read() == b"same" * 10
+        cache.evict(f"{http_server.url}/b.txt")
+        assert os.listdir(os.path.join(str(tmpdir), "blobs")) == []
+
+
+def test_cache_shares_blobs_only_with_md5(http_server, tmpdir):
+    class OpaqueETagBackend(MemoryBackend):
+        # MD5のように見えても、内容のMD5ではないETagを返す
+        def put(self, url, data):
+            etag = '"{}"'.format(hashlib.md5(b"same" * 10).hexdigest())
+            self._objects[url] = (data, etag)
+
+        def stat(self, url):
+            return {**super().stat(url), "md5": None}
+
+    register_backend("opaque", OpaqueETagBackend)
+    get_backend("opaque://").put("opaque://bucket/b.txt", b"other")
+    http_server.send_etag = True
+    with cloudio_config(cache_dir=str(tmpdir)):
+        _fetch(http_server, "a.txt", b"same" * 10)
+        path = cached_path("opaque://bucket/b.txt")
+    assert open(path, "rb").read() == b"other"
+
+
+def test_cache_removes_blobs_keyed_by_md5(tmpdir):
+    class ContentMD5Backend(MemoryBackend):
+        # ETagはMD5ではないが、HTTPのContent-MD5のように内容のMD5を返す
+        def put(self, url, data):
+            self._objects[url] = (data, '"v1"')
+
+        def stat(self, url):
+            data, _ = self._get(url)
+            return {**super().stat(url), "md5": hashlib.md5(data).hexdigest()}
+
+    register_backend("contentmd5", ContentMD5Backend)
+    get_backend("contentmd5://").put("contentmd5://bucket/a.txt", b"a" * 10)
+    with cloudio_config(cache_dir=str(tmpdir)):
+        cached_path("contentmd5://bucket/a.txt")
+        assert len(tmpdir.join("blobs").listdir()) == 2
+        cache.evict("contentmd5://bucket/a.txt")
+    assert tmpdir.join("blobs").listdir() == []
+
+
+def test_cache_verify_blob_links(http_server, tmpdir):
+    http_server.send_etag = True
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path_a = _fetch(http_server, "a.txt", b"same" * 10)
+        path_b = _fetch(http_server, "b.txt", b"same" * 10)
+        assert os.path.samefile(path_a, path_b)
+        assert cache.verify() == []
+
+        with open(path_b, "r+b") as f:
+            f.write(b"x")
+        assert sorted(entry.path for entry in cache.verify()) == sorted(
+            [path_a, path_b]
+        )
+
+
+def test_cache_verify(http_server, tmpdir):
+    http_server.send_etag = True
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path_a = _fetch(http_server, "a.txt", b"a" * 10)
+        path_b = _fetch(http_server, "b.txt", b"b" * 10)
+        assert cache.verify() == []
+
+        with open(path_b, "r+b") as f:
+            f.write(b"x")
+        assert [entry.path for entry in cache.verify()] == [path_b]
+    assert os.path.exists(path_a)
+    assert not os.path.exists(path_b)
+
+
+def test_cache_prune_folder(tmpdir):
+    memory = get_backend("memory://")
+    memory.put("memory://bucket/dir/a.txt", b"a" * 10)
+    memory.put("memory://bucket/dir/b.txt", b"b" * 20)
+    try:
+        with cloudio_config(cache_dir=str(tmpdir)):
+            folder = cached_path("memory://bucket/dir/")
+            assert cache.size() == 30
+
+            assert len(cache.prune(max_bytes=0)) == 2
+            assert cache.size() == 0
+            assert not os.path.exists(folder)
+            assert not tmpdir.join("index").listdir()
+
+            # The folder is fetched again rather than served from the index.
+            folder = cached_path("memory://bucket/dir/")
+            assert open(os.path.join(folder, "b.txt")).read() == "b" * 20
+    finally:
+        memory.clear()
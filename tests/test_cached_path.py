@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from cloudio import cached_path, cloudio_config
+from cloudio.cached_path import get_from_memory_cache
+
+
+def test_cached_path_http(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = cached_path(f"{http_server.url}/hoge.txt")
+    assert open(path).read() == "hoge"
+
+
+def test_cached_path_revalidate_never(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir), cache_revalidate="never"):
+        path = cached_path(url)
+        http_server.shutdown()
+        http_server.server_close()
+        assert cached_path(url) == path
+
+
+def test_cached_path_revalidate_always(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir), cache_revalidate="always"):
+        cached_path(url)
+        (http_server.root / "hoge.txt").unlink()
+        with pytest.raises(IOError):
+            cached_path(url)
+
+
+def test_cached_path_revalidate_ttl(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir), cache_revalidate=3600):
+        path = cached_path(url)
+        (http_server.root / "hoge.txt").unlink()
+        assert cached_path(url) == path
+
+
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_cached_path_http_ranges(http_server, tmpdir, accept_ranges):
+    http_server.accept_ranges = accept_ranges
+    data = os.urandom(1000 * 1000 + 1)
+    (http_server.root / "large.bin").write_bytes(data)
+    with cloudio_config(
+        cache_dir=str(tmpdir),
+        http_download_part_size=100 * 1000,
+        http_download_concurrency=4,
+    ):
+        path = cached_path(f"{http_server.url}/large.bin")
+    assert open(path, "rb").read() == data
+
+
+def test_cached_path_no_partial_files_left(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = cached_path(f"{http_server.url}/hoge.txt")
+    assert os.path.dirname(path) == str(tmpdir)
+    assert sorted(os.listdir(str(tmpdir))) == sorted(
+        ["index", "locks", os.path.basename(path), os.path.basename(path) + ".json"]
+    )
+
+
+def test_cached_path_file_mode(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_text("hoge")
+    umask = os.umask(0o022)
+    os.umask(umask)
+    expected = 0o666 & ~umask
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = cached_path(f"{http_server.url}/hoge.txt")
+    # tempfileが作る0600ではなく、openで作ったときと同じパーミッションになる
+    for file in [path, path + ".json", *tmpdir.join("index").listdir()]:
+        assert os.stat(str(file)).st_mode & 0o777 == expected
+
+
+def test_cached_path_single_flight(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(cached_path, [url] * 8))
+    assert len(set(paths)) == 1
+    assert http_server.requests.count(("GET", "/hoge.txt")) == 1
+
+
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_cached_path_rejects_corrupted_download(http_server, tmpdir, accept_ranges):
+    http_server.accept_ranges = accept_ranges
+    http_server.send_etag = True
+    data = os.urandom(5 * 1024 * 1024 + 3)
+    (http_server.root / "data.bin").write_bytes(data)
+    with cloudio_config(
+        cache_dir=str(tmpdir),
+        http_download_part_size=1024 * 1024,
+        http_download_concurrency=4,
+    ):
+        http_server.corrupt = True
+        with pytest.raises(IOError, match="MD5"):
+            cached_path(f"{http_server.url}/data.bin")
+        assert [name for name in os.listdir(tmpdir) if name != "locks"] == []
+
+        http_server.corrupt = False
+        path = cached_path(f"{http_server.url}/data.bin")
+    with open(path, "rb") as f:
+        assert f.read() == data
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    assert meta["size"] == len(data)
+    assert meta["md5"] == hashlib.md5(data).hexdigest()
+
+
+def test_cached_path_content_encoding(http_server, tmpdir):
+    http_server.gzip = True
+    data = "hoge\n" * 1000
+    (http_server.root / "hoge.txt").write_text(data)
+    with cloudio_config(cache_dir=str(tmpdir)):
+        path = cached_path(f"{http_server.url}/hoge.txt")
+    assert open(path).read() == data
+
+
+def test_cached_path_reuses_connection(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_text("hoge")
+    (http_server.root / "fuga.txt").write_text("fuga")
+    # 他のテストのコネクションを使わないように新しいセッションにする
+    with cloudio_config(cache_dir=str(tmpdir), http_timeout=30):
+        cached_path(f"{http_server.url}/hoge.txt")
+        cached_path(f"{http_server.url}/fuga.txt")
+    assert [request[0] for request in http_server.requests] == [
+        "HEAD",
+        "GET",
+        "HEAD",
+        "GET",
+    ]
+    assert http_server.connections == 1
+
+
+def test_cached_path_offline_fallback(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir), cache_revalidate=0, http_retries=0):
+        path = cached_path(url)
+        http_server.shutdown()
+        http_server.server_close()
+    # keep-aliveしているコネクションを使わないように新しいセッションにする
+    with cloudio_config(
+        cache_dir=str(tmpdir), cache_revalidate=0, http_retries=0, http_timeout=30
+    ):
+        # サーバーに接続できなくても、キャッシュ済みのファイルを使う
+        assert cached_path(url) == path
+        with cloudio_config(cache_revalidate="always"):
+            with pytest.raises(requests.ConnectionError):
+                cached_path(url)
+
+
+def test_get_from_memory_cache(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    (http_server.root / "hoge.txt").write_text("hoge")
+    (http_server.root / "large.bin").write_bytes(b"x" * 100)
+    with cloudio_config(
+        cache_dir=str(tmpdir),
+        cache_revalidate="never",
+        memory_cache_max_bytes=1024,
+        memory_cache_max_object_size=10,
+    ):
+        assert get_from_memory_cache(url) == b"hoge"
+        # メモリ上にあれば、ディスクのキャッシュが消えてもサーバーに接続できなくても返る
+        os.remove(cached_path(url))
+        http_server.requests.clear()
+        assert get_from_memory_cache(url) == b"hoge"
+        assert http_server.requests == []
+        # 大きなファイルはディスクのキャッシュのパスが返る
+        path = get_from_memory_cache(f"{http_server.url}/large.bin")
+        assert open(path, "rb").read() == b"x" * 100
+
+
+def test_get_from_memory_cache_revalidate(http_server, tmpdir):
+    url = f"{http_server.url}/hoge.txt"
+    http_server.send_etag = True
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir), memory_cache_max_bytes=1024):
+        assert get_from_memory_cache(url) == b"hoge"
+        (http_server.root / "hoge.txt").write_text("fuga")
+        assert get_from_memory_cache(url) == b"fuga"
+
+
+def test_get_from_memory_cache_lru(http_server, tmpdir):
+    urls = [f"{http_server.url}/{i}.txt" for i in range(3)]
+    for i in range(3):
+        (http_server.root / f"{i}.txt").write_text(str(i) * 4)
+    with cloudio_config(
+        cache_dir=str(tmpdir), cache_revalidate="never", memory_cache_max_bytes=8
+    ):
+        get_from_memory_cache(urls[0])
+        get_from_memory_cache(urls[1])
+        get_from_memory_cache(urls[0])
+        get_from_memory_cache(urls[2])
+        # 最も長く使われていない1.txtがメモリから追い出され、ディスクから読み直す
+        for i in range(3):
+            os.remove(cached_path(urls[i]))
+        assert get_from_memory_cache(urls[0]) == b"0000"
+        assert get_from_memory_cache(urls[2]) == b"2222"
+        assert get_from_memory_cache(urls[1]) == b"1111"
@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 from pathlib import Path
 
 from cloudio.utils import to_str
@@ -15,3 +18,20 @@ def test_to_str():
 
     url = "https://elyza-sandbox.s3.amazonaws.com/liz_ocr/shadow_sample1.jpg"
     assert to_str(Path(url)) == url
+
+
+def test_import_is_lazy(tmpdir):
+    # SDKs must only be imported once the backend that needs them is used
+    path = str(tmpdir / "hoge.txt")
+    code = f"""
+import sys
+import cloudio
+with cloudio.copen({path!r}, "w") as f:
+    f.write("hoge")
+with cloudio.copen({path!r}) as f:
+    assert f.read() == "hoge"
+loaded = {{"boto", "boto3", "botocore", "requests", "tqdm"}} & set(sys.modules)
+assert not loaded, loaded
+"""
+    env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
@@ -0,0 +1,99 @@
+import bz2
+import gzip
+import lzma
+import os
+import re
+import sys
+
+import pytest
+from cloudio import cache, cloudio_config, copen
+
+COMPRESS = {"gz": gzip.compress, "bz2": bz2.compress, "xz": lzma.compress}
+
+
+@pytest.mark.parametrize("ext", ["gz", "bz2", "xz"])
+@pytest.mark.parametrize("stream", [False, True])
+def test_read_compressed(http_server, tmpdir, ext, stream):
+    text = '{"a": 1}\n{"a": 2}\n'
+    # gzipのヘッダーには圧縮した時刻が入るので、圧縮するのは1回だけにする
+    compressed = COMPRESS[ext](text.encode())
+    (http_server.root / f"hoge.jsonl.{ext}").write_bytes(compressed)
+    url = f"{http_server.url}/hoge.jsonl.{ext}"
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with copen(url, stream=stream, compression="infer") as f:
+            assert f.read() == text
+        # デフォルトでは圧縮されたまま読む
+        with copen(url, stream=stream, encoding="latin-1", newline="") as f:
+            assert f.read() == compressed.decode("latin-1")
+        # バイナリモードでは圧縮されたまま読む
+        with copen(url, "rb", stream=stream) as f:
+            assert f.read() == compressed
+        with copen(url, "rb", stream=stream, compression="infer") as f:
+            assert f.read()[:2] != text[:2].encode()
+        with copen(
+            url, "rb", stream=stream, compression=ext.replace("gz", "gzip")
+        ) as f:
+            assert f.read() == text.encode()
+
+
+def test_read_compressed_by_magic(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_bytes(gzip.compress(b"hoge"))
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with copen(f"{http_server.url}/hoge.txt", compression="infer") as f:
+            assert f.read() == "hoge"
+        with copen(f"{http_server.url}/hoge.txt") as f:
+            with pytest.raises(UnicodeDecodeError):
+                f.read()
+
+
+def test_cache_decompress(http_server, tmpdir):
+    (http_server.root / "hoge.txt.gz").write_bytes(gzip.compress(b"hoge"))
+    url = f"{http_server.url}/hoge.txt.gz"
+    with cloudio_config(cache_dir=str(tmpdir), cache_decompress=True):
+        with copen(url, compression="infer") as f:
+            assert f.read() == "hoge"
+        (decompressed,) = os.listdir(tmpdir / "decompressed")
+        assert open(tmpdir / "decompressed" / decompressed).read() == "hoge"
+        # 展開したファイルもキャッシュの容量に含める
+        compressed_size = len(gzip.compress(b"hoge"))
+        assert cache.size() == compressed_size + len(b"hoge")
+        assert len(cache.prune(max_bytes=compressed_size)) == 1
+    assert os.listdir(tmpdir / "decompressed") == []
+    assert os.listdir(tmpdir / "locks") == []
+
+
+def test_write_compressed(tmpdir):
+    path = str(tmpdir / "hoge.txt.gz")
+    with copen(path, "w", compression="infer", compresslevel=1) as f:
+        f.write("hoge")
+    assert gzip.decompress(open(path, "rb").read()) == b"hoge"
+    with copen(path, compression="infer") as f:
+        assert f.read() == "hoge"
+
+
+def test_compressed_open_kwargs(tmpdir):
+    path = str(tmpdir / "hoge.txt.gz")
+    with copen(path, "w", compression="gzip", buffering=1, newline="\r\n") as f:
+        f.write("hoge\n")
+    assert gzip.decompress(open(path, "rb").read()) == b"hoge\r\n"
+    with copen(path, compression="gzip", buffering=1, newline="") as f:
+        assert f.read() == "hoge\r\n"
+
+
+def test_zstd(tmpdir):
+    pytest.importorskip("zstandard")
+    path = str(tmpdir / "hoge.txt.zst")
+    with copen(path, "w", compression="infer") as f:
+        f.write("hoge")
+    with copen(path, compression="infer") as f:
+        assert f.read() == "hoge"
+
+
+@pytest.mark.parametrize(
+    "ext,module,extra", [("zst", "zstandard", "zstd"), ("lz4", "lz4", "lz4")]
+)
+def test_missing_codec_names_extra(tmpdir, monkeypatch, ext, module, extra):
+    monkeypatch.setitem(sys.modules, module, None)
+    with pytest.raises(ImportError, match=re.escape(f"cloudio[{extra}]")):
+        with copen(str(tmpdir / f"hoge.txt.{ext}"), "w", compression="infer"):
+            pass
@@ -0,0 +1,27 @@
+import os
+
+from cloudio.cached_path import cached_path
+from cloudio.download import download_folder
+from cloudio.upload import upload_folder
+
+
+def test_download_folder(tmp_path):
+    upload_folder("s3://elyza-sandbox/cloudio/download_folder", "tests/")
+    downloaded = download_folder("s3://elyza-sandbox/cloudio/download_folder", tmp_path)
+    assert str(tmp_path / "test_download.py") in downloaded
+    assert (tmp_path / "test_download.py").read_text() == open(
+        "tests/test_download.py"
+    ).read()
+
+    # Everything is already there
+    assert download_folder("s3://elyza-sandbox/cloudio/download_folder", tmp_path) == []
+
+
+def test_cached_path_folder(tmp_path):
+    upload_folder("s3://elyza-sandbox/cloudio/download_folder", "tests/")
+    folder = cached_path("s3://elyza-sandbox/cloudio/download_folder/", tmp_path)
+    assert os.path.isdir(folder)
+    assert (
+        open(os.path.join(folder, "test_download.py")).read()
+        == open("tests/test_download.py").read()
+    )
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+from cloudio.lock import file_lock
+
+
+def _hold_lock(lock_path, seconds):
+    with file_lock(lock_path):
+        time.sleep(seconds)
+
+
+def _hold_and_remove_lock(lock_path, seconds):
+    with file_lock(lock_path):
+        time.sleep(seconds)
+        os.remove(lock_path)
+
+
+def test_file_lock_threads(tmpdir):
+    lock_path = str(tmpdir / "hoge.lock")
+    counter = {"active": 0, "max": 0}
+
+    def work():
+        with file_lock(lock_path):
+            counter["active"] += 1
+            counter["max"] = max(counter["max"], counter["active"])
+            time.sleep(0.01)
+            counter["active"] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter["max"] == 1
+
+
+def test_file_lock_timeout_between_processes(tmpdir):
+    lock_path = str(tmpdir / "hoge.lock")
+    process = multiprocessing.Process(target=_hold_lock, args=(lock_path, 2))
+    process.start()
+    time.sleep(0.5)
+    try:
+        with pytest.raises(TimeoutError):
+            with file_lock(lock_path, timeout=0.1):
+                pass
+    finally:
+        process.join()
+    with file_lock(lock_path, timeout=0.1):
+        pass
+
+
+def test_file_lock_removed_by_holder(tmpdir):
+    lock_path = str(tmpdir / "hoge.lock")
+    process = multiprocessing.Process(target=_hold_and_remove_lock, args=(lock_path, 1))
+    process.start()
+    time.sleep(0.5)
+    try:
+        # 削除されたファイルではなく、新しく作ったファイルでロックを取る
+        with file_lock(lock_path):
+            assert os.path.exists(lock_path)
+    finally:
+        process.join()
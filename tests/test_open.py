@@ -1,8 +1,11 @@
+import gzip
+import io
 from pathlib import Path
 
 import pandas as pd
 import pytest
-from cloudio import copen
+from cloudio import cloudio_config, cmmap, copen
+from cloudio.cache import evict
 
 
 def test_open_read_s3_00():
@@ -51,3 +54,60 @@ def test_open_raise_not_found():
     with pytest.raises(FileNotFoundError):
         with copen("s3://elyza-datasets/not_existing.txt", "r") as f:
             text = f.read()
+
+
+def test_open_read_s3_stream():
+    with copen("s3://elyza-sandbox/cloudio/README.md", stream=True) as f:
+        text = f.read()
+    assert text[:9] == "# cloudio"
+
+
+def test_open_write_s3_stream():
+    with copen("s3://elyza-sandbox/cloudio/bar_stream.txt", "w", stream=True) as f:
+        f.write("bar")
+    with copen("s3://elyza-sandbox/cloudio/bar_stream.txt") as f:
+        assert f.read() == "bar"
+
+
+def test_open_read_unbuffered(http_server, tmpdir):
+    (http_server.root / "hoge.bin").write_bytes(b"hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with copen(f"{http_server.url}/hoge.bin", "rb", buffering=0) as f:
+            assert isinstance(f, io.RawIOBase)
+            assert f.read() == b"hoge"
+        with copen(f"{http_server.url}/hoge.bin", "rb", buffering=0, stream=True) as f:
+            assert isinstance(f, io.RawIOBase)
+            assert f.read() == b"hoge"
+
+
+def test_cmmap(http_server, tmpdir):
+    (http_server.root / "hoge.bin").write_bytes(b"hoge" * 1000)
+    with cloudio_config(cache_dir=str(tmpdir)):
+        with cmmap(f"{http_server.url}/hoge.bin") as m:
+            assert len(m) == 4000
+            assert m[:8] == b"hogehoge"
+            with pytest.raises(TypeError):
+                m[0] = 0
+
+
+def test_open_read_memory_cache(http_server, tmpdir):
+    (http_server.root / "hoge.txt").write_text("hoge\r\nfuga")
+    (http_server.root / "hoge.txt.gz").write_bytes(gzip.compress(b"hoge"))
+    url = f"{http_server.url}/hoge.txt"
+    with cloudio_config(
+        cache_dir=str(tmpdir), cache_revalidate="never", memory_cache_max_bytes=1024
+    ):
+        with copen(url) as f:
+            assert f.read() == "hoge\nfuga"
+        with copen(url, "rb") as f:
+            assert isinstance(f, io.BytesIO)
+            assert f.read() == b"hoge\r\nfuga"
+        with copen(url + ".gz", compression="infer") as f:
+            assert f.read() == "hoge"
+        # キャッシュから削除するとメモリからも消える
+        (http_server.root / "hoge.txt").write_text("piyo")
+        with copen(url) as f:
+            assert f.read() == "hoge\nfuga"
+        evict(url)
+        with copen(url) as f:
+            assert f.read() == "piyo"
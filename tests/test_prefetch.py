@@ -0,0 +1,19 @@
+from cloudio import cloudio_config, prefetch
+from cloudio.prefetch import prefetch_one
+
+
+def test_prefetch(http_server, tmpdir):
+    urls = []
+    for i in range(20):
+        (http_server.root / f"{i}.txt").write_text(str(i))
+        urls.append(f"{http_server.url}/{i}.txt")
+    urls.append(f"{http_server.url}/not_existing.txt")
+
+    with cloudio_config(cache_dir=str(tmpdir)):
+        results = prefetch(urls, max_workers=4)
+        assert prefetch_one(urls[0]) == results[urls[0]]
+
+    assert list(results.keys()) == urls
+    for i, url in enumerate(urls[:-1]):
+        assert open(results[url]).read() == str(i)
+    assert isinstance(results[urls[-1]], IOError)
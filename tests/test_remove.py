@@ -1,7 +1,101 @@
+import time
+
+import pytest
+
+from cloudio import cloudio_config
 from cloudio.remove import remove
-from cloudio.upload import upload_folder
+from cloudio.upload import upload, upload_folder
 
 
 def test_remove():
     upload_folder("s3://elyza-sandbox/cloudio/remove_test", "tests/")
     remove("s3://elyza-sandbox/cloudio/remove_test")
+
+
+def test_remove_respects_path_boundary():
+    upload("s3://elyza-sandbox/cloudio/remove_run1/README.md", "README.md")
+    upload("s3://elyza-sandbox/cloudio/remove_run10/README.md", "README.md")
+    result = remove("s3://elyza-sandbox/cloudio/remove_run1")
+    assert result.deleted == ["s3://elyza-sandbox/cloudio/remove_run1/README.md"]
+    assert result.errors == {}
+    result = remove("s3://elyza-sandbox/cloudio/remove_run10", dry_run=True)
+    assert result.deleted == ["s3://elyza-sandbox/cloudio/remove_run10/README.md"]
+
+
+def test_remove_local(tmp_path):
+    (tmp_path / "run1" / "sub").mkdir(parents=True)
+    (tmp_path / "run1" / "sub" / "a.txt").write_text("a")
+    (tmp_path / "run10").mkdir()
+    (tmp_path / "run10" / "b.txt").write_text("b")
+
+    result = remove(tmp_path / "run1", dry_run=True)
+    assert result.deleted == [str(tmp_path / "run1" / "sub" / "a.txt")]
+    assert (tmp_path / "run1").exists()
+
+    with pytest.raises(IsADirectoryError):
+        remove(tmp_path / "run1", recursive=False)
+
+    result = remove(tmp_path / "run1")
+    assert result.deleted == [str(tmp_path / "run1" / "sub" / "a.txt")]
+    assert result.errors == {}
+    assert not (tmp_path / "run1").exists()
+    assert (tmp_path / "run10" / "b.txt").exists()
+
+    assert remove(tmp_path / "run10" / "b.txt", recursive=False).deleted == [
+        str(tmp_path / "run10" / "b.txt")
+    ]
+    assert remove(tmp_path / "missing") == ([], {})
+
+
+def test_remove_http():
+    with pytest.raises(NotImplementedError):
+        remove("https://example.com/hoge.txt")
+
+
+def test_remove_raises_on_errors(monkeypatch):
+    from botocore.stub import Stubber
+    from cloudio.s3 import get_s3_client
+
+    monkeypatch.setenv("AWS_EC2_METADATA_DISABLED", "true")
+    with cloudio_config(s3_profile=None, s3_region="us-east-1"):
+        with Stubber(get_s3_client()) as stubber:
+            for _ in range(2):
+                stubber.add_response("list_objects_v2", {})
+                stubber.add_response(
+                    "list_objects_v2",
+                    {"Contents": [{"Key": "run1/a.txt", "ETag": '"a"', "Size": 1}]},
+                )
+                stubber.add_response(
+                    "delete_objects",
+                    {"Errors": [{"Key": "run1/a.txt", "Code": "AccessDenied"}]},
+                )
+            with pytest.raises(IOError):
+                remove("s3://bucket/run1")
+            result = remove("s3://bucket/run1", ignore_errors=True)
+    assert result.deleted == []
+    assert list(result.errors) == ["s3://bucket/run1/a.txt"]
+
+
+def test_remove_bounds_in_flight_batches(monkeypatch):
+    import cloudio.s3
+
+    listed = []
+    ahead = []
+
+    def keys_to_remove(url, recursive):
+        for i in range(50):
+            listed.append(i)
+            yield f"run1/{i}.txt"
+
+    def delete_batch(bucket_name, keys):
+        # 削除に取りかかった時点で、リストがどれだけ先に進んでいるか
+        ahead.append(len(listed) - int(keys[0][len("run1/") : -len(".txt")]))
+        time.sleep(0.01)
+        return keys, {}
+
+    monkeypatch.setattr(cloudio.s3, "DELETE_BATCH_SIZE", 1)
+    monkeypatch.setattr(cloudio.s3, "_keys_to_remove", keys_to_remove)
+    monkeypatch.setattr(cloudio.s3, "_delete_batch", delete_batch)
+    result = remove("s3://bucket/run1", max_workers=4)
+    assert len(result.deleted) == 50
+    assert max(ahead) <= 4 + 1
@@ -1,4 +1,16 @@
-from cloudio.s3 import get_credential_source, has_default_credentials
+import hashlib
+
+import pytest
+from cloudio import cloudio_config
+from cloudio.s3 import (
+    clear_credentials_cache,
+    etag_matches,
+    get_credential_source,
+    get_s3_client,
+    get_s3_resource,
+    get_transfer_config,
+    has_default_credentials,
+)
 
 
 def test_get_credential_source():
@@ -8,3 +20,78 @@ def test_get_credential_source():
 
 def test_has_default_credentials():
     assert not has_default_credentials()
+
+
+def test_get_s3_resource_reused():
+    with cloudio_config(s3_profile=None):
+        assert get_s3_resource() is get_s3_resource()
+        assert get_s3_client() is get_s3_client()
+
+
+def test_get_s3_resource_invalidated_by_config():
+    with cloudio_config(s3_profile=None):
+        s3_resource = get_s3_resource()
+        with cloudio_config(s3_region="ap-northeast-1"):
+            assert get_s3_resource() is not s3_resource
+            assert get_s3_client().meta.region_name == "ap-northeast-1"
+
+
+def test_get_transfer_config():
+    with cloudio_config(s3_max_concurrency=32):
+        assert get_transfer_config().max_concurrency == 32
+        transfer_config = get_transfer_config({"s3_use_threads": False})
+    assert transfer_config.max_concurrency == 32
+    assert not transfer_config.use_threads
+    with pytest.raises(KeyError):
+        get_transfer_config({"max_concurrency": 32})
+
+
+def test_etag_matches(tmpdir):
+    path = tmpdir / "hoge.bin"
+    data = b"a" * 25
+    path.write_binary(data)
+    assert etag_matches(str(path), f'"{hashlib.md5(data).hexdigest()}"', 10)
+    assert not etag_matches(str(path), f'"{hashlib.md5(b"b").hexdigest()}"', 10)
+
+    part_digests = b"".join(
+        hashlib.md5(data[i : i + 10]).digest() for i in range(0, 25, 10)
+    )
+    multipart_etag = f'"{hashlib.md5(part_digests).hexdigest()}-3"'
+    assert etag_matches(str(path), multipart_etag, 10)
+    # パートのサイズが違うと比較できない
+    assert etag_matches(str(path), multipart_etag, 20) is None
+
+
+@pytest.fixture
+def no_credentials(monkeypatch, tmpdir):
+    # 実行環境の認証情報やEC2のメタデータを見ないようにする
+    for key in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_PROFILE"):
+        monkeypatch.delenv(key, raising=False)
+    monkeypatch.setenv("AWS_SHARED_CREDENTIALS_FILE", str(tmpdir / "credentials"))
+    monkeypatch.setenv("AWS_CONFIG_FILE", str(tmpdir / "config"))
+    monkeypatch.setenv("BOTO_CONFIG", str(tmpdir / "boto"))
+    monkeypatch.setenv("AWS_EC2_METADATA_DISABLED", "true")
+    clear_credentials_cache()
+    yield tmpdir
+    clear_credentials_cache()
+
+
+def test_has_default_credentials_cached(no_credentials, monkeypatch):
+    assert not has_default_credentials()
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "hoge")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "fuga")
+    assert not has_default_credentials()
+    clear_credentials_cache()
+    assert has_default_credentials()
+
+
+def test_has_default_credentials_assume_role(no_credentials):
+    (no_credentials / "credentials").write(
+        "[base]\naws_access_key_id = hoge\naws_secret_access_key = fuga\n"
+    )
+    (no_credentials / "config").write(
+        "[default]\n"
+        "role_arn = arn:aws:iam::123456789012:role/hoge\n"
+        "source_profile = base\n"
+    )
+    assert has_default_credentials()
@@ -0,0 +1,81 @@
+import socket
+
+import pytest
+from cloudio import add_stats_hook, cached_path, cloudio_config, reset_stats, stats
+from cloudio.cache import evict
+from cloudio.stats import StatsdHook, incr, remove_stats_hook, to_prometheus
+
+
+@pytest.fixture
+def enabled():
+    reset_stats()
+    with cloudio_config(stats_enabled=True):
+        yield
+    reset_stats()
+
+
+def test_stats_cached_path(http_server, tmpdir, enabled):
+    (http_server.root / "hoge.txt").write_text("hoge")
+    url = f"{http_server.url}/hoge.txt"
+    with cloudio_config(cache_dir=str(tmpdir)):
+        cached_path(url)
+        cached_path(url)
+        evict(url)
+
+    snapshot = stats()
+    assert snapshot["counters"] == {
+        "http.requests": 3,
+        "cache.miss": 1,
+        "cache.hit": 1,
+        "cache.eviction": 1,
+        "download.bytes": 4,
+    }
+    assert snapshot["timings"]["head"]["count"] == 2
+    assert snapshot["timings"]["download"]["count"] == 1
+    assert snapshot["timings"]["commit"]["count"] == 1
+    assert snapshot["throughput"]["download"] > 0
+    assert snapshot["throughput"]["upload"] is None
+
+
+def test_stats_disabled(http_server, tmpdir):
+    reset_stats()
+    (http_server.root / "hoge.txt").write_text("hoge")
+    with cloudio_config(cache_dir=str(tmpdir)):
+        cached_path(f"{http_server.url}/hoge.txt")
+    assert stats() == {
+        "counters": {},
+        "timings": {},
+        "throughput": {"download": None, "upload": None},
+    }
+
+
+def test_stats_hook(enabled):
+    events = []
+
+    def hook(kind, name, value):
+        events.append((kind, name, value))
+
+    add_stats_hook(hook)
+    incr("cache.hit")
+    remove_stats_hook(hook)
+    incr("cache.hit")
+    assert events == [("counter", "cache.hit", 1)]
+
+
+def test_to_prometheus(enabled):
+    incr("download.bytes", 1024)
+    assert "cloudio_download_bytes_total 1024\n" in to_prometheus()
+
+
+def test_statsd_hook(enabled):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(5)
+    hook = StatsdHook("127.0.0.1", server.getsockname()[1])
+    add_stats_hook(hook)
+    try:
+        incr("cache.miss")
+        assert server.recv(1024) == b"cloudio.cache.miss:1|c"
+    finally:
+        remove_stats_hook(hook)
+        server.close()
@@ -0,0 +1,70 @@
+import io
+import os
+
+import pytest
+from cloudio import cloudio_config, copen
+from cloudio.stream import RangeReader
+
+
+def test_range_reader_seek():
+    data = os.urandom(1000)
+    fetched = []
+
+    def fetch(start, end):
+        fetched.append((start, end))
+        return data[start : end + 1]
+
+    with io.BufferedReader(RangeReader(fetch, len(data), 100), 16) as f:
+        assert f.read(10) == data[:10]
+        f.seek(550)
+        assert f.read(100) == data[550:650]
+        f.seek(-5, io.SEEK_END)
+        assert f.read() == data[-5:]
+    assert (0, 99) in fetched
+    assert (500, 599) in fetched
+    assert (900, 999) in fetched
+
+
+@pytest.mark.parametrize("accept_ranges", [True, False])
+def test_copen_stream_http(http_server, tmpdir, accept_ranges):
+    http_server.accept_ranges = accept_ranges
+    lines = [f"line {i}\n" for i in range(10000)]
+    (http_server.root / "hoge.txt").write_text("".join(lines))
+    with cloudio_config(cache_dir=str(tmpdir), stream_block_size=1000):
+        with copen(f"{http_server.url}/hoge.txt", stream=True) as f:
+            assert list(f) == lines
+    # キャッシュにはダウンロードされない
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_copen_stream_http_binary_seek(http_server):
+    data = os.urandom(10000)
+    (http_server.root / "hoge.bin").write_bytes(data)
+    with cloudio_config(stream_block_size=1000):
+        with copen(f"{http_server.url}/hoge.bin", "rb", stream=True) as f:
+            f.seek(5000)
+            assert f.read(10) == data[5000:5010]
+            assert f.tell() == 5010
+
+
+def test_s3_multipart_writer_grows_parts(monkeypatch):
+    import cloudio.stream
+
+    sizes = []
+    monkeypatch.setattr(cloudio.stream, "S3_MAX_PARTS", 100)
+    monkeypatch.setattr(cloudio.stream, "s3_create_multipart_upload", lambda url: "id")
+    monkeypatch.setattr(
+        cloudio.stream,
+        "s3_upload_part",
+        lambda url, upload_id, part_number, data: sizes.append(len(data)) or "etag",
+    )
+    monkeypatch.setattr(
+        cloudio.stream,
+        "s3_complete_multipart_upload",
+        lambda url, upload_id, etags: None,
+    )
+    writer = cloudio.stream.S3MultipartWriter("s3://bucket/hoge.bin", 1, 4)
+    writer.write(b"x" * 30)
+    writer.close()
+    # 10パートごとにパートのサイズが2倍になる
+    assert sizes == [1] * 10 + [2] * 10
@@ -19,3 +19,31 @@ def test_upload_later():
 
 def test_upload_folder():
     upload_folder("s3://elyza-sandbox/cloudio/upload_folder", "tests/")
+
+
+def test_upload_later_transfer_config():
+    with upload_later(
+        "s3://elyza-sandbox/cloudio/hoge.txt",
+        transfer_config={"s3_use_threads": False},
+    ) as local_tmp_file:
+        with open(local_tmp_file, "w") as f:
+            f.write("hoge")
+
+
+def test_upload_folder_skip_unchanged():
+    upload_folder("s3://elyza-sandbox/cloudio/upload_folder", "tests/")
+    uploaded = upload_folder("s3://elyza-sandbox/cloudio/upload_folder", "tests/")
+    assert uploaded == []
+
+
+def test_upload_folder_dry_run():
+    uploaded = upload_folder(
+        "s3://elyza-sandbox/cloudio/upload_folder_dry_run",
+        "tests/",
+        include=["*.py"],
+        exclude=["conftest.py"],
+        dry_run=True,
+    )
+    assert "s3://elyza-sandbox/cloudio/upload_folder_dry_run/test_upload.py" in uploaded
+    assert all(url.endswith(".py") for url in uploaded)
+    assert not any(url.endswith("conftest.py") for url in uploaded)